@@ -1,15 +1,185 @@
 from __future__ import annotations
 
-import sys
+import dataclasses, sqlite3, sys, tempfile
 from pathlib import Path
 
 REPO_ROOT = Path(__file__).resolve().parents[1]
 if str(REPO_ROOT) not in sys.path:
     sys.path.insert(0, str(REPO_ROOT))
 
+from synaptic.aggregate import aggregate_activations
+from synaptic.cluster import ClusterEngine
 from synaptic.config import get_config
+from synaptic.embeddings import get_embedder
+from synaptic.pack import PackedRetriever, write_pack
 from synaptic.store import SynapticStore
 from synaptic.retrieve import Retriever
+from synaptic import migrations
+
+def _note(st, text, **kw):
+    return st.add_atom(type=kw.pop("type", "note"), scope=[], tags=[], entities=[], content=text, summary=text, **kw)
+
+def _coact_edges(st):
+    return sorted((r[0], r[1], round(r[2], 9), r[3]) for r in st.idx.conn.execute(
+        "SELECT src, dst, weight, n FROM edges WHERE kind = 'coact' AND namespace = ?", (st.namespace,)))
+
+def check_namespaces(cfg):
+    # one database, isolated tenants: neither search nor by-id reads cross namespaces
+    with tempfile.TemporaryDirectory() as home:
+        st = SynapticStore(dataclasses.replace(cfg, home=Path(home)))
+        st.init()
+        other = st.scoped("other")
+        a = _note(other, "tenant isolation marker")
+        assert not Retriever(st, st.cfg).l1_search("tenant isolation marker", k=5)
+        assert [r.atom_id for r in Retriever(other, st.cfg).l1_search("tenant isolation marker", k=5)] == [a.atom_id]
+        assert st.get_atom(a.atom_id) is None and other.get_atom(a.atom_id) is not None
+        st.close()
+
+def check_dedupe(cfg):
+    # re-adding the same text with the same type and scopes merges; another type is a separate atom
+    with tempfile.TemporaryDirectory() as home:
+        st = SynapticStore(dataclasses.replace(cfg, home=Path(home), dedupe_on_add=True))
+        st.init()
+        kw = dict(scope=["a", "b"], tags=[], entities=[], content="dedupe me", summary="dedupe me")
+        first, merged = st.add_or_merge(type="note", **kw)
+        assert not merged
+        again, merged = st.add_or_merge(type="note", **dict(kw, scope=["b", "a"]))
+        assert merged and again.atom_id == first.atom_id and again.w > first.w, again
+        other, merged = st.add_or_merge(type="fact", **kw)
+        assert not merged and other.atom_id != first.atom_id
+        st.close()
+
+def check_near_duplicates(cfg):
+    # a paraphrase is found by SimHash/LSH, and diverse search keeps one line for both
+    with tempfile.TemporaryDirectory() as home:
+        st = SynapticStore(dataclasses.replace(cfg, home=Path(home)))
+        st.init()
+        text = "the relay queue drains every thirty seconds unless the uplink is saturated by telemetry bursts"
+        a = _note(st, text)
+        b = _note(st, text + " today")
+        assert a.atom_id in [aid for aid, _ in st.find_near_duplicates(content=text + " today")]
+        hits = Retriever(st, st.cfg).l1_search("relay queue uplink telemetry", k=5, diverse=True)
+        assert len({a.atom_id, b.atom_id} & {r.atom_id for r in hits}) == 1, hits
+        assert any(x.startswith("near_dups:") for r in hits for x in r.reasons)
+        st.close()
+
+def check_blob_offload(cfg):
+    # a large body goes to blobs/: the row keeps a bounded summary, the body stays searchable and loadable
+    with tempfile.TemporaryDirectory() as home:
+        st = SynapticStore(dataclasses.replace(cfg, home=Path(home), blob_threshold_bytes=512, blob_summary_chars=64))
+        st.init()
+        body = " ".join(f"filler{i}" for i in range(300)) + " zanzibarquokka"
+        a = st.add_atom(type="note", scope=[], tags=[], entities=[], content=body, summary="")
+        row = st.get_atom(a.atom_id)
+        assert row["content"] == "" and row["blob_ref"] and len(row["summary"]) <= 64, dict(row)
+        assert st.load_content(dict(row)) == body
+        assert [r.atom_id for r in Retriever(st, st.cfg).l1_search("zanzibarquokka", k=5)] == [a.atom_id]
+        st.close()
+
+def check_stream_brief(cfg):
+    # events arrive per stage and `done` lists the L1 atoms in rank order
+    with tempfile.TemporaryDirectory() as home:
+        st = SynapticStore(dataclasses.replace(cfg, home=Path(home)))
+        st.init()
+        for i in range(3):
+            _note(st, f"streaming brief fixture number {i}")
+        events = list(Retriever(st, st.cfg).stream_brief("streaming brief fixture", k=3))
+        kinds = [e["event"] for e in events]
+        assert kinds[-1] == "done" and kinds.count("l1") == 3 and kinds.index("done") > max(i for i, k in enumerate(kinds) if k == "l1")
+        assert events[-1]["atom_ids"] == [e["atom_id"] for e in events if e["event"] == "l1"]
+        st.close()
+
+def check_clusters(cfg):
+    # co-activated atoms become a cluster; briefs fold them into its line and using it strengthens the members
+    with tempfile.TemporaryDirectory() as home:
+        st = SynapticStore(dataclasses.replace(cfg, home=Path(home), coact_sync=True, coact_kinds=("brief",)))
+        st.init()
+        text = "orbital relay design note {} with a fairly long description of the relay topology and its reasoning"
+        ids = [_note(st, text.format(i)).atom_id for i in range(4)]
+        for _ in range(3):
+            st.record_use("orbital relay", ids, kind="brief", coact=True)
+        rep = ClusterEngine(st).update()
+        assert len(rep.clusters) == 1, rep
+        cid = rep.clusters[0]
+        events = list(Retriever(st, st.cfg).stream_brief("orbital relay design", k=5, clusters=True))
+        assert [e["atom_id"] for e in events if e["event"] == "l1"] == [cid]
+        assert sorted(events[-1]["clusters"][cid]) == sorted(ids)
+        w_cluster, w_member = st.get_atom(cid)["w"], st.get_atom(ids[0])["w"]
+        st.record_use("orbital relay", [cid], kind="search", delta_w=0.01)
+        assert st.get_atom(cid)["w"] == w_cluster and st.get_atom(ids[0])["w"] > w_member
+        st.close()
+
+def check_pack(cfg):
+    # a `syn pack` snapshot answers exactly like the store it was written from
+    with tempfile.TemporaryDirectory() as home:
+        # no decay at query time: both sides would otherwise read the clock a moment apart
+        st = SynapticStore(dataclasses.replace(cfg, home=Path(home), decay_apply_on_retrieval=False))
+        st.init()
+        ids = [_note(st, f"packed snapshot atom {i} about {'relays' if i % 2 else 'queues'}").atom_id for i in range(12)]
+        st.record_use("packed", ids[:4], kind="brief", coact=True)
+        write_pack(st, Path(home) / "default.pack")
+        pr = PackedRetriever(Path(home) / "default.pack", st.cfg)
+        r = Retriever(st, st.cfg)
+        for mode in ("classic", "hybrid"):
+            a = r.l1_search("packed snapshot relays", k=6, mode=mode)
+            b = pr.l1_search("packed snapshot relays", k=6, mode=mode)
+            assert [(x.atom_id, round(x.score, 9)) for x in a] == [(x.atom_id, round(x.score, 9)) for x in b], mode
+        st.close()
+
+def check_aggregate(cfg):
+    # rebuilding co-activation edges from the log gives the synchronously written ones;
+    # an incremental run while sync writes are on reads nothing
+    with tempfile.TemporaryDirectory() as home:
+        st = SynapticStore(dataclasses.replace(cfg, home=Path(home), coact_sync=True, coact_kinds=("brief",)))
+        st.init()
+        ids = [_note(st, f"aggregate fixture {i}").atom_id for i in range(4)]
+        st.record_use("q", ids[:3], kind="brief", coact=True)
+        st.record_use("q", ids[1:], kind="brief", coact=True)
+        st.record_use("q", ids[:2], kind="search", coact=True)
+        sync = _coact_edges(st)
+        assert sync and all(w == 1.0 for _, _, w, n in sync if n == 1), sync
+        assert aggregate_activations(st, rebuild=True).used == 2
+        assert _coact_edges(st) == sync
+        rep = aggregate_activations(st)
+        assert rep.skipped and rep.events == 0, rep
+        st.close()
+
+def check_deferred_backfills(cfg):
+    # a store above AUTO_BACKFILL_MAX_ATOMS from before atom_vec/embed_cache defers its backfills on open
+    # but must still get every table: search and add work before `syn migrate --apply`
+    with tempfile.TemporaryDirectory() as home:
+        # a non-default dim: backfilled vectors must carry the store's embedder version, not the environment's
+        cfg = dataclasses.replace(cfg, home=Path(home), embed_dim=64)
+        st = SynapticStore(cfg)
+        st.init()
+        for i in range(3):
+            st.add_atom(type="note", scope=[], tags=[], entities=[], content=f"deferred backfill note {i}", summary=f"deferred backfill note {i}")
+        st.close()
+        conn = sqlite3.connect(str(Path(home) / "synaptic.sqlite"))
+        # back to a pre-migration store whose first migration still has a backfill to run
+        conn.executescript("""DROP TABLE atom_vec; DROP TABLE embed_cache; PRAGMA user_version = 0;
+            INSERT INTO synaptic_meta(key, value) VALUES ('migration:1:backfills', '["hash"]');
+            DELETE FROM synaptic_meta WHERE key = 'migration:schema_applied';""")
+        conn.close()
+        limit = migrations.AUTO_BACKFILL_MAX_ATOMS
+        migrations.AUTO_BACKFILL_MAX_ATOMS = 1
+        try:
+            st = SynapticStore(cfg)
+            st.init()
+            for mode in ("classic", "hybrid"):
+                assert Retriever(st, cfg).l1_search("deferred backfill", k=5, mode=mode), mode
+            st.add_atom(type="note", scope=[], tags=[], entities=[], content="added before migrate --apply", summary="added before migrate --apply")
+            assert migrations.status(st.idx)["pending"], "backfills should still be pending"
+            # the DDL ran once: read-only opens now stay read-only while the backfills wait
+            ro = SynapticStore(cfg, read_only=True)
+            assert migrations.schema_current(ro.idx) and Retriever(ro, cfg).l1_search("deferred backfill", k=5)
+            ro.close()
+            migrations.apply(st.idx)
+            models = {r[0] for r in st.idx.conn.execute("SELECT DISTINCT model FROM atom_vec")}
+            assert models == {get_embedder(cfg).version}, models
+            st.close()
+        finally:
+            migrations.AUTO_BACKFILL_MAX_ATOMS = limit
 
 def main():
     cfg = get_config()
@@ -40,6 +210,15 @@ def main():
     assert seeds, "Expected some retrieval results"
 
     st.close()
+    check_namespaces(cfg)
+    check_dedupe(cfg)
+    check_near_duplicates(cfg)
+    check_blob_offload(cfg)
+    check_stream_brief(cfg)
+    check_clusters(cfg)
+    check_pack(cfg)
+    check_aggregate(cfg)
+    check_deferred_backfills(cfg)
     print("OK")
 
 if __name__ == "__main__":
@@ -1,2 +1,2 @@
 __all__ = ["__version__"]
-__version__ = "0.1.1"
+__version__ = "0.2.0"
@@ -0,0 +1,155 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+import json, math, time
+
+from .index import coact_weight
+from .util import parse_iso_utc
+
+# Co-activation edges from the activation log. activations.jsonl is tailed from a per-namespace byte
+# offset (meta `coact_offset:<ns>`); every counted event adds one unit of mass to each pair of distinct
+# atoms it returned. A pair's mass decays with cfg.coact_half_life_days and is stored as the edge weight
+# 2*mass/(1+mass) together with the raw count n. The synchronous writes of record_use (cfg.coact_sync) add
+# the same contribution for the same kinds (cfg.coact_kinds), so incremental runs, a full rebuild and
+# those writes all land on the same edges.
+#
+# Pairs are accumulated in memory up to `max_pairs` and then flushed: edges (both directions) and the
+# offset of the last line consumed go to the index in one transaction, so an interrupted run resumes
+# exactly where its last flush left off. A trailing line without a newline (a write in progress) is left
+# for the next run.
+
+_LOG2 = math.log(2.0)
+
+@dataclass
+class AggregateReport:
+    events: int          # activation lines read for this namespace
+    used: int            # events counted (kind in cfg.coact_kinds, 2+ atoms, inside the window)
+    pairs: int           # distinct atom pairs flushed
+    flushes: int
+    offset: int          # byte offset of activations.jsonl consumed so far
+    rebuilt: bool = False
+    reset: bool = False  # the log was shorter than the saved offset (rewritten): started over
+    skipped: str = ""    # why nothing was read (incremental run while cfg.coact_sync writes the edges)
+    seconds: float = 0.0
+
+def _offset_key(namespace: str) -> str:
+    return f"coact_offset:{namespace}"
+
+def aggregate_activations(store, *, rebuild: bool = False, window_days: Optional[float] = None,
+                          half_life_days: Optional[float] = None, max_pairs: Optional[int] = None) -> AggregateReport:
+    """Fold the activation events logged since the last run into the namespace's `coact` edges.
+
+    `rebuild` drops the namespace's co-activation edges and replays the whole log; a namespace that
+    was never aggregated is rebuilt as well, so edges written synchronously before are not counted twice.
+    With `window_days` > 0 only events that recent are counted. While cfg.coact_sync is on the edges are
+    already current, and counting the log again would count every event twice: an incremental run then
+    reads nothing and says so in `skipped` (a rebuild still replays the log).
+    """
+    t0 = time.perf_counter()
+    cfg = store.cfg
+    idx = store.idx
+    ns = store.namespace
+    window = cfg.coact_window_days if window_days is None else float(window_days)
+    hl = cfg.coact_half_life_days if half_life_days is None else float(half_life_days)
+    cap = max(1, int(cfg.coact_max_pairs if max_pairs is None else max_pairs))
+    kinds = set(cfg.coact_kinds)
+    key = _offset_key(ns)
+    saved = idx.get_meta(key)
+    if not saved:
+        rebuild = True
+    rep = AggregateReport(events=0, used=0, pairs=0, flushes=0, offset=0, rebuilt=rebuild)
+    if cfg.coact_sync and not rebuild:
+        rep.offset = int(saved)
+        rep.skipped = ("co-activation edges are written synchronously (SYNAPTIC_COACT_SYNC=1); "
+                       "use --rebuild or turn synchronous writes off")
+        rep.seconds = round(time.perf_counter() - t0, 3)
+        return rep
+    if rebuild:
+        with idx.batch():
+            idx.delete_coact(ns)
+            idx.set_meta(key, "0")
+            # edges are rewritten with their historical timestamps: clusters must look at all of them
+            idx.set_meta(f"cluster_watermark:{ns}", "")
+        saved = "0"
+    offset = int(saved)
+    path = store.acts_path
+    if path.stat().st_size < offset:
+        offset, rep.reset = 0, True
+    cutoff = time.time() - window*86400.0 if window > 0 else None
+    lam = _LOG2 / (hl*86400.0) if hl > 0 else 0.0
+    needle = ('"namespace": ' + json.dumps(ns, ensure_ascii=False)).encode("utf-8")
+
+    # (a, b) with a < b -> [mass as of last_t, n, last_ts, last_t]
+    pairs: Dict[Tuple[str, str], List] = {}
+    parsed: Dict[str, Optional[float]] = {}
+
+    def flush(pos: int):
+        rows = []
+        for (a, b), (mass, n, ts, _) in pairs.items():
+            w = coact_weight(mass)
+            rows.append((a, b, w, n, ts, ns))
+            rows.append((b, a, w, n, ts, ns))
+        with idx.batch():
+            if rows:
+                idx.upsert_coact(rows, half_life_days=hl)
+                # the cluster watermark may already be past these events' timestamps: move it back
+                wm = idx.get_meta(f"cluster_watermark:{ns}")
+                oldest = min(r[4] for r in rows)
+                if wm and oldest < wm:
+                    idx.set_meta(f"cluster_watermark:{ns}", oldest)
+            idx.set_meta(key, str(pos))
+        rep.pairs += len(pairs)
+        rep.flushes += 1
+        pairs.clear()
+
+    pos = offset
+    with path.open("rb") as f:
+        f.seek(offset)
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            pos += len(line)
+            if needle not in line and b'"namespace"' in line:
+                continue
+            try:
+                ev = json.loads(line)
+            except ValueError:
+                continue
+            if ev.get("namespace", "default") != ns:
+                continue
+            rep.events += 1
+            ids = sorted(set(ev.get("atom_ids") or ()))
+            ts = ev.get("ts") or ""
+            if ev.get("kind") not in kinds or len(ids) < 2:
+                continue
+            if ts not in parsed:
+                if len(parsed) > 4096:
+                    parsed.clear()
+                parsed[ts] = parse_iso_utc(ts) if ts else None
+            t = parsed[ts]
+            if cutoff is not None and (t is None or t < cutoff):
+                continue
+            rep.used += 1
+            for i in range(len(ids)):
+                for j in range(i+1, len(ids)):
+                    st = pairs.get((ids[i], ids[j]))
+                    if st is None:
+                        pairs[(ids[i], ids[j])] = [1.0, 1, ts, t]
+                        continue
+                    # decay whichever side is older to the newer timestamp (the log is append-ordered,
+                    # but writers of several processes can interleave by a second or so)
+                    if t is not None and st[3] is not None and t != st[3]:
+                        if t > st[3]:
+                            st[0] = st[0]*math.exp(-lam*(t - st[3])) + 1.0
+                            st[2], st[3] = ts, t
+                        else:
+                            st[0] += math.exp(-lam*(st[3] - t))
+                    else:
+                        st[0] += 1.0
+                    st[1] += 1
+            if len(pairs) >= cap:
+                flush(pos)
+    flush(pos)
+    rep.offset = pos
+    rep.seconds = round(time.perf_counter() - t0, 3)
+    return rep
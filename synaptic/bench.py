@@ -0,0 +1,277 @@
+from __future__ import annotations
+from dataclasses import asdict, dataclass, replace
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+import math, os, platform, random, shutil, subprocess, sys, tempfile, time
+
+from . import __version__
+from .config import SynapticConfig
+from .decay import apply_decay
+from .prune import prune_to_budget
+from .retrieve import Retriever
+from .store import SynapticStore
+
+# Commands timed by bench_startup: pure reads, as an agent shelling out per call would issue them.
+STARTUP_COMMANDS = (["namespaces"], ["search", "bench query", "--read-only", "--k", "5"])
+
+ALL_OPS = ("add_atom", "l1_search", "l2_expand", "propose_meta", "relevance", "apply_decay", "prune_to_budget")
+
+@dataclass
+class BenchSpec:
+    """Shape of a synthetic store. Same spec + seed -> same texts, tags and co-activation graph."""
+    atoms: int = 1000
+    seed: int = 1
+    vocab: int = 5000              # distinct words, drawn Zipf-like
+    words_median: float = 20.0     # content length in words ~ lognormal(log(median), sigma)
+    words_sigma: float = 0.8
+    tag_cardinality: int = 50      # distinct tags; each atom gets 1-3
+    coact_degree: float = 4.0      # mean co-activation edges per atom (0 = no graph)
+    topic_locality: float = 0.8    # share of co-activations inside the atom's primary tag
+    max_age_days: float = 120.0    # last use spread uniformly over this window (gives decay work)
+    queries: int = 100             # timed samples for the read ops
+    adds: int = 200                # timed (unbatched) add_atom samples after generation
+    repeats: int = 3               # timed runs of whole-store maintenance (decay, prune)
+
+def _iso(t: float) -> str:
+    return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(t))
+
+def _word(rng: random.Random) -> str:
+    cons, vows = "bcdfghjklmnprstvwz", "aeiou"
+    return "".join(rng.choice(cons) + rng.choice(vows) for _ in range(rng.randint(2, 4)))
+
+class SyntheticCorpus:
+    """Reproducible text/tag generator for a BenchSpec."""
+
+    def __init__(self, spec: BenchSpec):
+        self.spec = spec
+        self.rng = random.Random(spec.seed)
+        words = set()
+        while len(words) < spec.vocab:
+            words.add(_word(self.rng))
+        self.words = sorted(words)
+        self.rng.shuffle(self.words)
+        self._cum = []
+        acc = 0.0
+        for r in range(len(self.words)):
+            acc += 1.0 / (r + 1)
+            self._cum.append(acc)
+        self.tags = [f"tag{i}" for i in range(max(1, spec.tag_cardinality))]
+
+    def text(self, n_words: int) -> str:
+        return " ".join(self.rng.choices(self.words, cum_weights=self._cum, k=max(1, n_words)))
+
+    def atom(self, i: int) -> Dict[str, Any]:
+        rng, spec = self.rng, self.spec
+        n = int(round(rng.lognormvariate(math.log(max(1.0, spec.words_median)), spec.words_sigma)))
+        content = self.text(n)
+        tags = rng.sample(self.tags, k=min(len(self.tags), rng.randint(1, 3)))
+        return {"type": rng.choice(("note", "idea", "decision", "fact")), "scope": [f"s{i % 7}"], "tags": tags,
+                "entities": [], "content": content, "summary": " ".join(content.split()[:12]) + f" #{i}"}
+
+    def query(self) -> str:
+        return self.text(self.rng.randint(2, 4))
+
+def _pct(sorted_ms: List[float], p: float) -> float:
+    # nearest-rank percentile
+    if not sorted_ms:
+        return 0.0
+    i = max(0, min(len(sorted_ms) - 1, math.ceil(p / 100.0 * len(sorted_ms)) - 1))
+    return sorted_ms[i]
+
+def summarize(samples_s: List[float]) -> Dict[str, float]:
+    ms = sorted(x * 1000.0 for x in samples_s)
+    total = sum(samples_s)
+    return {"n": len(ms), "mean_ms": round(total * 1000.0 / len(ms), 4) if ms else 0.0,
+            "p50_ms": round(_pct(ms, 50), 4), "p95_ms": round(_pct(ms, 95), 4), "p99_ms": round(_pct(ms, 99), 4),
+            "ops_per_s": round(len(ms) / total, 2) if total > 0 else 0.0}
+
+def _timed(fn: Callable[[], Any], samples: List[float]) -> Any:
+    t0 = time.perf_counter()
+    out = fn()
+    samples.append(time.perf_counter() - t0)
+    return out
+
+def generate_store(store: SynapticStore, spec: BenchSpec, corpus: Optional[SyntheticCorpus] = None,
+                   *, chunk: int = 2000) -> Dict[str, Any]:
+    """Fill `store` with `spec.atoms` synthetic atoms plus a co-activation graph.
+
+    Writes are grouped `chunk` per transaction; strengths, use counts and last-use times are
+    spread out so decay and pruning have realistic work to do. They are set in one bulk update per
+    chunk (set_usage) rather than by rewriting every atom a second time.
+    """
+    corpus = corpus or SyntheticCorpus(spec)
+    rng = corpus.rng
+    now = time.time()
+    ids: List[str] = []
+    by_tag: Dict[str, List[str]] = {}
+    t0 = time.perf_counter()
+    for start in range(0, spec.atoms, chunk):
+        usage = []
+        with store.idx.batch():
+            for i in range(start, min(spec.atoms, start + chunk)):
+                a = corpus.atom(i)
+                atom = store.add_atom(**a, dedupe=False)
+                ids.append(atom.atom_id)
+                by_tag.setdefault(a["tags"][0], []).append(atom.atom_id)
+                last = _iso(now - rng.uniform(0.0, spec.max_age_days) * 86400.0)
+                usage.append((atom.atom_id, atom.w + rng.uniform(0.0, 1.5), rng.randint(0, 20), last))
+            store.set_usage(usage)
+    t_atoms = time.perf_counter() - t0
+
+    n_edges = int(spec.atoms * spec.coact_degree / 2)
+    tag_of = {aid: t for t, members in by_tag.items() for aid in members}
+    t0 = time.perf_counter()
+    ts = _iso(now)
+    for start in range(0, n_edges, chunk):
+        with store.idx.batch():
+            for _ in range(start, min(n_edges, start + chunk)):
+                a = rng.choice(ids)
+                pool = by_tag[tag_of[a]] if rng.random() < spec.topic_locality else ids
+                b = rng.choice(pool)
+                if a == b:
+                    continue
+                n = rng.randint(1, 5)
+                store.idx.upsert_edge(a, b, kind="coact", weight=1.0, ts=ts, n_inc=n, namespace=store.namespace)
+                store.idx.upsert_edge(b, a, kind="coact", weight=1.0, ts=ts, n_inc=n, namespace=store.namespace)
+    t_edges = time.perf_counter() - t0
+    return {"atoms_s": round(t_atoms, 3), "edges_s": round(t_edges, 3), "edges": n_edges * 2,
+            "atoms_per_s": round(spec.atoms / t_atoms, 1) if t_atoms > 0 else 0.0}
+
+def bench_relevance(store: SynapticStore, spec: BenchSpec, corpus: SyntheticCorpus, *, k: int = 10,
+                    modes: tuple = ("classic", "hybrid")) -> Dict[str, Any]:
+    """Recall@k, MRR and latency of each retrieval mode on queries with a known answer.
+
+    Each query is up to 3 words drawn from one atom's body plus one random vocabulary word, so an
+    exact all-terms match usually fails and ranking has to degrade gracefully.
+    """
+    rng = random.Random(spec.seed + 1)
+    ids = [r[0] for r in store.idx.conn.execute(
+        "SELECT atom_id FROM atoms WHERE namespace=? ORDER BY rowid", (store.namespace,))]
+    rows = store.idx.atoms_by_ids(rng.sample(ids, min(spec.queries, len(ids))))
+    cases = []
+    for aid in sorted(rows):
+        words = store.load_content(dict(rows[aid])).split()
+        if words:
+            cases.append((aid, " ".join(rng.sample(words, min(3, len(words))) + [rng.choice(corpus.words)])))
+    r = Retriever(store, store.cfg)
+    out: Dict[str, Any] = {"k": k, "queries": len(cases)}
+    for mode in modes:
+        hits, rr, samples = 0, 0.0, []
+        for target, q in cases:
+            got = [x.atom_id for x in _timed(lambda: r.l1_search(q, k=k, mode=mode), samples)]
+            if target in got:
+                hits += 1
+                rr += 1.0 / (got.index(target) + 1)
+        n = max(1, len(cases))
+        out[mode] = {"recall_at_k": round(hits / n, 4), "mrr": round(rr / n, 4), "latency": summarize(samples)}
+    return out
+
+def bench_store(store: SynapticStore, spec: BenchSpec, corpus: SyntheticCorpus,
+                ops: tuple = ALL_OPS) -> Dict[str, Dict[str, float]]:
+    """Time `ops` against an already generated store."""
+    cfg = store.cfg
+    r = Retriever(store, cfg)
+    out: Dict[str, Dict[str, float]] = {}
+    # each read op feeds the next one: run the chain only as far as the last requested op
+    chain = ("l1_search", "l2_expand", "propose_meta")
+    reads: Dict[str, List[float]] = {op: [] for op in chain}
+    depth = max((chain.index(op) + 1 for op in ops if op in chain), default=0)
+
+    for _ in range(spec.queries if depth else 0):
+        q = corpus.query()
+        seeds = _timed(lambda: r.l1_search(q, k=12), reads["l1_search"])
+        if depth > 1:
+            l2 = _timed(lambda: r.l2_expand(seeds, neighbor_k=cfg.l2_neighbor_k, take=8), reads["l2_expand"])
+        if depth > 2:
+            _timed(lambda: r.propose_meta(seeds, l2, take=3), reads["propose_meta"])
+    for op, samples in reads.items():
+        if op in ops:
+            out[op] = summarize(samples)
+
+    if "relevance" in ops:
+        out["relevance"] = bench_relevance(store, spec, corpus)
+
+    if "add_atom" in ops:
+        samples: List[float] = []
+        for i in range(spec.adds):
+            a = corpus.atom(spec.atoms + i)
+            _timed(lambda: store.add_atom(**a), samples)
+        out["add_atom"] = summarize(samples)
+
+    if "apply_decay" in ops:
+        samples = []
+        for _ in range(spec.repeats):
+            _timed(lambda: apply_decay(store, half_life_days=cfg.decay_half_life_days), samples)
+        out["apply_decay"] = summarize(samples)
+
+    if "prune_to_budget" in ops:
+        # dry run against half the current footprint so the full ranking path runs
+        size_mb = store.idx.conn.execute(
+            "SELECT COALESCE(SUM(length(summary)+COALESCE(content_bytes,length(content))),0) FROM atoms WHERE namespace=?",
+            (store.namespace,)).fetchone()[0] / (1024 * 1024)
+        samples = []
+        for _ in range(spec.repeats):
+            _timed(lambda: prune_to_budget(store, max_mb=size_mb / 2, dry_run=True), samples)
+        out["prune_to_budget"] = summarize(samples)
+    return out
+
+def run_bench(sizes: List[int], spec: BenchSpec | None = None, *, base_cfg: SynapticConfig,
+              ops: tuple = ALL_OPS, home: Optional[Path] = None, keep: bool = False) -> Dict[str, Any]:
+    """Generate one synthetic store per size (in a temp dir unless `home`) and time `ops` on each.
+
+    The result is plain JSON so runs can be diffed across commits.
+    """
+    spec = spec or BenchSpec()
+    results = []
+    for n in sizes:
+        s = replace(spec, atoms=int(n))
+        root = Path(home) / f"bench_{n}" if home else Path(tempfile.mkdtemp(prefix=f"synaptic-bench-{n}-"))
+        cfg = replace(base_cfg, home=root)
+        st = SynapticStore(cfg, namespace="bench")
+        try:
+            st.init()
+            corpus = SyntheticCorpus(s)
+            gen = generate_store(st, s, corpus)
+            timings = bench_store(st, s, corpus, ops=ops)
+            db = cfg.home / "synaptic.sqlite"
+            results.append({"atoms": n, "generate": gen, "db_mb": round(db.stat().st_size / (1024 * 1024), 2),
+                            "ops": timings})
+        finally:
+            st.close()
+            if not keep and not home:
+                shutil.rmtree(root, ignore_errors=True)
+    return {"version": __version__, "python": platform.python_version(), "platform": platform.platform(),
+            "spec": {k: v for k, v in asdict(spec).items() if k != "atoms"}, "ops": list(ops), "results": results}
+
+def bench_startup(*, base_cfg: SynapticConfig, runs: int = 20, target_ms: float = 200.0, atoms: int = 1000,
+                  commands=STARTUP_COMMANDS) -> Dict[str, Any]:
+    """Wall time of whole `python -m synaptic.cli ...` processes against a small synthetic store.
+
+    `python -c pass` is timed the same way so the interpreter's own startup can be told apart.
+    `ok` is False when any command's p50 exceeds `target_ms`.
+    """
+    root = Path(tempfile.mkdtemp(prefix="synaptic-bench-startup-"))
+    try:
+        spec = BenchSpec(atoms=atoms)
+        st = SynapticStore(replace(base_cfg, home=root), namespace=base_cfg.namespace)
+        st.init()
+        generate_store(st, spec)
+        st.close()
+        env = dict(os.environ, SYNAPTIC_HOME=str(root))
+        pkg_root = str(Path(__file__).resolve().parents[1])
+        env["PYTHONPATH"] = pkg_root + (os.pathsep + env["PYTHONPATH"] if env.get("PYTHONPATH") else "")
+
+        def time_argv(argv: List[str]) -> Dict[str, float]:
+            samples: List[float] = []
+            for _ in range(runs):
+                _timed(lambda: subprocess.run(argv, env=env, stdout=subprocess.DEVNULL, check=True), samples)
+            return summarize(samples)
+
+        out: Dict[str, Any] = {"runs": runs, "target_ms": target_ms, "atoms": atoms,
+                               "interpreter": time_argv([sys.executable, "-c", "pass"]), "commands": {}}
+        for cmd in commands:
+            out["commands"][" ".join(cmd)] = time_argv([sys.executable, "-m", "synaptic.cli", *cmd])
+        out["ok"] = all(v["p50_ms"] <= target_ms for v in out["commands"].values())
+        return out
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
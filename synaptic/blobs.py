@@ -0,0 +1,48 @@
+from __future__ import annotations
+from pathlib import Path
+from typing import Optional
+import zlib
+
+from .util import sha256_bytes
+
+class BlobStore:
+    """Content-addressed storage for large atom bodies under `<home>/blobs/`.
+
+    Refs look like 'sha256:<hex>' (hash of the uncompressed UTF-8 text). Files live at
+    blobs/<hex[:2]>/<hex> (raw) or blobs/<hex[:2]>/<hex>.z (zlib), so identical bodies are stored once.
+    """
+
+    def __init__(self, root: Path, compress: bool = True):
+        self.root = root
+        self.compress = compress
+
+    def _paths(self, ref: str):
+        hexd = ref.split(":", 1)[-1]
+        d = self.root / hexd[:2]
+        return d / f"{hexd}.z", d / hexd
+
+    def put(self, text: str) -> str:
+        data = text.encode("utf-8")
+        ref = f"sha256:{sha256_bytes(data)}"
+        zpath, rpath = self._paths(ref)
+        if zpath.exists() or rpath.exists():
+            return ref
+        zpath.parent.mkdir(parents=True, exist_ok=True)
+        path, payload = (zpath, zlib.compress(data, 6)) if self.compress else (rpath, data)
+        tmp = path.with_name(path.name + ".tmp")
+        tmp.write_bytes(payload)
+        tmp.replace(path)
+        return ref
+
+    def get(self, ref: str) -> Optional[str]:
+        zpath, rpath = self._paths(ref)
+        if zpath.exists():
+            return zlib.decompress(zpath.read_bytes()).decode("utf-8")
+        if rpath.exists():
+            return rpath.read_text(encoding="utf-8")
+        return None
+
+    def delete(self, ref: str):
+        for p in self._paths(ref):
+            if p.exists():
+                p.unlink()
@@ -1,7 +1,9 @@
 from __future__ import annotations
+from dataclasses import dataclass, field
 from typing import Any, Dict, List, Tuple
 
-from .models import Retrieved
+from .models import AtomFilter, Retrieved
+from .simhash import hamming, simhash64
 from .util import safe_truncate
 
 def format_atom_line(r: Retrieved) -> str:
@@ -15,24 +17,126 @@ def format_atom_line(r: Retrieved) -> str:
     why = ", ".join(r.reasons[:3]) if r.reasons else ""
     return f"- [{sid}] ({typ}, w={w:.2f}, uses={uses}) {summary}" + (f"  _({why})_" if why else "")
 
+def format_filters(f: AtomFilter) -> str:
+    parts = []
+    for name in ("scope", "type", "tags", "entities"):
+        vals = getattr(f, name)
+        if vals:
+            parts.append(f"{name}={','.join(vals)}")
+    if f.since:
+        parts.append(f"since={f.since}")
+    if f.until:
+        parts.append(f"until={f.until}")
+    return " ".join(parts)
+
+def format_l2_line(s: Dict[str, Any]) -> str:
+    return f"- [{s['atom_id']}] score={s['score']:.2f} reasons={','.join(s.get('reasons',[]))}"
+
+def format_meta_line(m: Dict[str, Any]) -> str:
+    members = ", ".join(m.get("members", []))
+    return f"- {m.get('title','Pattern')} score={m.get('score',0):.2f} members=[{members}]"
+
+def estimate_tokens(text: str) -> int:
+    """Cheap, tokenizer-free estimate (~4 chars/token for English + markdown), rounded up."""
+    return (len(text) + 3) // 4
+
+_L1_HEADER = "### L1: Most relevant atoms"
+_L2_HEADER = "### L2: Adjacent suggestions"
+_META_HEADER = "### L2: Pattern candidates (meta-atoms)"
+
+def _header_lines(query: str, filters: AtomFilter | None) -> List[str]:
+    lines = [f"## Synaptic memory brief", f"**Query:** {query}"]
+    if filters is not None and not filters.is_empty():
+        lines.append(f"**Filters:** {format_filters(filters)}")
+    return lines
+
 def build_brief(query: str, seeds: List[Retrieved], l2_suggestions: List[Dict[str, Any]] | None = None,
-                meta: List[Dict[str, Any]] | None = None) -> str:
-    lines: List[str] = []
-    lines.append(f"## Synaptic memory brief")
-    lines.append(f"**Query:** {query}")
+                meta: List[Dict[str, Any]] | None = None, filters: AtomFilter | None = None) -> str:
+    lines: List[str] = _header_lines(query, filters)
     lines.append("")
-    lines.append("### L1: Most relevant atoms")
+    lines.append(_L1_HEADER)
     for r in seeds:
         lines.append(format_atom_line(r))
     if l2_suggestions:
         lines.append("")
-        lines.append("### L2: Adjacent suggestions")
+        lines.append(_L2_HEADER)
         for s in l2_suggestions:
-            lines.append(f"- [{s['atom_id']}] score={s['score']:.2f} reasons={','.join(s.get('reasons',[]))}")
+            lines.append(format_l2_line(s))
     if meta:
         lines.append("")
-        lines.append("### L2: Pattern candidates (meta-atoms)")
+        lines.append(_META_HEADER)
         for m in meta:
-            members = ", ".join(m.get("members", []))
-            lines.append(f"- {m.get('title','Pattern')} score={m.get('score',0):.2f} members=[{members}]")
+            lines.append(format_meta_line(m))
     return "\n".join(lines) + "\n"
+
+@dataclass
+class BriefPack:
+    text: str
+    tokens_est: int
+    atom_ids: List[str]                      # L1 atoms included, in rank order
+    dropped: List[str]                       # L1 atoms left out to stay within budget
+    collapsed: Dict[str, List[str]] = field(default_factory=dict)   # kept atom_id -> near-identical atoms folded in
+
+def pack_brief(query: str, seeds: List[Retrieved], l2_suggestions: List[Dict[str, Any]] | None = None,
+               meta: List[Dict[str, Any]] | None = None, filters: AtomFilter | None = None, *,
+               max_tokens: int, near_dup_distance: int = 3, secondary_weight: float = 0.5) -> BriefPack:
+    """Build a brief that fits `max_tokens` (by `estimate_tokens`; only the query/filter header
+    is always emitted, even if it alone exceeds the budget).
+
+    L1 lines whose displayed summaries are near-identical (SimHash within `near_dup_distance`)
+    collapse into the best-ranked one. L1 lines are then chosen greedily by retrieval score per
+    token, and L2/meta lines (score * `secondary_weight` per token) fill the remaining budget;
+    a section header is paid for when its first line is taken. Lines keep their rank order.
+    """
+    header = _header_lines(query, filters)
+    used = estimate_tokens("\n".join(header) + "\n")
+
+    # collapse near-identical L1 lines
+    kept: List[Tuple[Retrieved, str, int]] = []
+    collapsed: Dict[str, List[str]] = {}
+    for r in seeds:
+        line = format_atom_line(r)
+        sig = simhash64(r.row.get("summary") or "")
+        twin = next((k for k in kept if sig and k[2] and hamming(sig, k[2]) <= near_dup_distance), None)
+        if twin is not None:
+            collapsed.setdefault(twin[0].atom_id, []).append(r.atom_id)
+            continue
+        kept.append((r, line, sig))
+
+    items = []   # (section, order, value, line, atom_id)
+    for i, (r, line, _) in enumerate(kept):
+        n = len(collapsed.get(r.atom_id, []))
+        if n:
+            line += f" (+{n} near-identical)"
+        items.append((0, i, float(r.score), line, r.atom_id))
+    for i, s in enumerate(l2_suggestions or []):
+        items.append((1, i, secondary_weight * float(s.get("score", 0.0)), format_l2_line(s), None))
+    for i, m in enumerate(meta or []):
+        items.append((2, i, secondary_weight * float(m.get("score", 0.0)), format_meta_line(m), None))
+
+    section_cost = [estimate_tokens(h + "\n") + 1 for h in (_L1_HEADER, _L2_HEADER, _META_HEADER)]  # +1: blank line
+    opened = [False, False, False]
+    chosen = []
+    # L1 atoms are packed first; L2/meta lines only fill what is left
+    for phase in (lambda it: it[0] == 0, lambda it: it[0] != 0):
+        for it in sorted(filter(phase, items), key=lambda x: x[2] / max(1, estimate_tokens(x[3] + "\n")), reverse=True):
+            cost = estimate_tokens(it[3] + "\n") + (0 if opened[it[0]] else section_cost[it[0]])
+            if used + cost > max_tokens:
+                continue
+            used += cost
+            opened[it[0]] = True
+            chosen.append(it)
+    chosen.sort(key=lambda x: (x[0], x[1]))
+
+    lines = list(header)
+    for sec, title in enumerate((_L1_HEADER, _L2_HEADER, _META_HEADER)):
+        sec_lines = [it[3] for it in chosen if it[0] == sec]
+        if sec_lines:
+            lines += ["", title, *sec_lines]
+    text = "\n".join(lines) + "\n"
+
+    included = [it[4] for it in chosen if it[0] == 0]
+    inc_set = set(included)
+    dropped = [aid for r, _, _ in kept if r.atom_id not in inc_set for aid in (r.atom_id, *collapsed.get(r.atom_id, []))]
+    return BriefPack(text=text, tokens_est=estimate_tokens(text), atom_ids=included, dropped=dropped,
+                     collapsed={k: v for k, v in collapsed.items() if k in inc_set})
@@ -1,20 +1,81 @@
 from __future__ import annotations
-import argparse, json
-from typing import List
+import argparse, json, sys
+from typing import TYPE_CHECKING, List
 
 from .config import get_config
-from .store import SynapticStore
-from .retrieve import Retriever
-from .prune import prune_to_budget
-from .brief import build_brief
-from .decay import apply_decay
+from .instrument import current_profile, profiling, span
+from .models import AtomFilter
+from .util import resolve_time_bound
+
+# `syn` runs once per agent call, so each command imports only what it uses.
+if TYPE_CHECKING:
+    from .store import SynapticStore
 
 def _split_csv(s: str) -> List[str]:
     if not s:
         return []
     return [x.strip() for x in s.split(",") if x.strip()]
 
+def _time_bound(s: str, *, end: bool = False) -> str:
+    try:
+        return resolve_time_bound(s, end=end)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+def _until_bound(s: str) -> str:
+    return _time_bound(s, end=True)
+
+def _add_filter_args(sp):
+    sp.add_argument("--scope", default="", help="only atoms in any of these scopes (comma-separated)")
+    sp.add_argument("--type", default="", help="only atoms of any of these types (comma-separated)")
+    sp.add_argument("--tag", default="", help="only atoms with any of these tags (comma-separated)")
+    sp.add_argument("--entity", default="", help="only atoms mentioning any of these entities (comma-separated)")
+    sp.add_argument("--since", type=_time_bound, default="", help="created at/after: ISO date/timestamp or 30m/12h/7d/2w")
+    sp.add_argument("--until", type=_until_bound, default="", help="created at/before: ISO date/timestamp or 30m/12h/7d/2w")
+
+def _filters_from_args(args) -> AtomFilter:
+    return AtomFilter(scope=_split_csv(args.scope), type=_split_csv(args.type), tags=_split_csv(args.tag),
+                      entities=_split_csv(args.entity), since=args.since, until=args.until)
+
+def _open_store(args, *, read_only: bool = False) -> "SynapticStore":
+    from .index import SCHEMA_VERSION
+    from .store import SynapticStore
+    st = SynapticStore(get_config(), namespace=args.namespace or None, read_only=read_only)
+    if st.idx.schema_version() < SCHEMA_VERSION:
+        # large stores defer row backfills on open; say so once per call rather than fail
+        print("syn: index migration pending; run `syn migrate --apply`", file=sys.stderr)
+    return st
+
+def _open_pack(args):
+    # a `syn pack` snapshot stands in for the store on read commands: no SQLite, no writes
+    from pathlib import Path
+    from .pack import PackedStore
+    st = PackedStore(Path(args.pack), get_config())
+    if args.namespace and args.namespace != st.namespace:
+        st.close()
+        raise SystemExit(f"syn: {args.pack} is a pack of namespace {st.namespace!r}, not {args.namespace!r}")
+    return st
+
+def _target_stores(st: "SynapticStore", args) -> List["SynapticStore"]:
+    # maintenance commands may fan out over every namespace in the shared database
+    if getattr(args, "all_namespaces", False):
+        return [st.scoped(r["namespace"]) for r in st.namespaces()]
+    return [st]
+
+def _respond(payload, finish):
+    """Print the JSON response, then run `finish` (the use-recording writes). Under --profile the
+    writes run first so that the printed profile covers them too."""
+    prof = current_profile()
+    if prof is None:
+        print(json.dumps(payload, ensure_ascii=False), flush=True)
+        finish()
+        return
+    finish()
+    payload["profile"] = prof.to_dict()
+    print(json.dumps(payload, ensure_ascii=False), flush=True)
+
 def cmd_init(args):
+    from .store import SynapticStore
     cfg = get_config()
     st = SynapticStore(cfg)
     st.init()
@@ -22,103 +83,344 @@ def cmd_init(args):
     print(f"Initialized Synaptic at: {cfg.home}")
 
 def cmd_add(args):
-    cfg = get_config()
-    st = SynapticStore(cfg)
+    st = _open_store(args)
     st.init()
-    atom = st.add_atom(
+    dedupe = st.cfg.dedupe_on_add and not args.no_dedupe
+    scope = _split_csv(args.scope)
+    near = st.find_near_duplicates(content=args.content, summary=args.summary or "")
+    # an exact duplicate is merged, not skipped: look it up only when skipping is on the table
+    if near and args.skip_near_dup and not (
+            dedupe and st.find_duplicate(content=args.content, summary=args.summary or "", type=args.type, scope=scope)):
+        st.close()
+        near_out = [{"atom_id": aid, "distance": d} for aid, d in near]
+        print(json.dumps({"ok": True, "skipped": True, "near_duplicate_of": near_out}, ensure_ascii=False))
+        return
+    atom, merged = st.add_or_merge(
         type=args.type,
-        scope=_split_csv(args.scope),
+        scope=scope,
         tags=_split_csv(args.tags),
         entities=_split_csv(args.entities),
         content=args.content,
         summary=args.summary or "",
         source={"kind": args.source_kind, "ref": args.source_ref} if (args.source_kind or args.source_ref) else {},
         pinned=bool(args.pinned),
+        dedupe=dedupe,
     )
     st.close()
-    print(json.dumps({"ok": True, "atom": {"atom_id": atom.atom_id, "ts": atom.ts, "type": atom.type}}, ensure_ascii=False))
+    out = {"ok": True, "atom": {"atom_id": atom.atom_id, "ts": atom.ts, "type": atom.type}}
+    if merged:
+        out["merged_into"] = atom.atom_id
+    near_out = [{"atom_id": aid, "distance": d} for aid, d in near if aid != atom.atom_id]
+    if near_out:
+        out["near_duplicate_of"] = near_out
+    print(json.dumps(out, ensure_ascii=False))
 
 def cmd_search(args):
-    cfg = get_config()
-    st = SynapticStore(cfg)
-    st.init()
+    from .retrieve import Retriever
+    read_only = args.read_only or bool(args.pack)
+    st = _open_pack(args) if args.pack else _open_store(args, read_only=read_only)
+    cfg = st.cfg
 
     decay_meta = {}
     if args.decay:
-        rep = apply_decay(st, half_life_days=cfg.decay_half_life_days)
+        from .decay import apply_decay
+        with span("apply_decay"):
+            rep = apply_decay(st, half_life_days=cfg.decay_half_life_days)
         decay_meta = rep.__dict__
 
+    filters = _filters_from_args(args)
     r = Retriever(st, cfg)
-    seeds = r.l1_search(args.query, k=args.k)
+    seeds = r.l1_search(args.query, k=args.k, filters=filters, diverse=bool(args.diverse), mode=args.mode)
     atom_ids = [x.atom_id for x in seeds]
-    st.log_activation(args.query, atom_ids, kind="search", meta={"k": args.k, **({"decay": decay_meta} if decay_meta else {})})
+    act_meta = {"k": args.k, **({"decay": decay_meta} if decay_meta else {})}
+    if not filters.is_empty():
+        act_meta["filters"] = filters.__dict__
 
-    # strengthen on retrieval (small bump)
-    ts = st.log_activation(args.query, atom_ids, kind="manual", meta={"note":"strengthen_on_search"}).ts
-    for aid in atom_ids:
-        st.update_atom_strength(aid, ts=ts, delta_w=0.01, uses_inc=1, last_used_ts=ts)
-
-    st.close()
     out = [{"atom_id": x.atom_id, "score": x.score, "reasons": x.reasons, "summary": x.row.get("summary","")} for x in seeds]
-    print(json.dumps({"ok": True, "results": out}, ensure_ascii=False))
+    # strengthen on retrieval (small bump), after the response is out
+    _respond({"ok": True, "results": out},
+             lambda: None if read_only else
+             st.record_use(args.query, atom_ids, kind="search", meta=act_meta, delta_w=0.01, coact=True))
+    st.close()
+
+def _brief_act_meta(args, filters, decay_meta):
+    act_meta = {"k": args.k, "l2": args.l2, **({"decay": decay_meta} if decay_meta else {})}
+    if not filters.is_empty():
+        act_meta["filters"] = filters.__dict__
+    if args.max_tokens:
+        act_meta["max_tokens"] = args.max_tokens
+    return act_meta
 
 def cmd_brief(args):
-    cfg = get_config()
-    st = SynapticStore(cfg)
-    st.init()
+    from .brief import build_brief, estimate_tokens, pack_brief
+    from .cluster import substitute_clusters
+    from .retrieve import Retriever
+    read_only = args.read_only or bool(args.pack)
+    st = _open_pack(args) if args.pack else _open_store(args, read_only=read_only)
+    cfg = st.cfg
 
     decay_meta = {}
     if args.decay:
-        rep = apply_decay(st, half_life_days=cfg.decay_half_life_days)
+        from .decay import apply_decay
+        with span("apply_decay"):
+            rep = apply_decay(st, half_life_days=cfg.decay_half_life_days)
         decay_meta = rep.__dict__
 
+    filters = _filters_from_args(args)
     r = Retriever(st, cfg)
-    seeds = r.l1_search(args.query, k=args.k)
-    l2 = r.l2_expand(seeds, neighbor_k=cfg.l2_neighbor_k, take=args.l2)
-    meta = r.propose_meta(seeds, l2, take=args.meta)
-    seed_ids = [x.atom_id for x in seeds]
 
-    st.log_activation(args.query, seed_ids, kind="brief", meta={"k": args.k, "l2": args.l2, **({"decay": decay_meta} if decay_meta else {})})
-    ts = st.log_activation(args.query, seed_ids, kind="manual", meta={"note":"strengthen_on_brief"}).ts
-    for aid in seed_ids:
-        st.update_atom_strength(aid, ts=ts, delta_w=0.02, uses_inc=1, last_used_ts=ts)
+    if args.stream:
+        # NDJSON events as each stage completes; strengthening/co-activation writes happen after the last event
+        seed_ids: List[str] = []
+        for ev in r.stream_brief(args.query, k=args.k, l2=args.l2, meta=args.meta, filters=filters,
+                                 diverse=bool(args.diverse), mode=args.mode,
+                                 clusters=cfg.brief_use_clusters and not args.no_clusters):
+            if ev["event"] == "l1":
+                seed_ids.append(ev["atom_id"])
+            print(json.dumps(ev, ensure_ascii=False), flush=True)
+        if not read_only:
+            st.record_use(args.query, seed_ids, kind="brief", meta=_brief_act_meta(args, filters, decay_meta),
+                          delta_w=0.02, coact=True)
+        if current_profile() is not None:
+            print(json.dumps({"event": "profile", **current_profile().to_dict()}, ensure_ascii=False), flush=True)
+        st.close()
+        return
 
-    # record coactivation edges among seeds
-    for i in range(len(seed_ids)):
-        for j in range(i+1, len(seed_ids)):
-            a, b = seed_ids[i], seed_ids[j]
-            st.idx.upsert_edge(a, b, kind="coact", weight=1.0, ts=ts, n_inc=1)
-            st.idx.upsert_edge(b, a, kind="coact", weight=1.0, ts=ts, n_inc=1)
+    seeds = r.l1_search(args.query, k=args.k, filters=filters, diverse=bool(args.diverse), mode=args.mode)
+    l2 = r.l2_expand(seeds, neighbor_k=cfg.l2_neighbor_k, take=args.l2, filters=filters)
+    meta = r.propose_meta(seeds, l2, take=args.meta)
+    clusters = {}
+    if cfg.brief_use_clusters and not args.no_clusters:
+        # L2/meta above were expanded from the member atoms; only the L1 lines are folded
+        seeds, clusters = substitute_clusters(st, seeds)
+    l2_dicts = [{"atom_id": x.atom_id, "score": x.score, "reasons": x.reasons} for x in l2]
+    meta_dicts = [{"title": m.title, "summary": m.summary, "members": m.members, "score": m.score, "reasons": m.reasons} for m in meta]
 
+    pack = None
+    if args.max_tokens:
+        pack = pack_brief(args.query, seeds, l2_suggestions=l2_dicts, meta=meta_dicts, filters=filters,
+                          max_tokens=args.max_tokens, near_dup_distance=cfg.near_dup_max_distance)
+        brief = pack.text
+        # only what made it into the context block counts as used
+        seed_ids = pack.atom_ids
+    else:
+        brief = build_brief(args.query, seeds, l2_suggestions=l2_dicts, meta=meta_dicts, filters=filters)
+        seed_ids = [x.atom_id for x in seeds]
+
+    out = {"ok": True, "brief": brief, "atom_ids": seed_ids,
+           "l2_suggestions": [x.__dict__ for x in l2],
+           "meta_candidates": [m.__dict__ for m in meta],
+           "tokens_est": pack.tokens_est if pack else estimate_tokens(brief)}
+    if pack:
+        out.update(max_tokens=args.max_tokens, dropped=pack.dropped, collapsed=pack.collapsed)
+    if clusters:
+        out["clusters"] = clusters
+    # respond first; the strengthening and co-activation writes don't change this answer.
+    # (record_use strengthens a cluster line's members, not the cluster atom)
+    _respond(out, lambda: None if read_only else
+             st.record_use(args.query, seed_ids, kind="brief", meta=_brief_act_meta(args, filters, decay_meta),
+                           delta_w=0.02, coact=True))
     st.close()
-    brief = build_brief(
-        args.query,
-        seeds,
-        l2_suggestions=[{"atom_id": x.atom_id, "score": x.score, "reasons": x.reasons} for x in l2],
-        meta=[{"title": m.title, "summary": m.summary, "members": m.members, "score": m.score, "reasons": m.reasons} for m in meta],
-    )
-    print(json.dumps({"ok": True, "brief": brief, "atom_ids": seed_ids,
-                      "l2_suggestions": [x.__dict__ for x in l2],
-                      "meta_candidates": [m.__dict__ for m in meta]}, ensure_ascii=False))
 
 def cmd_prune(args):
-    cfg = get_config()
-    st = SynapticStore(cfg)
+    from .prune import prune_to_budget
+    st = _open_store(args)
     st.init()
-    rep = prune_to_budget(st, max_mb=args.max_mb, dry_run=bool(args.dry_run))
+    reports = {}
+    for ns in _target_stores(st, args):
+        reports[ns.namespace] = prune_to_budget(ns, max_mb=args.max_mb, dry_run=bool(args.dry_run),
+                                                workers=args.workers).__dict__
     st.close()
-    print(json.dumps({"ok": True, "report": rep.__dict__}, ensure_ascii=False))
+    if args.all_namespaces:
+        print(json.dumps({"ok": True, "reports": reports}, ensure_ascii=False))
+    else:
+        print(json.dumps({"ok": True, "report": reports[st.namespace]}, ensure_ascii=False))
 
 def cmd_decay(args):
-    cfg = get_config()
-    st = SynapticStore(cfg)
+    from .decay import apply_decay
+    st = _open_store(args)
+    st.init()
+    reports = {}
+    for ns in _target_stores(st, args):
+        reports[ns.namespace] = apply_decay(ns, half_life_days=args.half_life_days or st.cfg.decay_half_life_days,
+                                            workers=args.workers).__dict__
+    st.close()
+    if args.all_namespaces:
+        print(json.dumps({"ok": True, "reports": reports}, ensure_ascii=False))
+    else:
+        print(json.dumps({"ok": True, "report": reports[st.namespace]}, ensure_ascii=False))
+
+def cmd_reindex(args):
+    from .reindex import reindex_store
+    st = _open_store(args)
     st.init()
-    rep = apply_decay(st, half_life_days=args.half_life_days or cfg.decay_half_life_days)
+    reports = {}
+    for ns in _target_stores(st, args):
+        reports[ns.namespace] = reindex_store(ns, workers=args.workers).__dict__
+    st.close()
+    if args.all_namespaces:
+        print(json.dumps({"ok": True, "reports": reports}, ensure_ascii=False))
+    else:
+        print(json.dumps({"ok": True, "report": reports[st.namespace]}, ensure_ascii=False))
+
+def cmd_pack(args):
+    from pathlib import Path
+    from .pack import write_pack
+    st = _open_store(args, read_only=True)
+    rep = write_pack(st, Path(args.out))
     st.close()
     print(json.dumps({"ok": True, "report": rep.__dict__}, ensure_ascii=False))
 
+def cmd_dedupe(args):
+    from .dedupe import dedupe_store
+    st = _open_store(args)
+    st.init()
+    reports = {}
+    for ns in _target_stores(st, args):
+        reports[ns.namespace] = dedupe_store(ns, dry_run=bool(args.dry_run)).__dict__
+    st.close()
+    if args.all_namespaces:
+        print(json.dumps({"ok": True, "reports": reports}, ensure_ascii=False))
+    else:
+        print(json.dumps({"ok": True, "report": reports[st.namespace]}, ensure_ascii=False))
+
+def cmd_offload(args):
+    st = _open_store(args)
+    st.init()
+    moved = {}
+    for ns in _target_stores(st, args):
+        moved[ns.namespace] = ns.offload_inline_content(dry_run=bool(args.dry_run))
+    st.close()
+    print(json.dumps({"ok": True, "moved": moved}, ensure_ascii=False))
+
+def cmd_cluster(args):
+    import time
+    from .cluster import ClusterEngine
+    st = _open_store(args)
+    st.init()
+    while True:
+        reports = {}
+        for ns in _target_stores(st, args):
+            eng = ClusterEngine(ns)
+            reports[ns.namespace] = (eng.rebuild() if args.rebuild else eng.update()).__dict__
+        if args.all_namespaces:
+            print(json.dumps({"ok": True, "reports": reports}, ensure_ascii=False), flush=True)
+        else:
+            print(json.dumps({"ok": True, "report": reports[st.namespace]}, ensure_ascii=False), flush=True)
+        if not args.watch:
+            break
+        # later passes are incremental even when the first one rebuilt
+        args.rebuild = False
+        time.sleep(args.watch)
+    st.close()
+
+def cmd_aggregate(args):
+    import time
+    from .aggregate import aggregate_activations
+    st = _open_store(args)
+    st.init()
+    while True:
+        reports = {}
+        for ns in _target_stores(st, args):
+            reports[ns.namespace] = aggregate_activations(ns, rebuild=args.rebuild, window_days=args.window_days,
+                                                          half_life_days=args.half_life_days).__dict__
+        if args.all_namespaces:
+            print(json.dumps({"ok": True, "reports": reports}, ensure_ascii=False), flush=True)
+        else:
+            print(json.dumps({"ok": True, "report": reports[st.namespace]}, ensure_ascii=False), flush=True)
+        if not args.watch:
+            break
+        args.rebuild = False
+        time.sleep(args.watch)
+    st.close()
+
+def cmd_embed(args):
+    import time
+    from .vectorize import embed_pending
+    st = _open_store(args)
+    if args.status:
+        emb = st.embedder
+        ns = None if args.all_namespaces else st.namespace
+        print(json.dumps({"ok": True, "model": emb.version, "inline": bool(emb.inline),
+                          "pending": st.idx.count_missing_vectors(emb.version, ns)}, ensure_ascii=False))
+        st.close()
+        return
+    while True:
+        rep = embed_pending(st, batch=args.batch or None, workers=args.workers or None, limit=args.limit or None,
+                            all_namespaces=bool(args.all_namespaces))
+        print(json.dumps({"ok": True, "report": rep.__dict__}, ensure_ascii=False), flush=True)
+        if not args.watch:
+            break
+        time.sleep(args.watch)
+    st.close()
+
+def cmd_bench(args):
+    from .bench import ALL_OPS, BenchSpec, bench_startup, run_bench
+    if args.startup:
+        res = bench_startup(base_cfg=get_config(), runs=args.startup_runs, target_ms=args.startup_target_ms)
+        print(json.dumps({"ok": res["ok"], "startup": res}, ensure_ascii=False))
+        if not res["ok"]:
+            raise SystemExit(1)
+        return
+    ops = tuple(_split_csv(args.ops)) or ALL_OPS
+    unknown = [o for o in ops if o not in ALL_OPS]
+    if unknown:
+        print(json.dumps({"ok": False, "error": f"unknown ops: {','.join(unknown)}", "ops": list(ALL_OPS)}, ensure_ascii=False))
+        return
+    spec = BenchSpec(seed=args.seed, words_median=args.words_median, words_sigma=args.words_sigma,
+                     tag_cardinality=args.tags, coact_degree=args.coact_degree, queries=args.queries,
+                     adds=args.adds, repeats=args.repeats)
+    sizes = [int(x) for x in _split_csv(args.sizes)]
+    res = run_bench(sizes, spec, base_cfg=get_config(), ops=ops, home=args.home or None, keep=bool(args.home))
+    text = json.dumps({"ok": True, "bench": res}, ensure_ascii=False, indent=2 if args.out else None)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    print(text)
+
+def cmd_migrate(args):
+    from . import migrations
+    from .index import SynapticIndex
+    cfg = get_config()
+    db = cfg.home / "synaptic.sqlite"
+    if not db.exists():
+        print(json.dumps({"ok": False, "error": f"no store at {cfg.home} (run `syn init`)"}, ensure_ascii=False))
+        return
+    # --status only reads: a read-only connection, never a schema change
+    idx = SynapticIndex(db, read_only=not args.apply, migrate=False, cfg=cfg)
+    try:
+        if args.apply:
+            res = migrations.apply(idx, batch=args.batch, max_seconds=args.max_seconds or None)
+        else:
+            res = migrations.status(idx)
+    finally:
+        idx.close()
+    print(json.dumps({"ok": True, "migrations": res}, ensure_ascii=False))
+
+def cmd_show(args):
+    from .util import to_jsonable
+    st = _open_store(args, read_only=True)
+    row = st.get_atom(args.atom_id)
+    if row is None:
+        st.close()
+        print(json.dumps({"ok": False, "error": f"unknown atom: {args.atom_id}"}, ensure_ascii=False))
+        return
+    atom = st.row_to_atom(row)
+    atom.content = st.load_content(atom)
+    st.close()
+    print(json.dumps({"ok": True, "atom": to_jsonable(atom)}, ensure_ascii=False))
+
+def cmd_namespaces(args):
+    st = _open_store(args, read_only=True)
+    rows = st.namespaces()
+    st.close()
+    for r in rows:
+        r["budget_mb"] = st.cfg.budget_mb(r["namespace"])
+    print(json.dumps({"ok": True, "namespaces": rows}, ensure_ascii=False))
+
 def main():
     p = argparse.ArgumentParser(prog="syn", description="Synaptic: local AI memory store")
+    p.add_argument("--namespace", default="", help="tenant namespace (default: $SYNAPTIC_NAMESPACE or 'default')")
     sub = p.add_subparsers(dest="cmd", required=True)
 
     sp = sub.add_parser("init", help="Initialize synaptic_data folder")
@@ -134,12 +436,23 @@ def main():
     sp.add_argument("--source-kind", default="")
     sp.add_argument("--source-ref", default="")
     sp.add_argument("--pinned", action="store_true")
+    sp.add_argument("--no-dedupe", action="store_true", help="always insert, even if identical content exists")
+    sp.add_argument("--skip-near-dup", action="store_true", help="do not insert if a near-duplicate atom exists")
     sp.set_defaults(func=cmd_add)
 
     sp = sub.add_parser("search", help="L1 search")
     sp.add_argument("query")
     sp.add_argument("--k", type=int, default=12)
     sp.add_argument("--decay", action="store_true", help="Apply time-based decay before searching (persists).")
+    sp.add_argument("--diverse", action="store_true", help="collapse near-duplicate results")
+    sp.add_argument("--mode", choices=("classic", "hybrid"), default=None,
+                    help="L1 ranking: classic (FTS + rescoring) or hybrid (FTS and vectors, RRF); default from config")
+    sp.add_argument("--profile", action="store_true", help="add per-stage timings and row counts to the output")
+    sp.add_argument("--read-only", action="store_true",
+                    help="do not record use (no strengthening/co-activation); opens the index read-only")
+    sp.add_argument("--pack", default="", metavar="FILE",
+                    help="answer from a `syn pack` snapshot instead of the live store (implies --read-only)")
+    _add_filter_args(sp)
     sp.set_defaults(func=cmd_search)
 
     sp = sub.add_parser("brief", help="Build a memory brief (L1 + L2)")
@@ -148,19 +461,140 @@ def main():
     sp.add_argument("--l2", type=int, default=8, help="number of L2 suggestions")
     sp.add_argument("--meta", type=int, default=3, help="number of meta pattern candidates")
     sp.add_argument("--decay", action="store_true", help="Apply time-based decay before building the brief (persists).")
+    sp.add_argument("--diverse", action="store_true", help="collapse near-duplicate L1 atoms")
+    sp.add_argument("--mode", choices=("classic", "hybrid"), default=None,
+                    help="L1 ranking: classic (FTS + rescoring) or hybrid (FTS and vectors, RRF); default from config")
+    sp.add_argument("--max-tokens", type=int, default=0,
+                    help="pack the brief into this many (estimated) tokens, choosing atoms by score per token")
+    sp.add_argument("--stream", action="store_true",
+                    help="emit NDJSON events (l1, l2, meta, done) as each stage completes")
+    sp.add_argument("--no-clusters", action="store_true",
+                    help="list member atoms instead of substituting their cluster atom")
+    sp.add_argument("--profile", action="store_true",
+                    help="add per-stage timings and row counts to the output (with --stream: a final profile event)")
+    sp.add_argument("--read-only", action="store_true",
+                    help="do not record use (no strengthening/co-activation); opens the index read-only")
+    sp.add_argument("--pack", default="", metavar="FILE",
+                    help="answer from a `syn pack` snapshot instead of the live store (implies --read-only)")
+    _add_filter_args(sp)
     sp.set_defaults(func=cmd_brief)
 
     sp = sub.add_parser("prune", help="Prune to budget")
-    sp.add_argument("--max-mb", type=float, default=50.0)
+    sp.add_argument("--max-mb", type=float, default=None, help="budget override (default: the namespace's configured budget)")
     sp.add_argument("--dry-run", action="store_true")
+    sp.add_argument("--all-namespaces", action="store_true", help="prune every namespace to its own budget")
+    sp.add_argument("--workers", type=int, default=None,
+                    help="worker processes (default: $SYNAPTIC_WORKERS or 1; 0 = one per CPU)")
     sp.set_defaults(func=cmd_prune)
 
     sp = sub.add_parser("decay", help="Apply time-based decay to stored strengths (maintenance)")
     sp.add_argument("--half-life-days", type=float, default=0.0, help="Override decay half-life for this run.")
+    sp.add_argument("--all-namespaces", action="store_true", help="decay every namespace")
+    sp.add_argument("--workers", type=int, default=None,
+                    help="worker processes (default: $SYNAPTIC_WORKERS or 1; 0 = one per CPU)")
     sp.set_defaults(func=cmd_decay)
 
+    sp = sub.add_parser("reindex", help="Recompute content hashes, SimHash/LSH and inline vectors for every atom (maintenance)")
+    sp.add_argument("--all-namespaces", action="store_true", help="reindex every namespace")
+    sp.add_argument("--workers", type=int, default=None,
+                    help="worker processes (default: $SYNAPTIC_WORKERS or 1; 0 = one per CPU)")
+    sp.set_defaults(func=cmd_reindex)
+
+    sp = sub.add_parser("dedupe", help="Merge atoms with identical content hashes (maintenance)")
+    sp.add_argument("--dry-run", action="store_true")
+    sp.add_argument("--all-namespaces", action="store_true", help="dedupe every namespace")
+    sp.set_defaults(func=cmd_dedupe)
+
+    sp = sub.add_parser("offload", help="Move large inline atom bodies into blobs/ (maintenance)")
+    sp.add_argument("--dry-run", action="store_true")
+    sp.add_argument("--all-namespaces", action="store_true", help="offload in every namespace")
+    sp.set_defaults(func=cmd_offload)
+
+    sp = sub.add_parser("embed", help="Compute missing atom vectors with the configured embedder (batched, cached)")
+    sp.add_argument("--status", action="store_true", help="only report the embedder and how many atoms lack a vector")
+    sp.add_argument("--batch", type=int, default=0, help="texts per embedder call (default: config embed_batch)")
+    sp.add_argument("--workers", type=int, default=0, help="concurrent embedder calls (default: config embed_workers)")
+    sp.add_argument("--limit", type=int, default=0, help="embed at most this many atoms per pass")
+    sp.add_argument("--watch", type=float, default=0.0, metavar="SECONDS",
+                    help="keep running, embedding new atoms every SECONDS")
+    sp.add_argument("--all-namespaces", action="store_true", help="embed every namespace")
+    sp.set_defaults(func=cmd_embed)
+
+    sp = sub.add_parser("cluster", help="Update co-activation clusters (persisted as cluster atoms)")
+    sp.add_argument("--rebuild", action="store_true", help="drop existing clusters and recompute from scratch")
+    sp.add_argument("--watch", type=float, default=0.0, metavar="SECONDS",
+                    help="keep running, updating incrementally every SECONDS")
+    sp.add_argument("--all-namespaces", action="store_true", help="cluster every namespace")
+    sp.set_defaults(func=cmd_cluster)
+
+    sp = sub.add_parser("aggregate", help="Build co-activation edges from the activation log (incremental)")
+    sp.add_argument("--rebuild", action="store_true", help="drop co-activation edges and replay the whole log")
+    sp.add_argument("--window-days", type=float, default=None, metavar="D",
+                    help="only count events of the last D days (default SYNAPTIC_COACT_WINDOW_DAYS; 0 = all)")
+    sp.add_argument("--half-life-days", type=float, default=None, metavar="H",
+                    help="decay of co-activation weight (default SYNAPTIC_COACT_HALF_LIFE_DAYS)")
+    sp.add_argument("--watch", type=float, default=0.0, metavar="SECONDS",
+                    help="keep running, folding in new events every SECONDS")
+    sp.add_argument("--all-namespaces", action="store_true", help="aggregate every namespace")
+    sp.set_defaults(func=cmd_aggregate)
+
+    sp = sub.add_parser("bench", help="Benchmark core operations on synthetic stores (JSON results)")
+    sp.add_argument("--sizes", default="1000,10000", help="atom counts, e.g. 1000,10000,100000,1000000")
+    sp.add_argument("--ops", default="", help="subset of add_atom,l1_search,l2_expand,propose_meta,relevance,apply_decay,prune_to_budget")
+    sp.add_argument("--seed", type=int, default=1)
+    sp.add_argument("--words-median", type=float, default=20.0, help="median content length in words (lognormal)")
+    sp.add_argument("--words-sigma", type=float, default=0.8)
+    sp.add_argument("--tags", type=int, default=50, help="tag cardinality")
+    sp.add_argument("--coact-degree", type=float, default=4.0, help="mean co-activation edges per atom")
+    sp.add_argument("--queries", type=int, default=100, help="timed samples for search/expand/meta")
+    sp.add_argument("--adds", type=int, default=200, help="timed single add_atom calls per size")
+    sp.add_argument("--repeats", type=int, default=3, help="timed runs of decay/prune per size")
+    sp.add_argument("--home", default="", help="keep generated stores under this folder (default: temp, deleted)")
+    sp.add_argument("--out", default="", help="also write the JSON results to this file")
+    sp.add_argument("--startup", action="store_true",
+                    help="time whole `syn` processes for read commands instead (exit 1 if over target)")
+    sp.add_argument("--startup-runs", type=int, default=20)
+    sp.add_argument("--startup-target-ms", type=float, default=200.0, help="p50 budget per command")
+    sp.set_defaults(func=cmd_bench)
+
+    sp = sub.add_parser("pack", help="Write a read-only memory-mapped snapshot of the namespace for fast cold starts")
+    sp.add_argument("out", help="pack file to write (replaced atomically)")
+    sp.set_defaults(func=cmd_pack)
+
+    sp = sub.add_parser("migrate", help="Show or apply pending index schema migrations")
+    sp.add_argument("--status", action="store_true", help="report schema version and pending steps (default)")
+    sp.add_argument("--apply", action="store_true", help="run pending migrations (resumable, in batches)")
+    sp.add_argument("--batch", type=int, default=2000, help="atoms per backfill transaction")
+    sp.add_argument("--max-seconds", type=float, default=0.0, help="stop after this long; rerun to resume")
+    sp.set_defaults(func=cmd_migrate)
+
+    sp = sub.add_parser("show", help="Show one atom with its full body")
+    sp.add_argument("atom_id")
+    sp.set_defaults(func=cmd_show)
+
+    sp = sub.add_parser("namespaces", help="List namespaces with atom counts and budgets")
+    sp.set_defaults(func=cmd_namespaces)
+
     args = p.parse_args()
-    args.func(args)
+    if getattr(args, "stream", False) and getattr(args, "max_tokens", 0):
+        p.error("--stream cannot be combined with --max-tokens (packing needs every line first)")
+    if getattr(args, "read_only", False) and getattr(args, "decay", False):
+        p.error("--read-only cannot be combined with --decay (decay persists strengths)")
+    if getattr(args, "pack", "") and getattr(args, "decay", False):
+        p.error("--pack cannot be combined with --decay (packs are read-only snapshots)")
+    try:
+        if getattr(args, "profile", False):
+            with profiling():
+                args.func(args)
+        else:
+            args.func(args)
+    except RuntimeError as e:
+        # SchemaVersionError is a RuntimeError; migrations is only imported here, once something failed
+        from .migrations import SchemaVersionError
+        if not isinstance(e, SchemaVersionError):
+            raise
+        print(json.dumps({"ok": False, "error": str(e)}, ensure_ascii=False))
+        raise SystemExit(1)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,178 @@
+from __future__ import annotations
+from dataclasses import dataclass, field
+from typing import Dict, List, Set, Tuple
+
+from .brief import estimate_tokens, format_atom_line
+from .models import AtomFilter, Retrieved
+from .util import now_iso, safe_truncate
+
+@dataclass
+class ClusterReport:
+    nodes: int                 # atoms whose community label was recomputed
+    created: int
+    updated: int
+    removed: int
+    clusters: List[str] = field(default_factory=list)   # cluster atom ids created/updated this run
+    watermark: str = ""
+    ts: str = ""
+
+def _edge_weight(weight, n) -> float:
+    # same blend propose_meta uses for co-activation strength
+    return float(weight or 0.0) + 0.05*float(n or 0)
+
+class ClusterEngine:
+    """Incremental community detection over the `coact` graph of one namespace.
+
+    Communities come from asynchronous label propagation and are persisted as atoms of type
+    `cluster` (member list in `cluster_member` and in the atom's source). Each `update()` only
+    relabels atoms touched by co-activation edges changed since the previous run, plus the other
+    members of their communities; everything else keeps its label, so the cost follows the
+    change rate rather than the graph size. `rebuild()` starts over from scratch.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self.cfg = store.cfg
+        self._wm_key = f"cluster_watermark:{store.namespace}"
+
+    def update(self, *, max_iter: int = 20) -> ClusterReport:
+        idx = self.store.idx
+        ts = now_iso()
+        wm = idx.get_meta(self._wm_key)
+        changed = idx.coact_changed_since(self.store.namespace, wm)
+        touched = {r["src"] for r in changed} | {r["dst"] for r in changed}
+        rep = self._relabel(touched, max_iter=max_iter, ts=ts)
+        rep.watermark = max([wm, *[r["last_ts"] or "" for r in changed]])
+        idx.set_meta(self._wm_key, rep.watermark)
+        return rep
+
+    def rebuild(self, *, max_iter: int = 20) -> ClusterReport:
+        removed = 0
+        for row in list(self.store.iter_atoms_indexed(AtomFilter(type=["cluster"]), columns=("atom_id",))):
+            self.store.delete_atom(row["atom_id"])
+            removed += 1
+        self.store.idx.set_meta(self._wm_key, "")
+        rep = self.update(max_iter=max_iter)
+        rep.removed += removed
+        return rep
+
+    def _relabel(self, touched: Set[str], *, max_iter: int, ts: str) -> ClusterReport:
+        idx = self.store.idx
+        current = idx.clusters_of(sorted(touched))
+        old_clusters = set(current.values())
+        old_members = idx.cluster_members(sorted(old_clusters))
+        active = set(touched) | {m for ms in old_members.values() for m in ms}
+
+        adj: Dict[str, Dict[str, float]] = {}
+        for e in idx.coact_adjacency(sorted(active), min_n=self.cfg.cluster_min_coact):
+            w = _edge_weight(e["weight"], e["n"])
+            slot = adj.setdefault(e["src"], {})
+            slot[e["dst"]] = max(slot.get(e["dst"], 0.0), w)
+        frozen = {d for nbrs in adj.values() for d in nbrs} - active
+
+        labels = {a: a for a in active | frozen}
+        labels.update(idx.clusters_of(sorted(active | frozen)))
+        known_clusters = set(labels.values()) & (old_clusters | set(idx.clusters_of(sorted(frozen)).values()))
+
+        order = sorted(active)
+        for _ in range(max_iter):
+            moved = 0
+            for a in order:
+                votes: Dict[str, float] = {}
+                for b, w in adj.get(a, {}).items():
+                    votes[labels[b]] = votes.get(labels[b], 0.0) + w
+                if not votes:
+                    best = a
+                else:
+                    # heaviest label; ties keep the current label, then the smallest id (deterministic)
+                    best = min(votes.items(), key=lambda kv: (-kv[1], kv[0] != labels[a], kv[0]))[0]
+                if best != labels[a]:
+                    labels[a] = best
+                    moved += 1
+            if not moved:
+                break
+
+        groups: Dict[str, Set[str]] = {}
+        for a in active:
+            groups.setdefault(labels[a], set()).add(a)
+        adopted = idx.cluster_members(sorted(set(groups) & known_clusters - old_clusters))
+        for cid, ms in adopted.items():
+            groups[cid] |= set(ms) - active
+
+        rep = ClusterReport(nodes=len(active), created=0, updated=0, removed=0, ts=ts)
+        for label, members_set in sorted(groups.items()):
+            members = sorted(members_set)
+            ok = self.cfg.cluster_min_size <= len(members) <= self.cfg.cluster_max_size
+            if label in known_clusters:
+                if not ok:
+                    self.store.delete_atom(label)
+                    rep.removed += 1
+                elif members != sorted(old_members.get(label, adopted.get(label, []))):
+                    self._write_cluster(members, cluster_id=label)
+                    rep.updated += 1
+                    rep.clusters.append(label)
+            elif ok:
+                rep.clusters.append(self._write_cluster(members))
+                rep.created += 1
+        for cid in old_clusters - set(groups):
+            self.store.delete_atom(cid)
+            rep.removed += 1
+        return rep
+
+    def _write_cluster(self, members: List[str], cluster_id: str = "") -> str:
+        idx = self.store.idx
+        rows = [dict(r) for r in (idx.get_atom(m) for m in members) if r is not None]
+        rows.sort(key=lambda r: (-float(r["w"] or 0.0), r["atom_id"]))
+        heads = [safe_truncate((r["summary"] or "").replace("\n", " "), 60) for r in rows[:4]]
+        summary = f"Cluster ({len(rows)}): " + "; ".join(heads) + ("; …" if len(rows) > 4 else "")
+        content = "\n".join(f"- [{r['atom_id']}] {(r['summary'] or '').strip()}" for r in rows)
+        scope = list(dict.fromkeys(x for r in rows for x in (r["scope"] or "").split(",") if x))
+        entities = list(dict.fromkeys(x for r in rows for x in (r["entities"] or "").split(",") if x))
+        source = {"kind": "cluster", "algo": "label_propagation", "members": members}
+        if cluster_id:
+            self.store.update_atom_body(cluster_id, summary=summary, content=content, source=source,
+                                        scope=scope, entities=entities)
+        else:
+            cluster_id = self.store.add_atom(type="cluster", scope=scope, tags=["cluster"], entities=entities,
+                                             content=content, summary=summary, source=source,
+                                             dedupe=False).atom_id
+        idx.set_cluster_members(cluster_id, members)
+        return cluster_id
+
+def substitute_clusters(store, seeds: List[Retrieved], *, min_members: int = 2) -> Tuple[List[Retrieved], Dict[str, List[str]]]:
+    """Replace seeds that share a persisted cluster with one line for the cluster atom,
+    whenever that line is cheaper (in estimated tokens) than the member lines it replaces.
+
+    Returns (new seeds, {cluster_id: replaced member ids}).
+    """
+    cmap = store.idx.clusters_of([s.atom_id for s in seeds])
+    groups: Dict[str, List[Retrieved]] = {}
+    for s in seeds:
+        if s.atom_id in cmap:
+            groups.setdefault(cmap[s.atom_id], []).append(s)
+
+    present = {s.atom_id for s in seeds}
+    replace: Dict[str, Retrieved] = {}     # first member id -> cluster line
+    dropped: Set[str] = set()
+    used: Dict[str, List[str]] = {}
+    for cid, ms in groups.items():
+        if len(ms) < min_members:
+            continue
+        if cid in present:
+            # the cluster atom was retrieved itself; its line already covers these members
+            dropped.update(m.atom_id for m in ms)
+            used[cid] = [m.atom_id for m in ms]
+            continue
+        row = store.idx.get_atom(cid)
+        if row is None:
+            continue
+        cl = Retrieved(atom_id=cid, score=max(m.score for m in ms),
+                       reasons=[f"cluster:{len(ms)} members"], row=dict(row))
+        if estimate_tokens(format_atom_line(cl)) >= sum(estimate_tokens(format_atom_line(m)) for m in ms):
+            continue
+        replace[ms[0].atom_id] = cl
+        dropped.update(m.atom_id for m in ms[1:])
+        used[cid] = [m.atom_id for m in ms]
+
+    out = [replace.get(s.atom_id, s) for s in seeds if s.atom_id not in dropped]
+    return out, used
@@ -1,12 +1,19 @@
 from __future__ import annotations
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from pathlib import Path
+from typing import Dict, Tuple
 import os
 
 @dataclass(frozen=True)
 class SynapticConfig:
     home: Path
     embed_dim: int = 256
+    # Embedder backend (a key of synaptic.embeddings.EMBEDDERS). "hasher" is built in and cheap enough to run
+    # on every write; "sentence-transformers" (optional dependency) is embedded in batches by `syn embed`.
+    embedder: str = "hasher"
+    embedder_model: str = "sentence-transformers/all-MiniLM-L6-v2"
+    embed_batch: int = 64          # texts per embed_many() call
+    embed_workers: int = 2         # threads running embed_many() concurrently in `syn embed`
 
     # L2
     l2_neighbor_k: int = 30
@@ -16,17 +23,111 @@ class SynapticConfig:
     max_atom_bytes: int = 32_000   # hard cap for atom content+summary
     max_result_atoms: int = 50     # hard cap for retrieval output size
 
+    # Bodies larger than this (UTF-8 bytes) go to blobs/ and only summary + ref stay in the hot tables.
+    blob_threshold_bytes: int = 4096
+    blob_compress: bool = True
+    # Summary kept in the ledger/hot tables for an offloaded body (defaulted or given); the body stays in FTS.
+    blob_summary_chars: int = 512
+
+    # Content-addressed dedup: re-adding identical summary+content merges into the existing atom.
+    dedupe_on_add: bool = True
+    # Near-duplicates: max SimHash Hamming distance (of 64 bits). LSH lookup is exact up to 7.
+    near_dup_max_distance: int = 6
+
     # Decay (time-based). Interpreted as exponential half-life.
     # Example: half_life_days=30 -> strength halves every ~30 days of non-use.
     decay_half_life_days: float = 30.0
     decay_apply_on_retrieval: bool = True
 
+    # Worker processes for whole-store maintenance (decay, prune scoring, reindex); 1 = in-process, 0 = one per CPU.
+    maintenance_workers: int = 1
+
+    # Retrieval: "classic" rescores FTS (or LIKE) candidates by embedding cosine; "hybrid" runs FTS and a
+    # vector top-k over stored embeddings and fuses the two rankings with reciprocal-rank fusion (RRF).
+    retrieval_mode: str = "classic"
+    rrf_k: int = 60
+    fusion_w_fts: float = 1.0
+    fusion_w_vec: float = 1.0
+    hybrid_parallel: bool = True   # run FTS on a second read-only connection while the vector scan runs
+    hybrid_max_vectors: int = 200_000  # above this many stored vectors in the namespace, hybrid runs as classic (0 = no cap)
+    # score = w_rel*relevance + w_strength*tanh(w_eff/2) + w_uses*tanh(uses/10) + w_pinned*pinned
+    score_w_rel: float = 0.70
+    score_w_strength: float = 0.20
+    score_w_uses: float = 0.08
+    score_w_pinned: float = 0.02
+
+    # Clustering (co-activation communities persisted as `cluster` atoms)
+    cluster_min_coact: int = 2     # ignore pairs co-activated fewer times than this
+    cluster_min_size: int = 3
+    cluster_max_size: int = 24
+    brief_use_clusters: bool = True   # substitute a cluster atom for its members when cheaper
+
+    # Co-activation edges. With coact_sync every brief (and search, if listed in coact_kinds) links its atoms
+    # as it is served; with it off the request path writes no edges and `syn aggregate` builds them from
+    # activations.jsonl instead. Both paths count the same kinds, so either yields the same graph.
+    coact_sync: bool = True
+    coact_kinds: Tuple[str, ...] = ("brief",)   # activation kinds that link their atoms
+    coact_half_life_days: float = 30.0   # decay of a pair's co-activation mass
+    coact_window_days: float = 0.0       # `syn aggregate --rebuild`: only events this recent; 0 = whole log
+    coact_max_pairs: int = 200_000       # distinct pairs held in memory before a flush to the index
+
+    # Multi-tenancy: one database serves many agents, isolated by namespace.
+    namespace: str = "default"
+    # Per-namespace prune budgets in MB; namespaces not listed use `default_budget_mb`.
+    namespace_budgets_mb: Dict[str, float] = field(default_factory=dict)
+    default_budget_mb: float = 50.0
+
+    def budget_mb(self, namespace: str) -> float:
+        return float(self.namespace_budgets_mb.get(namespace, self.default_budget_mb))
+
+def _parse_budgets(s: str) -> Dict[str, float]:
+    # "agent-a=10,agent-b=25.5"
+    out: Dict[str, float] = {}
+    for part in s.split(","):
+        if "=" in part:
+            ns, mb = part.split("=", 1)
+            out[ns.strip()] = float(mb)
+    return out
+
 def get_config() -> SynapticConfig:
     # Prefer env override; else use ./synaptic_data (repo-friendly, portable)
     home = Path(os.environ.get("SYNAPTIC_HOME", "./synaptic_data")).expanduser().resolve()
     embed_dim = int(os.environ.get("SYNAPTIC_EMBED_DIM", "256"))
+    embedder = os.environ.get("SYNAPTIC_EMBEDDER", "hasher").strip().lower() or "hasher"
+    embedder_model = os.environ.get("SYNAPTIC_EMBEDDER_MODEL", "").strip() or SynapticConfig.embedder_model
 
     hl = float(os.environ.get("SYNAPTIC_DECAY_HALF_LIFE_DAYS", "30"))
     apply_on_ret = os.environ.get("SYNAPTIC_DECAY_ON_RETRIEVAL", "1").strip().lower() not in ("0", "false", "no")
 
-    return SynapticConfig(home=home, embed_dim=embed_dim, decay_half_life_days=hl, decay_apply_on_retrieval=apply_on_ret)
+    namespace = os.environ.get("SYNAPTIC_NAMESPACE", "default").strip() or "default"
+    budgets = _parse_budgets(os.environ.get("SYNAPTIC_NAMESPACE_BUDGETS", ""))
+    default_budget = float(os.environ.get("SYNAPTIC_BUDGET_MB", "50"))
+    dedupe = os.environ.get("SYNAPTIC_DEDUPE", "1").strip().lower() not in ("0", "false", "no")
+    near_dup = int(os.environ.get("SYNAPTIC_NEAR_DUP_DISTANCE", "6"))
+    blob_threshold = int(os.environ.get("SYNAPTIC_BLOB_THRESHOLD_BYTES", "4096"))
+    blob_compress = os.environ.get("SYNAPTIC_BLOB_COMPRESS", "1").strip().lower() not in ("0", "false", "no")
+    blob_summary = int(os.environ.get("SYNAPTIC_BLOB_SUMMARY_CHARS", "512"))
+    min_coact = int(os.environ.get("SYNAPTIC_CLUSTER_MIN_COACT", "2"))
+    use_clusters = os.environ.get("SYNAPTIC_BRIEF_CLUSTERS", "1").strip().lower() not in ("0", "false", "no")
+    workers = int(os.environ.get("SYNAPTIC_WORKERS", "1"))
+    mode = os.environ.get("SYNAPTIC_RETRIEVAL_MODE", "classic").strip().lower() or "classic"
+    rrf_k = int(os.environ.get("SYNAPTIC_RRF_K", "60"))
+    w_fts = float(os.environ.get("SYNAPTIC_FUSION_W_FTS", "1.0"))
+    w_vec = float(os.environ.get("SYNAPTIC_FUSION_W_VEC", "1.0"))
+    max_vectors = int(os.environ.get("SYNAPTIC_HYBRID_MAX_VECTORS", "200000"))
+    coact_sync = os.environ.get("SYNAPTIC_COACT_SYNC", "1").strip().lower() not in ("0", "false", "no")
+    coact_kinds = tuple(k.strip() for k in os.environ.get("SYNAPTIC_COACT_KINDS", "brief").split(",") if k.strip())
+    coact_hl = float(os.environ.get("SYNAPTIC_COACT_HALF_LIFE_DAYS", "30"))
+    coact_window = float(os.environ.get("SYNAPTIC_COACT_WINDOW_DAYS", "0"))
+
+    return SynapticConfig(home=home, embed_dim=embed_dim, embedder=embedder, embedder_model=embedder_model,
+                          decay_half_life_days=hl, decay_apply_on_retrieval=apply_on_ret,
+                          namespace=namespace, namespace_budgets_mb=budgets, default_budget_mb=default_budget,
+                          dedupe_on_add=dedupe, near_dup_max_distance=near_dup,
+                          blob_threshold_bytes=blob_threshold, blob_compress=blob_compress,
+                          blob_summary_chars=blob_summary,
+                          cluster_min_coact=min_coact, brief_use_clusters=use_clusters,
+                          maintenance_workers=workers, retrieval_mode=mode, rrf_k=rrf_k, fusion_w_fts=w_fts, fusion_w_vec=w_vec,
+                          hybrid_max_vectors=max_vectors,
+                          coact_sync=coact_sync, coact_kinds=coact_kinds, coact_half_life_days=coact_hl,
+                          coact_window_days=coact_window)
@@ -1,7 +1,8 @@
 from __future__ import annotations
 from dataclasses import dataclass
-from typing import List
+from typing import Any, Dict, List, Optional, Tuple
 
+from .parallel import map_ranges, resolve_workers, rowid_ranges
 from .util import now_iso, exp_decay_factor
 
 @dataclass
@@ -11,44 +12,60 @@ class DecayReport:
     avg_factor: float
     ts: str
 
-def apply_decay(store, *, half_life_days: float, min_delta: float = 1e-6) -> DecayReport:
+def _decay_rows(rows, p: Dict[str, Any]) -> Tuple[int, float, int, List[Tuple[str, float, str]]]:
+    # (seen, sum of factors, factors counted, [(atom_id, new w, last_used_ts)]) for one rowid range
+    seen = 0
+    f_sum, f_n = 0.0, 0
+    updates: List[Tuple[str, float, str]] = []
+    for row in rows:
+        seen += 1
+        # cluster atoms are derived from their members and record_use strengthens the members in their
+        # place, so their strength never moves: nothing to decay
+        if int(row["pinned"] or 0) or row["type"] == "cluster":
+            continue
+        last_used = (row["last_used_ts"] or row["ts"] or "").strip()
+        f = exp_decay_factor(last_ts=last_used, now_ts=p["ts"], half_life_days=p["half_life_days"])
+        f_sum += f
+        f_n += 1
+        if f >= 0.999999:
+            continue
+
+        w = float(row["w"] or 0.0)
+        w2 = w * f
+        if abs(w2 - w) <= p["min_delta"]:
+            continue
+        # Preserve last_used_ts (do not set to "now" for decay)
+        updates.append((row["atom_id"], w2, row["last_used_ts"] or ""))
+    return seen, f_sum, f_n, updates
+
+def apply_decay(store, *, half_life_days: float, min_delta: float = 1e-6, workers: Optional[int] = None) -> DecayReport:
     """Persist decay into stored strengths (maintenance).
 
     Retrieval also applies dynamic decay for ranking, but persisting decay:
     - keeps stored w-values honest across long gaps,
     - improves pruning decisions,
     - makes the store behave more like synapses (weakening when unused).
+
+    Factors are computed per rowid range (in `workers` processes when > 1, default
+    cfg.maintenance_workers) and each range's new strengths are written in one transaction.
     """
     ts = now_iso()
     seen = 0
     updated = 0
-    factors: List[float] = []
+    f_sum, f_n = 0.0, 0
 
-    for row in store.iter_atoms_indexed():
-        seen += 1
-        pinned = bool(int(row.get("pinned") or 0))
-        if pinned:
-            continue
-        last_used = (row.get("last_used_ts") or row.get("ts") or "").strip()
-        f = exp_decay_factor(last_ts=last_used, now_ts=ts, half_life_days=half_life_days)
-        factors.append(f)
-        if f >= 0.999999:
-            continue
+    idx = store.idx
+    params = {"ts": ts, "half_life_days": half_life_days, "min_delta": min_delta}
+    n_workers = resolve_workers(store.cfg.maintenance_workers if workers is None else workers)
+    # each range is read completely before its writes, so rewritten rows are never visited twice
+    for _, (n, fs, fn, updates) in map_ranges(idx, _decay_rows, columns=("atom_id", "ts", "type", "w", "last_used_ts", "pinned"),
+                                              namespace=store.namespace, ranges=rowid_ranges(idx, store.namespace),
+                                              params=params, workers=n_workers):
+        seen += n
+        f_sum += fs
+        f_n += fn
+        store.set_strengths(updates)
+        updated += len(updates)
 
-        w = float(row.get("w") or 0.0)
-        w2 = w * f
-        if abs(w2 - w) <= min_delta:
-            continue
-
-        # Preserve last_used_ts (do not set to "now" for decay)
-        store.update_atom_strength(
-            row["atom_id"],
-            ts=ts,
-            delta_w=(w2 - w),
-            uses_inc=0,
-            last_used_ts=(row.get("last_used_ts") or "")
-        )
-        updated += 1
-
-    avg = float(sum(factors) / len(factors)) if factors else 1.0
+    avg = float(f_sum / f_n) if f_n else 1.0
     return DecayReport(atoms_seen=seen, atoms_updated=updated, avg_factor=avg, ts=ts)
@@ -0,0 +1,55 @@
+from __future__ import annotations
+from dataclasses import dataclass, field
+from typing import Dict, List
+
+from .util import now_iso
+
+@dataclass
+class DedupeReport:
+    groups: int
+    removed: int
+    merged: Dict[str, List[str]] = field(default_factory=dict)   # survivor atom_id -> removed duplicate ids
+    ts: str = ""
+
+def dedupe_store(store, *, dry_run: bool = True) -> DedupeReport:
+    """Collapse atoms that share a content hash, type and set of scopes (add_atom's dedup key) within the
+    store's namespace (maintenance).
+
+    The survivor of each group is the strongest atom (pinned, w, uses, then oldest). Duplicates fold
+    into it: scope/tags/entities are unioned, provenance appended, strength and uses summed, and
+    their edges re-pointed at the survivor before they are deleted from the index.
+    """
+    ts = now_iso()
+    merged: Dict[str, List[str]] = {}
+
+    groups: List[List[dict]] = []
+    for h in store.idx.duplicate_hashes(store.namespace):
+        by_key: Dict[tuple, List[dict]] = {}
+        for r in store.idx.atoms_by_hash(store.namespace, h):
+            key = (r["type"], frozenset(r["scope"].split(",") if r["scope"] else ()))
+            by_key.setdefault(key, []).append(dict(r))
+        groups.extend(rows for rows in by_key.values() if len(rows) > 1)
+
+    for rows in groups:
+        keep, dups = rows[0], rows[1:]
+        merged[keep["atom_id"]] = [d["atom_id"] for d in dups]
+        if dry_run:
+            continue
+
+        dup_atoms = [store.row_to_atom(d) for d in dups]
+        store.merge_into(
+            keep["atom_id"], ts=ts,
+            scope=[x for a in dup_atoms for x in a.scope],
+            tags=[x for a in dup_atoms for x in a.tags],
+            entities=[x for a in dup_atoms for x in a.entities],
+            sources=[dict(a.source, atom_id=a.atom_id) for a in dup_atoms],
+            pinned=any(a.pinned for a in dup_atoms),
+            delta_w=sum(a.w for a in dup_atoms),
+            uses_inc=sum(a.uses for a in dup_atoms),
+            last_used_ts=max(a.last_used_ts for a in dup_atoms),
+        )
+        for a in dup_atoms:
+            store.idx.redirect_edges(a.atom_id, keep["atom_id"])
+            store.delete_atom(a.atom_id)
+
+    return DedupeReport(groups=len(merged), removed=sum(len(v) for v in merged.values()), merged=merged, ts=ts)
@@ -1,10 +1,31 @@
 from __future__ import annotations
+from array import array
 from dataclasses import dataclass
-from typing import Dict
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Protocol, Sequence
 import hashlib
 import math
+
 from .util import tokenize
 
+if TYPE_CHECKING:
+    from .config import SynapticConfig
+
+class Embedder(Protocol):
+    """What the store and retriever need from an embedding backend.
+
+    - `embed_many` returns one unit-length float32 vector of length `dim` per text.
+    - `version` names the model and settings; stored vectors of another version are ignored.
+    - `inline` is True when embedding is cheap enough for every write and for query-time rescoring
+      of atoms without a stored vector; otherwise vectors are filled in batches by `syn embed`.
+    """
+    dim: int
+    inline: bool
+
+    @property
+    def version(self) -> str: ...
+
+    def embed_many(self, texts: Sequence[str]) -> List[array]: ...
+
 @dataclass
 class HasherEmbedder:
     """A tiny, local embedder based on **stable feature hashing**.
@@ -13,6 +34,12 @@ class HasherEmbedder:
     - Produces a sparse, L2-normalized vector dict {idx: value}.
     """
     dim: int = 256
+    inline = True
+
+    @property
+    def version(self) -> str:
+        # identifies stored vectors; changes whenever embed() would give different output
+        return f"hasher-v1:{self.dim}"
 
     def _stable_hash64(self, token: str) -> int:
         d = hashlib.sha256(token.encode("utf-8")).digest()
@@ -33,6 +60,76 @@ class HasherEmbedder:
             return counts
         return {k: v / norm for k, v in counts.items()}
 
+    def embed_many(self, texts: Sequence[str]) -> List[array]:
+        return [to_dense(self.embed(t), self.dim) for t in texts]
+
+class SentenceTransformerEmbedder:
+    """Local CPU/GPU sentence-embedding model (optional `sentence-transformers` dependency).
+
+    Too slow for the write path: atoms get their vectors from `syn embed`, which batches texts and
+    reuses vectors cached by content hash. The model (and torch) load on first use, so opening a
+    store or reading `version` stays cheap.
+    """
+    inline = False
+
+    def __init__(self, model_name: str, *, batch_size: int = 64, device: str = "cpu"):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.device = device
+        self._model = None
+
+    def _load(self):
+        if self._model is None:
+            try:
+                from sentence_transformers import SentenceTransformer
+            except ImportError as e:
+                raise RuntimeError("embedder 'sentence-transformers' needs the optional dependency: "
+                                   "pip install 'synaptic[embeddings]'") from e
+            self._model = SentenceTransformer(self.model_name, device=self.device)
+        return self._model
+
+    @property
+    def dim(self) -> int:
+        return int(self._load().get_sentence_embedding_dimension())
+
+    @property
+    def version(self) -> str:
+        return f"st:{self.model_name}"
+
+    def embed_many(self, texts: Sequence[str]) -> List[array]:
+        if not texts:
+            return []
+        m = self._load().encode(list(texts), batch_size=self.batch_size, normalize_embeddings=True,
+                              convert_to_numpy=True, show_progress_bar=False)
+        return [array("f", row.astype("float32").tobytes()) for row in m]
+
+# name -> factory(cfg); register_embedder() adds backends (e.g. from a plugin or a test)
+EMBEDDERS: Dict[str, Callable[["SynapticConfig"], Embedder]] = {
+    "hasher": lambda cfg: HasherEmbedder(dim=cfg.embed_dim),
+    "sentence-transformers": lambda cfg: SentenceTransformerEmbedder(cfg.embedder_model, batch_size=cfg.embed_batch),
+}
+
+_cache: Dict[tuple, Embedder] = {}
+
+def register_embedder(name: str, factory: Callable[["SynapticConfig"], Embedder]):
+    EMBEDDERS[name] = factory
+
+def get_embedder(cfg: "SynapticConfig") -> Embedder:
+    """The configured backend (`cfg.embedder`); model-backed instances are shared per process."""
+    factory = EMBEDDERS.get(cfg.embedder)
+    if factory is None:
+        raise ValueError(f"unknown embedder {cfg.embedder!r} (available: {', '.join(sorted(EMBEDDERS))})")
+    key = (cfg.embedder, cfg.embed_dim, cfg.embedder_model, cfg.embed_batch)
+    emb = _cache.get(key)
+    if emb is None:
+        emb = _cache[key] = factory(cfg)
+    return emb
+
+def query_vector(emb: Embedder, text: str) -> Dict[int, float]:
+    """Embed a query as {idx: value} over its non-zero components (few for the hasher, all for dense models)."""
+    v = emb.embed_many([text])[0]
+    return {i: x for i, x in enumerate(v) if x}
+
 def cosine_sparse(a: Dict[int, float], b: Dict[int, float]) -> float:
     if not a or not b:
         return 0.0
@@ -44,3 +141,47 @@ def cosine_sparse(a: Dict[int, float], b: Dict[int, float]) -> float:
         if vb is not None:
             s += va * vb
     return float(s)
+
+def to_dense(v: Dict[int, float], dim: int) -> array:
+    """Sparse {idx: value} -> float32 array of length `dim` (the `atom_vec.vec` storage format)."""
+    out = array("f", bytes(4 * dim))
+    for k, x in v.items():
+        out[k] = x
+    return out
+
+def dot_sparse_dense(q: Dict[int, float], vec: Sequence[float]) -> float:
+    """Dot product of a sparse query with a dense vector (array or memoryview cast to 'f')."""
+    s = 0.0
+    for k, x in q.items():
+        s += x * vec[k]
+    return float(s)
+
+_np = False  # the numpy module once looked up; None when it is not installed
+
+def numpy_available() -> bool:
+    return _numpy() is not None
+
+def _numpy():
+    global _np
+    if _np is False:
+        try:
+            import numpy
+        except ImportError:
+            numpy = None
+        _np = numpy
+    return _np
+
+def dot_sparse_packed(q: Dict[int, float], buf, dim: int) -> Optional[List[float]]:
+    """Dot products of a sparse query with each of the float32 vectors of length `dim` packed row-major
+    in `buf` (bytes or memoryview), computed by numpy in one pass over the query's columns.
+
+    numpy is optional (it comes with the `embeddings` extra): without it this returns None and callers
+    score vector by vector with dot_sparse_dense.
+    """
+    np = _numpy()
+    if np is None:
+        return None
+    mat = np.frombuffer(buf, dtype=np.float32).reshape(-1, dim)
+    cols = np.fromiter(q.keys(), dtype=np.intp, count=len(q))
+    vals = np.fromiter(q.values(), dtype=np.float64, count=len(q))
+    return (mat[:, cols] @ vals).tolist()
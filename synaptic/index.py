@@ -1,8 +1,67 @@
 from __future__ import annotations
+from contextlib import contextmanager
 from dataclasses import dataclass
+from itertools import chain
 from pathlib import Path
-from typing import List, Optional
-import sqlite3
+from typing import TYPE_CHECKING, Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+import heapq, sqlite3
+
+from .embeddings import dot_sparse_dense, dot_sparse_packed, numpy_available
+if TYPE_CHECKING:
+    from .config import SynapticConfig
+from .instrument import count, span, timed
+from .models import AtomFilter
+from .simhash import from_sql_int, hamming, lsh_bands, lsh_probes, to_sql_int
+from .util import exp_decay_factor, inclusive_until
+
+# `PRAGMA user_version` of a fully migrated store (the last entry of migrations.MIGRATIONS).
+# Opening a store already at this version runs no DDL at all.
+SCHEMA_VERSION = 3
+
+# Normalized multi-valued attributes: (table, value column, AtomRow field)
+JUNCTIONS = (
+    ("atom_scope", "scope", "scope"),
+    ("atom_tag", "tag", "tags"),
+    ("atom_entity", "entity", "entities"),
+)
+
+# Columns read on the query/maintenance hot paths (everything except provenance `source` and `hash`).
+# Large bodies live in blobs/, so `content` here is either short inline text or ''.
+HOT_COLUMNS = ("atom_id", "ts", "type", "scope", "tags", "entities", "summary", "content", "w", "uses",
+               "last_used_ts", "pinned", "namespace", "simhash", "blob_ref")
+# Virtual column: on-disk size estimate without reading content (content_bytes covers blob bodies).
+_COMPUTED = {
+    "size_bytes": "(length(CAST(coalesce({a}.summary,'') AS BLOB)) + coalesce({a}.content_bytes, length(CAST(coalesce({a}.content,'') AS BLOB)))"
+                  " + length(CAST(coalesce({a}.tags,'') AS BLOB)) + length(CAST(coalesce({a}.entities,'') AS BLOB))) AS size_bytes",
+}
+
+def select_list(columns: Optional[Sequence[str]] = None, alias: str = "atoms") -> str:
+    cols = HOT_COLUMNS if columns is None else columns
+    return ", ".join(_COMPUTED[c].format(a=alias) if c in _COMPUTED else f"{alias}.{c}" for c in cols)
+
+def _chunks(seq: Sequence[Any], n: int = 500) -> Iterable[Sequence[Any]]:
+    # stay well under SQLite's bound-parameter limit
+    for i in range(0, len(seq), n):
+        yield seq[i:i+n]
+
+def split_csv(s: str) -> List[str]:
+    return [x.strip() for x in (s or "").split(",") if x.strip()]
+
+def coact_weight(mass: float) -> float:
+    """Edge weight of a co-activation mass (time-decayed count): 2m/(1+m), so one fresh co-activation weighs
+    1.0 (the flat weight of edges from before masses were tracked), approaching 2 with more."""
+    return 2.0 * mass / (1.0 + mass)
+
+def coact_mass(weight: Optional[float]) -> float:
+    # inverse of coact_weight; an old flat 1.0 comes back as one co-activation
+    w = max(0.0, float(weight or 0.0))
+    return w / max(2.0 - w, 1e-9)
+
+def coact_merge(w_old: Optional[float], ts_old: Optional[str], w_new: float, ts_new: str, half_life_days: float) -> float:
+    """Weight of two co-activation masses combined, each decayed to the later of their timestamps."""
+    ref = max(ts_old or "", ts_new or "")
+    return coact_weight(coact_mass(w_old) * exp_decay_factor(last_ts=ts_old or "", now_ts=ref, half_life_days=half_life_days)
+                        + coact_mass(w_new) * exp_decay_factor(last_ts=ts_new or "", now_ts=ref, half_life_days=half_life_days))
 
 @dataclass
 class AtomRow:
@@ -18,136 +77,603 @@ class AtomRow:
     uses: int
     last_used_ts: str
     pinned: int
+    namespace: str = "default"
+    hash: str = ""
+    source: str = ""          # JSON-encoded source/provenance dict
+    simhash: Optional[int] = None   # unsigned 64-bit SimHash; None keeps the stored signature
+    blob_ref: str = ""        # 'sha256:<hex>' when the body lives in blobs/ (content is then '')
+    content_bytes: Optional[int] = None   # UTF-8 size of the full body (inline or blob)
+    fts_body: Optional[str] = None   # offloaded body to index as FTS content; None keeps the indexed text
 
 class SynapticIndex:
     """SQLite index:
     - atoms table (metadata)
     - atoms_fts (FTS5 on summary+content+tags+entities+scope)
     - edges table (neighbor + coactivation)
+    - atom_scope / atom_tag / atom_entity junction tables (structured filters)
+    - cluster_member (persisted co-activation communities) and synaptic_meta (key/value state)
+    - atom_vec (one dense float32 embedding per atom, tagged with the embedder version)
+    - embed_cache (vectors of model-backed embedders by content hash and version)
+
+    All agents share one database; `namespace` columns on atoms and edges isolate them.
+    atom_ids are globally unique, so FTS and junction rows are scoped by joining to atoms.
     """
 
-    def __init__(self, db_path: Path):
+    def __init__(self, db_path: Path, *, read_only: bool = False, migrate: bool = True,
+                 cfg: Optional["SynapticConfig"] = None, _shared: bool = False):
+        """`migrate=False` opens without touching the schema (for `syn migrate`).
+        `cfg` is the owning store's config, used by migration backfills (embedder); None reads the environment."""
         self.db_path = db_path
+        self.cfg = cfg
+        self.read_only = read_only
+        self._shared = _shared
+        self._batch_depth = 0
+        self._has_fts: Optional[bool] = None
+        self._reader: Optional[SynapticIndex] = None
+        if read_only and db_path.exists():
+            self.conn = self._connect(read_only=True)
+            if not migrate or self._schema_ready():
+                return
+            self.conn.close()
+        # read-write open; a read-only open of a missing store or one missing tables of this version
+        # upgrades it once, then reopens read-only
         db_path.parent.mkdir(parents=True, exist_ok=True)
-        self.conn = sqlite3.connect(str(db_path))
-        self.conn.row_factory = sqlite3.Row
-        self._init_schema()
+        self.conn = self._connect(read_only=False)
+        if migrate:
+            self._init_schema()
+        if read_only:
+            self.conn.close()
+            self.conn = self._connect(read_only=True)
+
+    def _connect(self, *, read_only: bool) -> sqlite3.Connection:
+        if read_only:
+            conn = sqlite3.connect(f"{self.db_path.resolve().as_uri()}?mode=ro", uri=True,
+                                   check_same_thread=not self._shared)
+        else:
+            conn = sqlite3.connect(str(self.db_path))
+            conn.create_function("synaptic_coact_merge", 5, coact_merge, deterministic=True)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def schema_version(self) -> int:
+        return int(self.conn.execute("PRAGMA user_version").fetchone()[0])
+
+    def reader(self) -> "SynapticIndex":
+        """A second, read-only handle on the same database that may be used from one other thread
+        (queries on it overlap with work on `conn`; see Retriever hybrid mode)."""
+        if self._reader is None:
+            self._reader = SynapticIndex(self.db_path, read_only=True, cfg=self.cfg, _shared=True)
+        return self._reader
 
     def close(self):
+        if self._reader is not None:
+            self._reader.close()
+            self._reader = None
         self.conn.close()
 
-    def _init_schema(self):
-        c = self.conn.cursor()
-        c.execute("""CREATE TABLE IF NOT EXISTS atoms(
-            atom_id TEXT PRIMARY KEY,
-            ts TEXT,
-            type TEXT,
-            scope TEXT,
-            tags TEXT,
-            entities TEXT,
-            summary TEXT,
-            content TEXT,
-            w REAL,
-            uses INTEGER,
-            last_used_ts TEXT,
-            pinned INTEGER
-        )""")
-        # FTS5 if available
+    @contextmanager
+    def batch(self) -> Iterator["SynapticIndex"]:
+        """Group writes into one transaction (one commit at the end instead of one per write)."""
+        self._batch_depth += 1
         try:
-            c.execute("""CREATE VIRTUAL TABLE IF NOT EXISTS atoms_fts USING fts5(
-                atom_id UNINDEXED,
-                summary,
-                content,
-                tags,
-                entities,
-                scope
-            )""")
-        except sqlite3.OperationalError:
-            pass
-
-        c.execute("""CREATE TABLE IF NOT EXISTS edges(
-            src TEXT,
-            dst TEXT,
-            kind TEXT,              -- 'neighbor' | 'coact'
-            weight REAL,
-            n INTEGER DEFAULT 0,
-            last_ts TEXT,
-            PRIMARY KEY (src, dst, kind)
-        )""")
-        c.execute("""CREATE INDEX IF NOT EXISTS idx_edges_src_kind ON edges(src, kind)""")
-        c.execute("""CREATE INDEX IF NOT EXISTS idx_edges_dst_kind ON edges(dst, kind)""")
-        self.conn.commit()
+            yield self
+        finally:
+            self._batch_depth -= 1
+            if self._batch_depth == 0:
+                with span("index.commit"):
+                    self.conn.commit()
 
-    def _fts_exists(self) -> bool:
+    def _commit(self):
+        if self._batch_depth == 0:
+            with span("index.commit"):
+                self.conn.commit()
+
+    def _schema_ready(self) -> bool:
+        # fully migrated, or every table exists and only deferred backfills remain (read-only opens need no more)
+        if self.schema_version() == SCHEMA_VERSION:
+            return True
+        from .migrations import schema_current
+        return self.schema_version() < SCHEMA_VERSION and schema_current(self)
+
+    def _init_schema(self):
+        if self.schema_version() == SCHEMA_VERSION:
+            return
+        # outdated (or newer) store: DDL and backfills live in migrations.py
+        from .migrations import migrate_on_open
+        migrate_on_open(self)
+
+    def _ensure_column(self, table: str, column: str, decl: str) -> bool:
+        """Add `column` to an existing table; returns True if it had to be added."""
+        cols = {r["name"] for r in self.conn.execute(f"PRAGMA table_info({table})")}
+        if column in cols:
+            return False
+        self.conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+        return True
+
+    def _table_exists(self, name: str) -> bool:
         c = self.conn.cursor()
-        c.execute("""SELECT name FROM sqlite_master WHERE type='table' AND name='atoms_fts'""")
+        c.execute("""SELECT 1 FROM sqlite_master WHERE type='table' AND name=?""", (name,))
         return c.fetchone() is not None
 
+    @staticmethod
+    def _write_junctions(c: sqlite3.Cursor, atom_id: str, values: Any):
+        for table, col, field in JUNCTIONS:
+            c.execute(f"DELETE FROM {table} WHERE atom_id=?", (atom_id,))
+            items = list(dict.fromkeys(split_csv(values[field])))
+            if items:
+                c.executemany(f"INSERT OR IGNORE INTO {table}(atom_id, {col}) VALUES (?,?)",
+                              [(atom_id, v) for v in items])
+
+    @staticmethod
+    def _write_lsh(c: sqlite3.Cursor, atom_id: str, sig: int):
+        c.execute("DELETE FROM atom_lsh WHERE atom_id=?", (atom_id,))
+        if sig:
+            c.executemany("INSERT OR IGNORE INTO atom_lsh(band, bucket, atom_id) VALUES (?,?,?)",
+                          [(i, b, atom_id) for i, b in enumerate(lsh_bands(sig))])
+
+    @staticmethod
+    def filter_clause(f: Optional[AtomFilter], alias: str = "atoms", namespace: Optional[str] = None) -> Tuple[str, List[Any]]:
+        """Translate a namespace + AtomFilter into `AND ...` SQL (empty string when there is nothing to filter)."""
+        parts: List[str] = []
+        params: List[Any] = []
+        if namespace is not None:
+            parts.append(f"{alias}.namespace = ?")
+            params.append(namespace)
+        if f is None or f.is_empty():
+            return (" AND " + " AND ".join(parts), params) if parts else ("", [])
+        for (table, col, _), values in zip(JUNCTIONS, (f.scope, f.tags, f.entities)):
+            if values:
+                marks = ",".join("?" * len(values))
+                parts.append(f"{alias}.atom_id IN (SELECT atom_id FROM {table} WHERE {col} IN ({marks}))")
+                params.extend(values)
+        if f.type:
+            parts.append(f"{alias}.type IN ({','.join('?' * len(f.type))})")
+            params.extend(f.type)
+        if f.since:
+            parts.append(f"{alias}.ts >= ?")
+            params.append(f.since)
+        if f.until:
+            parts.append(f"{alias}.ts <= ?")
+            params.append(inclusive_until(f.until))
+        return " AND " + " AND ".join(parts), params
+
+    def _fts_exists(self) -> bool:
+        # FTS5 availability is fixed for the life of a connection; ask sqlite_master once
+        if self._has_fts is None:
+            self._has_fts = self._table_exists("atoms_fts")
+        return self._has_fts
+
+    @timed("index.upsert_atom")
     def upsert_atom(self, r: AtomRow):
         c = self.conn.cursor()
-        c.execute("""INSERT INTO atoms(atom_id,ts,type,scope,tags,entities,summary,content,w,uses,last_used_ts,pinned)
-            VALUES (?,?,?,?,?,?,?,?,?,?,?,?)
+        sig = to_sql_int(r.simhash) if r.simhash is not None else None
+        c.execute("""INSERT INTO atoms(atom_id,ts,type,scope,tags,entities,summary,content,w,uses,last_used_ts,pinned,namespace,hash,source,simhash,
+              blob_ref,content_bytes)
+            VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)
             ON CONFLICT(atom_id) DO UPDATE SET
               ts=excluded.ts, type=excluded.type, scope=excluded.scope, tags=excluded.tags, entities=excluded.entities,
               summary=excluded.summary, content=excluded.content, w=excluded.w, uses=excluded.uses,
-              last_used_ts=excluded.last_used_ts, pinned=excluded.pinned
-        """, (r.atom_id, r.ts, r.type, r.scope, r.tags, r.entities, r.summary, r.content, r.w, r.uses, r.last_used_ts, r.pinned))
+              last_used_ts=excluded.last_used_ts, pinned=excluded.pinned, namespace=excluded.namespace,
+              hash=excluded.hash, source=excluded.source, simhash=coalesce(excluded.simhash, atoms.simhash),
+              blob_ref=excluded.blob_ref, content_bytes=coalesce(excluded.content_bytes, atoms.content_bytes)
+        """, (r.atom_id, r.ts, r.type, r.scope, r.tags, r.entities, r.summary, r.content, r.w, r.uses, r.last_used_ts, r.pinned,
+              r.namespace, r.hash, r.source, sig, r.blob_ref, r.content_bytes))
+        if r.simhash is not None:
+            self._write_lsh(c, r.atom_id, r.simhash)
 
         # Keep FTS in sync (FTS tables generally don't support ON CONFLICT like normal tables)
         if self._fts_exists():
             try:
-                c.execute("DELETE FROM atoms_fts WHERE atom_id=?", (r.atom_id,))
+                old = c.execute("SELECT rowid, content FROM atoms_fts WHERE atom_id=?", (r.atom_id,)).fetchall()
+                body = r.content
+                if r.blob_ref:
+                    # bodies in blobs/ stay searchable: FTS indexes the full text, the atoms row only the summary
+                    body = r.fts_body if r.fts_body is not None else (old[0]["content"] if old else "")
+                c.executemany("DELETE FROM atoms_fts WHERE rowid=?", [(o["rowid"],) for o in old])
                 c.execute("INSERT INTO atoms_fts(atom_id, summary, content, tags, entities, scope) VALUES (?,?,?,?,?,?)",
-                          (r.atom_id, r.summary, r.content, r.tags, r.entities, r.scope))
+                          (r.atom_id, r.summary, body, r.tags, r.entities, r.scope))
             except sqlite3.OperationalError:
                 # If this build lacks FTS5 or disallows these ops, silently skip
                 pass
 
-        self.conn.commit()
+        self._write_junctions(c, r.atom_id, {"scope": r.scope, "tags": r.tags, "entities": r.entities})
+        self._commit()
+
+    def set_strengths(self, rows: Iterable[Tuple[float, int, str, str]]):
+        """Bulk (w, uses, last_used_ts, atom_id) update for maintenance; text, FTS and junctions are untouched."""
+        self.conn.executemany("UPDATE atoms SET w=?, uses=?, last_used_ts=? WHERE atom_id=?", list(rows))
+        self._commit()
+
+    def set_fts_bodies(self, rows: Iterable[Tuple[str, str]]):
+        """Bulk (atom_id, body) rewrite of the FTS content of atoms whose body is offloaded to blobs/."""
+        if not self._fts_exists():
+            return
+        c = self.conn.cursor()
+        for part in _chunks(list(rows)):
+            marks = ",".join("?" * len(part))
+            fts_rowid = dict(c.execute(f"SELECT atom_id, rowid FROM atoms_fts WHERE atom_id IN ({marks})",
+                                       [aid for aid, _ in part]).fetchall())
+            c.executemany("UPDATE atoms_fts SET content=? WHERE rowid=?",
+                          [(body, fts_rowid[aid]) for aid, body in part if aid in fts_rowid])
+        self._commit()
 
-    def get_atom(self, atom_id: str) -> Optional[sqlite3.Row]:
+    def set_signatures(self, rows: Iterable[Tuple[str, int, str]]):
+        """Bulk (hash, simhash, atom_id) update, rewriting each atom's LSH bands."""
         c = self.conn.cursor()
-        c.execute("SELECT * FROM atoms WHERE atom_id=?", (atom_id,))
+        for h, sig, atom_id in rows:
+            c.execute("UPDATE atoms SET hash=?, simhash=? WHERE atom_id=?", (h, to_sql_int(sig), atom_id))
+            self._write_lsh(c, atom_id, sig)
+        self._commit()
+
+    @timed("index.get_atom")
+    def get_atom(self, atom_id: str, namespace: Optional[str] = None) -> Optional[sqlite3.Row]:
+        """The atom's row; with `namespace`, None unless it belongs to that namespace."""
+        c = self.conn.cursor()
+        if namespace is None:
+            c.execute("SELECT * FROM atoms WHERE atom_id=?", (atom_id,))
+        else:
+            c.execute("SELECT * FROM atoms WHERE atom_id=? AND namespace=?", (atom_id, namespace))
         return c.fetchone()
 
-    def search_fts(self, query: str, k: int) -> List[sqlite3.Row]:
+    def find_by_hash(self, namespace: str, h: str, *, type: Optional[str] = None,
+                     scope: Optional[Sequence[str]] = None) -> Optional[sqlite3.Row]:
+        """The strongest atom with content hash `h`; with `type`/`scope`, only one of that type and the same
+        set of scopes (the dedup key)."""
+        type_sql, params = ("", []) if type is None else (" AND type=?", [type])
+        c = self.conn.cursor()
+        c.execute(f"""SELECT * FROM atoms WHERE namespace=? AND hash=?{type_sql}
+            ORDER BY pinned DESC, w DESC, uses DESC, ts ASC""", (namespace, h, *params))
+        want = None if scope is None else set(scope)
+        for row in c:
+            if want is None or set(row["scope"].split(",") if row["scope"] else ()) == want:
+                return row
+        return None
+
+    def duplicate_hashes(self, namespace: str) -> List[str]:
+        c = self.conn.cursor()
+        c.execute("""SELECT hash FROM atoms WHERE namespace=? AND hash IS NOT NULL AND hash != ''
+            GROUP BY hash HAVING COUNT(*) > 1""", (namespace,))
+        return [r["hash"] for r in c.fetchall()]
+
+    def atoms_by_hash(self, namespace: str, h: str) -> List[sqlite3.Row]:
+        c = self.conn.cursor()
+        c.execute("""SELECT * FROM atoms WHERE namespace=? AND hash=?
+            ORDER BY pinned DESC, w DESC, uses DESC, ts ASC""", (namespace, h))
+        return list(c.fetchall())
+
+    def near_duplicates(self, namespace: str, sig: int, max_distance: int, limit: int = 10) -> List[Tuple[str, int]]:
+        """(atom_id, hamming distance) of atoms whose SimHash is within `max_distance`, nearest first.
+
+        Candidates come from multi-probe LSH buckets, so distances up to LSH_MAX_EXACT_DISTANCE are always found.
+        """
+        if not sig:
+            return []
+        probes = lsh_probes(sig)
+        where = " OR ".join(f"(l.band=? AND l.bucket IN ({','.join('?' * len(p))}))" for p in probes)
+        params: List[Any] = [x for i, p in enumerate(probes) for x in (i, *p)]
+        c = self.conn.cursor()
+        c.execute(f"""SELECT DISTINCT a.atom_id, a.simhash FROM atom_lsh l JOIN atoms a ON a.atom_id = l.atom_id
+            WHERE ({where}) AND a.namespace=?""", (*params, namespace))
+        out = []
+        for r in c.fetchall():
+            d = hamming(sig, from_sql_int(r["simhash"] or 0))
+            if d <= max_distance:
+                out.append((r["atom_id"], d))
+        out.sort(key=lambda x: x[1])
+        return out[:limit]
+
+    @timed("index.search_fts")
+    def search_fts(self, query: str, k: int, filters: Optional[AtomFilter] = None,
+                   namespace: Optional[str] = None) -> List[sqlite3.Row]:
         if not self._fts_exists():
             return []
+        where, params = self.filter_clause(filters, namespace=namespace)
         c = self.conn.cursor()
         try:
-            c.execute("""SELECT atoms.*, bm25(atoms_fts) AS rank
+            c.execute(f"""SELECT {select_list()}, bm25(atoms_fts) AS rank
                 FROM atoms_fts JOIN atoms ON atoms_fts.atom_id = atoms.atom_id
-                WHERE atoms_fts MATCH ?
+                WHERE atoms_fts MATCH ?{where}
                 ORDER BY rank
-                LIMIT ?""", (query, k))
-            return list(c.fetchall())
+                LIMIT ?""", (query, *params, k))
+            rows = list(c.fetchall())
+            count("index.search_fts.rows", len(rows))
+            return rows
         except sqlite3.OperationalError:
             return []
 
-    def search_fallback(self, query: str, k: int) -> List[sqlite3.Row]:
+    def upsert_vector(self, atom_id: str, namespace: str, model: str, vec: bytes):
+        """Store the dense embedding (float32, native byte order) of an atom's current text."""
+        self.conn.execute("""INSERT INTO atom_vec(atom_id, namespace, model, vec) VALUES (?,?,?,?)
+            ON CONFLICT(atom_id) DO UPDATE SET namespace=excluded.namespace, model=excluded.model, vec=excluded.vec""",
+            (atom_id, namespace, model, vec))
+        self._commit()
+
+    def delete_vector(self, atom_id: str):
+        self.conn.execute("DELETE FROM atom_vec WHERE atom_id=?", (atom_id,))
+        self._commit()
+
+    @timed("index.vectors_for")
+    def vectors_for(self, ids: Sequence[str], model: str) -> Dict[str, bytes]:
+        """atom_id -> stored vector of `model`, for the ids that have one."""
+        out: Dict[str, bytes] = {}
+        c = self.conn.cursor()
+        for part in _chunks(list(ids)):
+            marks = ",".join("?" * len(part))
+            c.execute(f"SELECT atom_id, vec FROM atom_vec WHERE model=? AND atom_id IN ({marks}) AND length(vec) > 0",
+                      (model, *part))
+            out.update(c.fetchall())
+        return out
+
+    def missing_vectors(self, model: str, *, namespace: Optional[str] = None, after_rowid: int = 0,
+                        limit: int = 500) -> List[sqlite3.Row]:
+        """Atoms (by rowid, after `after_rowid`) without a vector of `model`: rowid, id, hash and body columns."""
+        ns_sql, params = ("", []) if namespace is None else (" AND a.namespace = ?", [namespace])
+        c = self.conn.cursor()
+        c.execute(f"""SELECT a.rowid AS _rowid, a.atom_id, a.namespace, a.hash, a.summary, a.content, a.blob_ref
+            FROM atoms a LEFT JOIN atom_vec v ON v.atom_id = a.atom_id AND v.model = ?
+            WHERE v.atom_id IS NULL AND a.rowid > ?{ns_sql}
+            ORDER BY a.rowid LIMIT ?""", (model, int(after_rowid), *params, int(limit)))
+        return list(c.fetchall())
+
+    def count_missing_vectors(self, model: str, namespace: Optional[str] = None) -> int:
+        ns_sql, params = ("", []) if namespace is None else (" AND a.namespace = ?", [namespace])
+        return int(self.conn.execute(f"""SELECT COUNT(*) FROM atoms a
+            LEFT JOIN atom_vec v ON v.atom_id = a.atom_id AND v.model = ?
+            WHERE v.atom_id IS NULL{ns_sql}""", (model, *params)).fetchone()[0])
+
+    def cached_vectors(self, hashes: Sequence[str], model: str) -> Dict[str, bytes]:
+        """content hash -> cached vector of `model`."""
+        out: Dict[str, bytes] = {}
+        c = self.conn.cursor()
+        for part in _chunks([h for h in dict.fromkeys(hashes) if h]):
+            marks = ",".join("?" * len(part))
+            c.execute(f"SELECT hash, vec FROM embed_cache WHERE model=? AND hash IN ({marks})", (model, *part))
+            out.update(c.fetchall())
+        return out
+
+    def cache_vectors(self, items: Iterable[Tuple[str, str, bytes]]):
+        """Store (hash, model, vec) triples in embed_cache."""
+        self.conn.executemany("INSERT OR REPLACE INTO embed_cache(hash, model, vec) VALUES (?,?,?)",
+                              [(h, m, v) for h, m, v in items if h])
+        self._commit()
+
+    @timed("index.vector_count")
+    def vector_count(self, model: str, namespace: Optional[str] = None, limit: Optional[int] = None) -> int:
+        """Stored vectors of `model` (in `namespace`), counting at most `limit` of them."""
+        ns_sql, params = ("", []) if namespace is None else (" AND namespace = ?", [namespace])
+        lim = "" if limit is None else f" LIMIT {int(limit)}"
+        row = self.conn.execute(f"""SELECT COUNT(*) FROM (SELECT 1 FROM atom_vec
+            WHERE model = ?{ns_sql} AND length(vec) > 0{lim})""", (model, *params)).fetchone()
+        return int(row[0])
+
+    @timed("index.vector_topk")
+    def vector_topk(self, query: Dict[int, float], k: int, *, model: str, filters: Optional[AtomFilter] = None,
+                    namespace: Optional[str] = None, chunk: int = 4096) -> List[Tuple[str, float]]:
+        """(atom_id, dot product) of the k stored vectors of `model` closest to the sparse `query`.
+
+        Exact scan; vectors are unit-normalized so the dot product is the cosine. With numpy installed,
+        rows are read `chunk` at a time and scored as one matrix; otherwise vector by vector.
+        """
+        if not query or k <= 0:
+            return []
+        c = self.conn.cursor()
+        if filters is None or filters.is_empty():
+            # atom_vec carries the namespace, so the unfiltered scan skips the join (and uses its own index)
+            ns_sql, params = ("", []) if namespace is None else (" AND namespace = ?", [namespace])
+            c.execute(f"SELECT atom_id, vec FROM atom_vec WHERE model = ?{ns_sql} AND length(vec) > 0", (model, *params))
+        else:
+            where, params = self.filter_clause(filters, namespace=namespace)
+            c.execute(f"""SELECT v.atom_id, v.vec FROM atom_vec v JOIN atoms ON atoms.atom_id = v.atom_id
+                WHERE v.model = ? AND length(v.vec) > 0{where}""", (model, *params))
+        hi = max(query)
+        scanned = 0
+        if not numpy_available():
+            def scores():
+                nonlocal scanned
+                for aid, blob in c:
+                    scanned += 1
+                    if hi < len(blob) // 4:
+                        yield dot_sparse_dense(query, memoryview(blob).cast("f")), aid
+
+            top = heapq.nlargest(k, scores())
+        else:
+            top = []
+            while True:
+                rows = c.fetchmany(chunk)
+                if not rows:
+                    break
+                scanned += len(rows)
+                size = len(rows[0][1])
+                if hi >= size // 4:
+                    # the query has more dimensions than the stored vectors: nothing comparable
+                    break
+                if any(len(blob) != size for _, blob in rows):
+                    rows = [r for r in rows if len(r[1]) == size]
+                scores = dot_sparse_packed(query, b"".join(blob for _, blob in rows), size // 4)
+                top = heapq.nlargest(k, chain(top, zip(scores, (aid for aid, _ in rows))))
+        count("index.vector_topk.scanned", scanned)
+        return [(aid, float(s)) for s, aid in top if s > 0.0]
+
+    @timed("index.atoms_by_ids")
+    def atoms_by_ids(self, ids: Sequence[str], columns: Optional[Sequence[str]] = None) -> Dict[str, sqlite3.Row]:
+        """atom_id -> row (HOT_COLUMNS by default) for the ids that exist."""
+        out: Dict[str, sqlite3.Row] = {}
+        c = self.conn.cursor()
+        for part in _chunks(list(ids)):
+            marks = ",".join("?" * len(part))
+            c.execute(f"SELECT {select_list(columns)} FROM atoms WHERE atom_id IN ({marks})", tuple(part))
+            for r in c.fetchall():
+                out[r["atom_id"]] = r
+        return out
+
+    @timed("index.search_fallback")
+    def search_fallback(self, query: str, k: int, filters: Optional[AtomFilter] = None,
+                        namespace: Optional[str] = None) -> List[sqlite3.Row]:
         q = f"%{query.lower()}%"
+        where, params = self.filter_clause(filters, namespace=namespace)
         c = self.conn.cursor()
-        c.execute("""SELECT * FROM atoms
-            WHERE lower(summary) LIKE ? OR lower(content) LIKE ? OR lower(tags) LIKE ? OR lower(entities) LIKE ? OR lower(scope) LIKE ?
+        c.execute(f"""SELECT {select_list()} FROM atoms
+            WHERE (lower(summary) LIKE ? OR lower(content) LIKE ? OR lower(tags) LIKE ? OR lower(entities) LIKE ? OR lower(scope) LIKE ?){where}
             ORDER BY pinned DESC, w DESC, uses DESC
-            LIMIT ?""", (q, q, q, q, q, k))
-        return list(c.fetchall())
+            LIMIT ?""", (q, q, q, q, q, *params, k))
+        rows = list(c.fetchall())
+        count("index.search_fallback.rows", len(rows))
+        return rows
+
+    @timed("index.iter_atoms")
+    def iter_atoms(self, filters: Optional[AtomFilter] = None, limit: Optional[int] = None,
+                   namespace: Optional[str] = None, columns: Optional[Sequence[str]] = None) -> Iterable[sqlite3.Row]:
+        """Atoms in rank order, reading only `columns` (default HOT_COLUMNS; 'size_bytes' is computed)."""
+        where, params = self.filter_clause(filters, namespace=namespace)
+        sql = f"SELECT {select_list(columns)} FROM atoms WHERE 1=1{where} ORDER BY pinned DESC, w DESC, uses DESC"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(int(limit))
+        return self.conn.cursor().execute(sql, params)
 
-    def neighbors(self, atom_id: str, kind: str, k: int) -> List[sqlite3.Row]:
+    @timed("index.neighbors")
+    def neighbors(self, atom_id: str, kind: str, k: int, filters: Optional[AtomFilter] = None) -> List[sqlite3.Row]:
+        # dst breaks ties so the order does not depend on which index the plan reads edges through
         c = self.conn.cursor()
-        c.execute("""SELECT * FROM edges
-            WHERE src=? AND kind=?
-            ORDER BY weight DESC, n DESC
-            LIMIT ?""", (atom_id, kind, k))
-        return list(c.fetchall())
+        if filters is None or filters.is_empty():
+            c.execute("""SELECT * FROM edges
+                WHERE src=? AND kind=?
+                ORDER BY weight DESC, n DESC, dst
+                LIMIT ?""", (atom_id, kind, k))
+        else:
+            where, params = self.filter_clause(filters)
+            c.execute(f"""SELECT edges.* FROM edges JOIN atoms ON atoms.atom_id = edges.dst
+                WHERE edges.src=? AND edges.kind=?{where}
+                ORDER BY edges.weight DESC, edges.n DESC, edges.dst
+                LIMIT ?""", (atom_id, kind, *params, k))
+        rows = list(c.fetchall())
+        count("index.neighbors.rows", len(rows))
+        return rows
+
+    def delete_atom(self, atom_id: str):
+        c = self.conn.cursor()
+        c.execute("DELETE FROM atoms WHERE atom_id=?", (atom_id,))
+        for table, _, _ in JUNCTIONS:
+            c.execute(f"DELETE FROM {table} WHERE atom_id=?", (atom_id,))
+        c.execute("DELETE FROM atom_lsh WHERE atom_id=?", (atom_id,))
+        c.execute("DELETE FROM atom_vec WHERE atom_id=?", (atom_id,))
+        c.execute("DELETE FROM cluster_member WHERE atom_id=? OR cluster_id=?", (atom_id, atom_id))
+        if self._fts_exists():
+            try:
+                c.execute("DELETE FROM atoms_fts WHERE atom_id=?", (atom_id,))
+            except sqlite3.OperationalError:
+                pass
+        self._commit()
 
-    def upsert_edge(self, src: str, dst: str, kind: str, weight: float, ts: str, n_inc: int = 0):
+    @timed("index.upsert_edge")
+    def upsert_edge(self, src: str, dst: str, kind: str, weight: float, ts: str, n_inc: int = 0,
+                    namespace: str = "default"):
         c = self.conn.cursor()
-        c.execute("""INSERT INTO edges(src,dst,kind,weight,n,last_ts)
-            VALUES (?,?,?,?,?,?)
+        c.execute("""INSERT INTO edges(src,dst,kind,weight,n,last_ts,namespace)
+            VALUES (?,?,?,?,?,?,?)
             ON CONFLICT(src,dst,kind) DO UPDATE SET
               weight=excluded.weight,
               n=edges.n + ?,
               last_ts=excluded.last_ts
-        """, (src, dst, kind, float(weight), int(n_inc), ts, int(n_inc)))
-        self.conn.commit()
+        """, (src, dst, kind, float(weight), int(n_inc), ts, namespace, int(n_inc)))
+        self._commit()
+
+    @timed("index.upsert_coact")
+    def upsert_coact(self, rows: Iterable[Tuple[str, str, float, int, str, str]], *, half_life_days: float):
+        """Merge (src, dst, weight, n, last_ts, namespace) co-activation rows into `edges`: counts add up and
+        weights combine through their decayed masses (see coact_merge)."""
+        self.conn.executemany("""INSERT INTO edges(src,dst,kind,weight,n,last_ts,namespace)
+            VALUES (?,?,'coact',?,?,?,?)
+            ON CONFLICT(src,dst,kind) DO UPDATE SET
+              weight=synaptic_coact_merge(edges.weight, edges.last_ts, excluded.weight, excluded.last_ts, ?),
+              n=edges.n + excluded.n,
+              last_ts=max(edges.last_ts, excluded.last_ts)
+        """, [(*r, float(half_life_days)) for r in rows])
+        self._commit()
+
+    def delete_coact(self, namespace: str) -> int:
+        c = self.conn.execute("DELETE FROM edges WHERE namespace=? AND kind='coact'", (namespace,))
+        self._commit()
+        return c.rowcount
+
+    def blob_referenced(self, ref: str) -> bool:
+        c = self.conn.cursor()
+        c.execute("SELECT 1 FROM atoms WHERE blob_ref=? LIMIT 1", (ref,))
+        return c.fetchone() is not None
+
+    def redirect_edges(self, old: str, new: str):
+        """Re-point every edge touching `old` at `new` (merging counts), dropping self-loops."""
+        c = self.conn.cursor()
+        for end, other in (("src", "dst"), ("dst", "src")):
+            c.execute(f"""INSERT INTO edges(src,dst,kind,weight,n,last_ts,namespace)
+                SELECT {'?' if end == 'src' else 'src'}, {'?' if end == 'dst' else 'dst'}, kind, weight, n, last_ts, namespace
+                FROM edges WHERE {end}=? AND {other}!=? AND {other}!=?
+                ON CONFLICT(src,dst,kind) DO UPDATE SET
+                  weight=max(edges.weight, excluded.weight),
+                  n=edges.n + excluded.n,
+                  last_ts=max(edges.last_ts, excluded.last_ts)
+            """, (new, old, old, new))
+        c.execute("DELETE FROM edges WHERE src=? OR dst=?", (old, old))
+        self._commit()
+
+    def get_meta(self, key: str, default: str = "") -> str:
+        c = self.conn.cursor()
+        c.execute("SELECT value FROM synaptic_meta WHERE key=?", (key,))
+        r = c.fetchone()
+        return r["value"] if r is not None else default
+
+    def set_meta(self, key: str, value: str):
+        c = self.conn.cursor()
+        c.execute("""INSERT INTO synaptic_meta(key, value) VALUES (?,?)
+            ON CONFLICT(key) DO UPDATE SET value=excluded.value""", (key, value))
+        self._commit()
+
+    def coact_changed_since(self, namespace: str, ts: str) -> List[sqlite3.Row]:
+        c = self.conn.cursor()
+        c.execute("""SELECT src, dst, last_ts FROM edges
+            WHERE namespace=? AND kind='coact' AND last_ts >= ?""", (namespace, ts))
+        return list(c.fetchall())
+
+    def coact_adjacency(self, nodes: Sequence[str], *, min_n: int = 1) -> List[sqlite3.Row]:
+        """Co-activation edges leaving `nodes` (at least `min_n` co-activations), ignoring cluster atoms."""
+        out: List[sqlite3.Row] = []
+        c = self.conn.cursor()
+        for chunk in _chunks(list(nodes)):
+            c.execute(f"""SELECT e.src, e.dst, e.weight, e.n FROM edges e
+                JOIN atoms s ON s.atom_id = e.src JOIN atoms d ON d.atom_id = e.dst
+                WHERE e.kind='coact' AND e.n >= ? AND s.type != 'cluster' AND d.type != 'cluster'
+                AND e.src IN ({','.join('?' * len(chunk))})""", (min_n, *chunk))
+            out.extend(c.fetchall())
+        return out
+
+    def clusters_of(self, atom_ids: Sequence[str]) -> Dict[str, str]:
+        """atom_id -> cluster_id for the given atoms that belong to a persisted cluster."""
+        out: Dict[str, str] = {}
+        c = self.conn.cursor()
+        for chunk in _chunks(list(atom_ids)):
+            c.execute(f"""SELECT atom_id, cluster_id FROM cluster_member
+                WHERE atom_id IN ({','.join('?' * len(chunk))})""", tuple(chunk))
+            out.update({r["atom_id"]: r["cluster_id"] for r in c.fetchall()})
+        return out
+
+    def cluster_members(self, cluster_ids: Sequence[str]) -> Dict[str, List[str]]:
+        out: Dict[str, List[str]] = {}
+        c = self.conn.cursor()
+        for chunk in _chunks(list(cluster_ids)):
+            c.execute(f"""SELECT cluster_id, atom_id FROM cluster_member
+                WHERE cluster_id IN ({','.join('?' * len(chunk))}) ORDER BY cluster_id, atom_id""", tuple(chunk))
+            for r in c.fetchall():
+                out.setdefault(r["cluster_id"], []).append(r["atom_id"])
+        return out
+
+    def set_cluster_members(self, cluster_id: str, members: Sequence[str]):
+        c = self.conn.cursor()
+        c.execute("DELETE FROM cluster_member WHERE cluster_id=?", (cluster_id,))
+        c.executemany("INSERT OR IGNORE INTO cluster_member(cluster_id, atom_id) VALUES (?,?)",
+                      [(cluster_id, m) for m in members])
+        self._commit()
+
+    def namespaces(self) -> List[sqlite3.Row]:
+        c = self.conn.cursor()
+        c.execute("""SELECT namespace, COUNT(*) AS atoms FROM atoms GROUP BY namespace ORDER BY namespace""")
+        return list(c.fetchall())
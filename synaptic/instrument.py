@@ -0,0 +1,122 @@
+from __future__ import annotations
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional
+import functools, time
+
+# Span timers and counters for the hot paths.
+#
+# Off by default: `span()` then hands back one shared no-op context manager and `count()`/`timed`
+# return after a single None check, so instrumented code pays (almost) nothing. Measurements are
+# recorded while a `profiling()` block is active (e.g. `syn brief --profile`) and/or while an
+# exporter is installed with `set_exporter()`.
+
+# exporter(kind, name, value): kind is "span" (value = seconds) or "count" (value = increment)
+Exporter = Callable[[str, str, float], None]
+
+class Profile:
+    """Per-name aggregates collected during one `profiling()` block."""
+
+    def __init__(self):
+        self.t0 = time.perf_counter()
+        self.spans: Dict[str, List[float]] = {}    # name -> [calls, total_s, max_s]
+        self.counts: Dict[str, float] = {}
+
+    def to_dict(self) -> Dict[str, object]:
+        return {
+            "total_ms": round((time.perf_counter() - self.t0) * 1000.0, 3),
+            "spans": {k: {"n": int(v[0]), "ms": round(v[1] * 1000.0, 3), "max_ms": round(v[2] * 1000.0, 3)}
+                      for k, v in sorted(self.spans.items(), key=lambda kv: -kv[1][1])},
+            "counts": {k: (int(v) if float(v).is_integer() else v) for k, v in sorted(self.counts.items())},
+        }
+
+_profile: Optional[Profile] = None
+_exporter: Optional[Exporter] = None
+
+def set_exporter(fn: Optional[Exporter]):
+    """Install (or with None, remove) a process-wide exporter for a metrics system."""
+    global _exporter
+    _exporter = fn
+
+def enabled() -> bool:
+    return _profile is not None or _exporter is not None
+
+def current_profile() -> Optional[Profile]:
+    return _profile
+
+@contextmanager
+def profiling() -> Iterator[Profile]:
+    """Collect spans/counts into a fresh Profile for the duration of the block."""
+    global _profile
+    prev, _profile = _profile, Profile()
+    try:
+        yield _profile
+    finally:
+        _profile = prev
+
+def _record(name: str, dt: float):
+    p = _profile
+    if p is not None:
+        s = p.spans.get(name)
+        if s is None:
+            p.spans[name] = [1, dt, dt]
+        else:
+            s[0] += 1
+            s[1] += dt
+            if dt > s[2]:
+                s[2] = dt
+    if _exporter is not None:
+        _exporter("span", name, dt)
+
+def count(name: str, n: float = 1):
+    if _profile is None and _exporter is None:
+        return
+    if _profile is not None:
+        _profile.counts[name] = _profile.counts.get(name, 0) + n
+    if _exporter is not None:
+        _exporter("count", name, n)
+
+class _NoSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NO_SPAN = _NoSpan()
+
+class _Span:
+    __slots__ = ("name", "t0")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        _record(self.name, time.perf_counter() - self.t0)
+        return False
+
+def span(name: str):
+    """`with span("l1.fts"): ...` — time a block under `name`."""
+    if _profile is None and _exporter is None:
+        return _NO_SPAN
+    return _Span(name)
+
+def timed(name: str):
+    """Decorator form of `span` for whole functions/methods."""
+    def deco(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if _profile is None and _exporter is None:
+                return fn(*args, **kwargs)
+            t0 = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                _record(name, time.perf_counter() - t0)
+        return wrapper
+    return deco
@@ -0,0 +1,338 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+import json, sqlite3, time
+
+from .simhash import simhash64, to_sql_int
+from .util import sha256_text
+
+# Versioned schema upgrades for the SQLite index.
+#
+# Each Migration has an idempotent `schema` step (DDL only: CREATE ... IF NOT EXISTS, ADD COLUMN) that
+# returns the names of the row backfills it made necessary. Backfills walk `atoms` by rowid in small
+# batches, each batch its own transaction with its cursor saved in synaptic_meta, so a large store
+# migrates without holding a long write lock and an interrupted run resumes where it stopped.
+# PRAGMA user_version is set to a migration's version only once its backfills are done.
+
+class SchemaVersionError(RuntimeError):
+    """The database was written by a newer synaptic (user_version > SCHEMA_VERSION)."""
+
+# On open, pending backfills run inline only for stores up to this many atoms; larger stores are
+# left readable (with those columns partly empty) until `syn migrate --apply` finishes them.
+AUTO_BACKFILL_MAX_ATOMS = 20_000
+DEFAULT_BATCH = 2000
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    name: str
+    schema: Callable[[Any], List[str]]   # (SynapticIndex) -> backfill names now needed
+
+# ---- backfills: (idx, cursor, batch of atoms rows) -> None ----
+
+def _backfill_hash(idx, c: sqlite3.Cursor, rows: List[sqlite3.Row]):
+    c.executemany("UPDATE atoms SET hash=? WHERE atom_id=?",
+                  [(sha256_text((r["summary"] or "") + "\n" + (r["content"] or "")), r["atom_id"]) for r in rows])
+
+def _backfill_simhash(idx, c: sqlite3.Cursor, rows: List[sqlite3.Row]):
+    for r in rows:
+        sig = simhash64((r["summary"] or "") + "\n" + (r["content"] or ""))
+        c.execute("UPDATE atoms SET simhash=? WHERE atom_id=?", (to_sql_int(sig), r["atom_id"]))
+        idx._write_lsh(c, r["atom_id"], sig)
+
+def _backfill_junctions(idx, c: sqlite3.Cursor, rows: List[sqlite3.Row]):
+    for r in rows:
+        idx._write_junctions(c, r["atom_id"], {"scope": r["scope"], "tags": r["tags"], "entities": r["entities"]})
+
+def _backfill_vectors(idx, c: sqlite3.Cursor, rows: List[sqlite3.Row]):
+    # same text and embedder the store uses on write (full body, including offloaded blobs)
+    from .blobs import BlobStore
+    from .config import get_config
+    from .embeddings import get_embedder
+    # the store's own config: its embedder (and dim) decide the model the vectors are tagged with
+    emb = get_embedder(idx.cfg if idx.cfg is not None else get_config())
+    if not emb.inline:
+        return   # model-backed embedders are filled by `syn embed`, not inside a migration
+    blobs = BlobStore(idx.db_path.parent / "blobs")
+    texts = [(r["summary"] or "") + "\n" + ((blobs.get(r["blob_ref"]) or "") if r["blob_ref"] else (r["content"] or ""))
+             for r in rows]
+    for r, vec in zip(rows, emb.embed_many(texts)):
+        # OR IGNORE: never replace a vector written by a newer add/update
+        c.execute("INSERT OR IGNORE INTO atom_vec(atom_id, namespace, model, vec) VALUES (?,?,?,?)",
+                  (r["atom_id"], r["namespace"], emb.version, vec.tobytes()))
+
+BACKFILLS: Dict[str, Callable[[Any, sqlite3.Cursor, List[sqlite3.Row]], None]] = {
+    "hash": _backfill_hash,
+    "simhash": _backfill_simhash,
+    "junctions": _backfill_junctions,
+    "vectors": _backfill_vectors,
+}
+
+# ---- migrations ----
+
+def _m1_base(idx) -> List[str]:
+    """Everything up to namespaces, dedup hashes, SimHash/LSH, blobs, junction tables and clusters.
+
+    Also upgrades stores created before user_version was tracked (adding missing columns/tables).
+    """
+    c = idx.conn.cursor()
+    needed: List[str] = []
+    c.execute("""CREATE TABLE IF NOT EXISTS atoms(
+        atom_id TEXT PRIMARY KEY,
+        ts TEXT,
+        type TEXT,
+        scope TEXT,
+        tags TEXT,
+        entities TEXT,
+        summary TEXT,
+        content TEXT,
+        w REAL,
+        uses INTEGER,
+        last_used_ts TEXT,
+        pinned INTEGER,
+        namespace TEXT NOT NULL DEFAULT 'default',
+        hash TEXT,
+        source TEXT,
+        simhash INTEGER,
+        blob_ref TEXT,
+        content_bytes INTEGER
+    )""")
+    idx._ensure_column("atoms", "namespace", "TEXT NOT NULL DEFAULT 'default'")
+    if idx._ensure_column("atoms", "hash", "TEXT"):
+        needed.append("hash")
+    idx._ensure_column("atoms", "source", "TEXT")
+    if idx._ensure_column("atoms", "simhash", "INTEGER"):
+        needed.append("simhash")
+    idx._ensure_column("atoms", "blob_ref", "TEXT")
+    idx._ensure_column("atoms", "content_bytes", "INTEGER")
+    # FTS5 if available
+    try:
+        c.execute("""CREATE VIRTUAL TABLE IF NOT EXISTS atoms_fts USING fts5(
+            atom_id UNINDEXED,
+            summary,
+            content,
+            tags,
+            entities,
+            scope
+        )""")
+    except sqlite3.OperationalError:
+        pass
+
+    c.execute("""CREATE TABLE IF NOT EXISTS edges(
+        src TEXT,
+        dst TEXT,
+        kind TEXT,              -- 'neighbor' | 'coact'
+        weight REAL,
+        n INTEGER DEFAULT 0,
+        last_ts TEXT,
+        namespace TEXT NOT NULL DEFAULT 'default',
+        PRIMARY KEY (src, dst, kind)
+    )""")
+    idx._ensure_column("edges", "namespace", "TEXT NOT NULL DEFAULT 'default'")
+    c.execute("""CREATE INDEX IF NOT EXISTS idx_edges_namespace ON edges(namespace)""")
+    c.execute("""CREATE INDEX IF NOT EXISTS idx_edges_src_kind ON edges(src, kind)""")
+    c.execute("""CREATE INDEX IF NOT EXISTS idx_edges_dst_kind ON edges(dst, kind)""")
+    c.execute("""CREATE INDEX IF NOT EXISTS idx_edges_ns_kind_ts ON edges(namespace, kind, last_ts)""")
+
+    c.execute("""CREATE INDEX IF NOT EXISTS idx_atoms_type ON atoms(type)""")
+    c.execute("""CREATE INDEX IF NOT EXISTS idx_atoms_ts ON atoms(ts)""")
+    c.execute("""CREATE INDEX IF NOT EXISTS idx_atoms_ns_rank ON atoms(namespace, pinned DESC, w DESC, uses DESC)""")
+    c.execute("""CREATE INDEX IF NOT EXISTS idx_atoms_ns_hash ON atoms(namespace, hash)""")
+    c.execute("""CREATE INDEX IF NOT EXISTS idx_atoms_blob ON atoms(blob_ref) WHERE blob_ref IS NOT NULL AND blob_ref != ''""")
+    c.execute("""CREATE TABLE IF NOT EXISTS atom_lsh(
+        band INTEGER,
+        bucket INTEGER,
+        atom_id TEXT,
+        PRIMARY KEY (band, bucket, atom_id)
+    ) WITHOUT ROWID""")
+    c.execute("""CREATE INDEX IF NOT EXISTS idx_atom_lsh_atom ON atom_lsh(atom_id)""")
+    c.execute("""CREATE TABLE IF NOT EXISTS cluster_member(
+        cluster_id TEXT,
+        atom_id TEXT,
+        PRIMARY KEY (cluster_id, atom_id)
+    ) WITHOUT ROWID""")
+    c.execute("""CREATE INDEX IF NOT EXISTS idx_cluster_member_atom ON cluster_member(atom_id)""")
+    c.execute("""CREATE TABLE IF NOT EXISTS synaptic_meta(
+        key TEXT PRIMARY KEY,
+        value TEXT
+    )""")
+    from .index import JUNCTIONS
+    if not idx._table_exists("atom_scope"):
+        # stores created before the junction tables: derive them from the comma-joined columns
+        needed.append("junctions")
+    for table, col, _ in JUNCTIONS:
+        c.execute(f"""CREATE TABLE IF NOT EXISTS {table}(
+            atom_id TEXT,
+            {col} TEXT,
+            PRIMARY KEY ({col}, atom_id)
+        ) WITHOUT ROWID""")
+        c.execute(f"""CREATE INDEX IF NOT EXISTS idx_{table}_atom ON {table}(atom_id)""")
+    return needed
+
+def _m2_vectors(idx) -> List[str]:
+    """Dense embeddings per atom for vector top-k / hybrid retrieval."""
+    c = idx.conn.cursor()
+    c.execute("""CREATE TABLE IF NOT EXISTS atom_vec(
+        atom_id TEXT PRIMARY KEY,
+        namespace TEXT NOT NULL DEFAULT 'default',
+        model TEXT,
+        vec BLOB
+    )""")
+    c.execute("""CREATE INDEX IF NOT EXISTS idx_atom_vec_ns_model ON atom_vec(namespace, model)""")
+    return ["vectors"]
+
+def _m3_embed_cache(idx) -> List[str]:
+    """Vectors of model-backed embedders keyed by content hash, so re-adds, duplicates across namespaces and
+    model switches back and forth never embed the same text twice."""
+    idx.conn.execute("""CREATE TABLE IF NOT EXISTS embed_cache(
+        hash TEXT NOT NULL,
+        model TEXT NOT NULL,
+        vec BLOB,
+        PRIMARY KEY(hash, model)
+    )""")
+    return []
+
+# Ordered; the last version is SynapticIndex's SCHEMA_VERSION.
+MIGRATIONS: List[Migration] = [
+    Migration(1, "base", _m1_base),
+    Migration(2, "atom_vec", _m2_vectors),
+    Migration(3, "embed_cache", _m3_embed_cache),
+]
+
+# ---- driver ----
+
+# synaptic_meta key: the highest migration whose DDL has run. Once it reaches SCHEMA_VERSION, opening a
+# store whose backfills are still deferred (user_version behind) runs no DDL and writes nothing.
+SCHEMA_APPLIED_KEY = "migration:schema_applied"
+
+def _pending_key(m: Migration) -> str:
+    return f"migration:{m.version}:backfills"
+
+def _cursor_key(m: Migration, name: str) -> str:
+    return f"migration:{m.version}:{name}:rowid"
+
+def check_version(idx):
+    from .index import SCHEMA_VERSION
+    v = idx.schema_version()
+    if v > SCHEMA_VERSION:
+        raise SchemaVersionError(f"{idx.db_path} has schema version {v}, newer than this synaptic "
+                                 f"(supports up to {SCHEMA_VERSION}); upgrade synaptic to open it")
+
+def _pending(idx) -> List[Migration]:
+    v = idx.schema_version()
+    return [m for m in MIGRATIONS if m.version > v]
+
+def schema_applied(idx) -> int:
+    """Highest migration version whose DDL has run (reads only; works on a read-only connection)."""
+    v = idx.schema_version()
+    if not idx._table_exists("synaptic_meta"):
+        return v
+    return max(v, int(idx.get_meta(SCHEMA_APPLIED_KEY, "0") or 0))
+
+def _remaining(idx, m: Migration) -> List[str]:
+    stored = idx.get_meta(_pending_key(m), "")
+    return json.loads(stored) if stored else []
+
+def _run_schema(idx, m: Migration) -> List[str]:
+    """DDL for `m` (idempotent) and its remaining backfills, recorded on first run."""
+    # one transaction, so the backfills an ADD COLUMN implies are recorded with it or not at all
+    idx.conn.commit()
+    with idx.batch():
+        idx.conn.execute("BEGIN")
+        needed = m.schema(idx)
+        key = _pending_key(m)
+        stored = idx.get_meta(key, "")
+        if stored:
+            remaining = json.loads(stored)
+        else:
+            remaining = needed
+            idx.set_meta(key, json.dumps(remaining))
+        idx.set_meta(SCHEMA_APPLIED_KEY, str(max(m.version, int(idx.get_meta(SCHEMA_APPLIED_KEY, "0") or 0))))
+    return remaining
+
+def _finish(idx, m: Migration):
+    c = idx.conn.cursor()
+    c.execute("DELETE FROM synaptic_meta WHERE key = ? OR key LIKE ?", (_pending_key(m), f"migration:{m.version}:%"))
+    c.execute(f"PRAGMA user_version = {int(m.version)}")
+    idx.conn.commit()
+
+def _run_backfill(idx, m: Migration, name: str, *, batch: int, deadline: Optional[float]) -> bool:
+    """Advance one backfill; True when it has covered every atom."""
+    fn = BACKFILLS[name]
+    ckey = _cursor_key(m, name)
+    cursor = int(idx.get_meta(ckey, "0") or 0)
+    c = idx.conn.cursor()
+    while True:
+        if deadline is not None and time.monotonic() >= deadline:
+            return False
+        rows = c.execute("SELECT rowid AS _rowid, * FROM atoms WHERE rowid > ? ORDER BY rowid LIMIT ?",
+                         (cursor, int(batch))).fetchall()
+        if not rows:
+            return True
+        fn(idx, c, rows)
+        cursor = int(rows[-1]["_rowid"])
+        c.execute("""INSERT INTO synaptic_meta(key, value) VALUES (?,?)
+            ON CONFLICT(key) DO UPDATE SET value=excluded.value""", (ckey, str(cursor)))
+        idx.conn.commit()
+
+def apply(idx, *, batch: int = DEFAULT_BATCH, max_seconds: Optional[float] = None,
+          backfill: bool = True) -> Dict[str, Any]:
+    """Run pending migrations in order. With `max_seconds`, stop (resumably) once the budget is spent;
+    with `backfill=False`, only the DDL runs and backfills stay pending.
+
+    The DDL of every pending migration runs first, so code of this version finds all its tables even
+    while earlier backfills are still deferred; user_version still only advances in order."""
+    check_version(idx)
+    deadline = time.monotonic() + max_seconds if max_seconds is not None else None
+    applied = schema_applied(idx)
+    pending = [(m, _remaining(idx, m) if m.version <= applied else _run_schema(idx, m)) for m in _pending(idx)]
+    for m, remaining in pending:
+        if remaining and not backfill:
+            break
+        while remaining:
+            if not _run_backfill(idx, m, remaining[0], batch=batch, deadline=deadline):
+                return status(idx)
+            remaining = remaining[1:]
+            idx.set_meta(_pending_key(m), json.dumps(remaining))
+            idx.conn.commit()
+        _finish(idx, m)
+    return status(idx)
+
+def migrate_on_open(idx):
+    """Bring a store up to date when it is opened read-write: DDL once; backfills inline only for
+    small stores (see AUTO_BACKFILL_MAX_ATOMS). A large store whose DDL already ran and whose backfills
+    wait for `syn migrate --apply` is left as is, so such opens write nothing."""
+    check_version(idx)
+    small = True
+    if idx._table_exists("atoms"):
+        # MAX(rowid) bounds the row count without scanning the table
+        small = idx.conn.execute("SELECT COALESCE(MAX(rowid), 0) FROM atoms").fetchone()[0] <= AUTO_BACKFILL_MAX_ATOMS
+    if not small and schema_current(idx):
+        return
+    apply(idx, backfill=small)
+
+def schema_current(idx) -> bool:
+    """Every table and column this version uses exists (backfills may still be pending)."""
+    from .index import SCHEMA_VERSION
+    return schema_applied(idx) >= SCHEMA_VERSION
+
+def status(idx) -> Dict[str, Any]:
+    from .index import SCHEMA_VERSION
+    v = idx.schema_version()
+    has_meta = idx._table_exists("synaptic_meta")
+    applied = schema_applied(idx)
+    max_rowid = idx.conn.execute("SELECT COALESCE(MAX(rowid), 0) FROM atoms").fetchone()[0] \
+        if idx._table_exists("atoms") else 0
+    pending = []
+    for m in MIGRATIONS:
+        if m.version <= v:
+            continue
+        stored = idx.get_meta(_pending_key(m), "") if has_meta else ""
+        backfills = []
+        for name in (json.loads(stored) if stored else []):
+            done = int(idx.get_meta(_cursor_key(m, name), "0") or 0)
+            backfills.append({"name": name, "rowid": done, "max_rowid": max_rowid})
+        pending.append({"version": m.version, "name": m.name, "schema_applied": m.version <= applied or bool(stored),
+                        "backfills": backfills})
+    return {"schema_version": v, "code_version": SCHEMA_VERSION, "up_to_date": v == SCHEMA_VERSION,
+            "pending": pending}
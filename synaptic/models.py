@@ -23,6 +23,8 @@ class Atom:
 
     pinned: bool = False
     hash: str = ""
+    namespace: str = "default"
+    blob: str = ""            # 'sha256:<hex>' when content was offloaded to blobs/ (content is then "")
 
 @dataclass
 class ActivationEvent:
@@ -32,6 +34,7 @@ class ActivationEvent:
     atom_ids: List[str]
     kind: str                 # "search" | "brief" | "cite" | "manual"
     meta: Dict[str, Any] = field(default_factory=dict)
+    namespace: str = "default"
 
 @dataclass
 class L2Suggestion:
@@ -47,6 +50,24 @@ class MetaCandidate:
     score: float
     reasons: List[str] = field(default_factory=list)
 
+@dataclass
+class AtomFilter:
+    """Structured retrieval filter, applied inside the candidate SQL.
+
+    Values within one field are OR'ed; non-empty fields are AND'ed together.
+    `since` / `until` are inclusive ISO-8601 UTC bounds on the atom's creation ts; a date-only `until`
+    covers that whole day.
+    """
+    scope: List[str] = field(default_factory=list)
+    type: List[str] = field(default_factory=list)
+    tags: List[str] = field(default_factory=list)
+    entities: List[str] = field(default_factory=list)
+    since: str = ""
+    until: str = ""
+
+    def is_empty(self) -> bool:
+        return not (self.scope or self.type or self.tags or self.entities or self.since or self.until)
+
 @dataclass
 class Retrieved:
     atom_id: str
@@ -0,0 +1,672 @@
+from __future__ import annotations
+from array import array
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass, replace
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+import heapq, json, math, mmap, os, re, struct, sys, time, unicodedata, zlib
+
+from .config import SynapticConfig
+from .embeddings import dot_sparse_dense, dot_sparse_packed, get_embedder
+from .index import HOT_COLUMNS, split_csv
+from .instrument import count, timed
+from .models import AtomFilter
+from .retrieve import Retriever
+from .util import inclusive_until, now_iso
+
+# Read-only snapshot of one namespace in a single file, opened with mmap and queried in place:
+# no SQLite connection, no schema check and no row decoding beyond the rows a query returns, so a
+# fresh process answers its first query in milliseconds and every process reading the same pack
+# shares its pages through the OS page cache.
+#
+# Layout: MAGIC, u32 header length, JSON header, then 8-byte aligned sections (native byte order)
+# whose (offset from the data start, bytes, typecode) the header lists:
+#
+#   atoms      str_off/str_data   string columns, atom-major ((atom * len(_STR_COLUMNS) + col) -> slice)
+#              w d, uses q, pinned q, simhash q, nulls B (atom * len(HOT_COLUMNS) + col)
+#              rank I             atom order of iter_atoms (pinned DESC, w DESC, uses DESC)
+#              id_slots i         open-addressing table crc32(atom_id) -> atom (-1: empty)
+#              id_rank I          each atom's position in atom_id order (vector_topk ties)
+#   ids        xid_off/xid_data   edge and cluster targets that are not atoms of the pack
+#   vectors    vec_mat B (atoms x dim float32), has_vec B
+#   edges      <kind>_off Q (CSR per atom), <kind>_dst I, <kind>_w d, <kind>_n q, kind in EDGE_KINDS;
+#              dst indexes atoms, then ids; each atom's edges in neighbors() order
+#   clusters   cluster_of i       atom/id index of the atom's cluster, -1 for none
+#   fts        term_off/term_data (sorted), term_df I, post_off Q, post_doc I, post_tf I,
+#              doc_len I, fts_rowid q
+#
+# The inverted index is built from FTS5's own token instances (fts5vocab), so search_fts matches and
+# ranks exactly like the bm25() query of SynapticIndex.search_fts (document frequencies and average
+# length are those of the whole FTS table, as in SQLite).
+
+MAGIC = b"SYNPACK1"
+PACK_FORMAT = 1
+EDGE_KINDS = ("neighbor", "coact")
+_STR_COLUMNS = ("atom_id", "ts", "type", "scope", "tags", "entities", "summary", "content", "last_used_ts", "blob_ref")
+_NUM_COLUMNS = {"w": "d", "uses": "q", "pinned": "q", "simhash": "q"}
+_COL = {c: i for i, c in enumerate(HOT_COLUMNS)}
+_STR_POS = {c: i for i, c in enumerate(_STR_COLUMNS)}
+
+# FTS5 bm25() constants (fts5_aux.c)
+_BM25_K1 = 1.2
+_BM25_B = 0.75
+
+def _align(n: int) -> int:
+    return (n + 7) & ~7
+
+def _string_table(values: Iterable[Optional[str]]) -> Tuple[array, bytes]:
+    offs, data = array("Q", [0]), bytearray()
+    for s in values:
+        data += (s or "").encode("utf-8")
+        offs.append(len(data))
+    return offs, bytes(data)
+
+def _id_slots(ids: Sequence[str]) -> array:
+    # linear probing at load <= 1/2; lookups compare the one or two ids they land on
+    size = 1
+    while size < 2 * len(ids):
+        size <<= 1
+    slots = array("i", [-1] * size)
+    for i, aid in enumerate(ids):
+        h = zlib.crc32(aid.encode("utf-8")) & (size - 1)
+        while slots[h] >= 0:
+            h = (h + 1) & (size - 1)
+        slots[h] = i
+    return slots
+
+def fts_terms(text: str) -> List[str]:
+    """FTS5 unicode61 tokens of `text` (case-folded, diacritics removed)."""
+    t = "".join(ch for ch in unicodedata.normalize("NFD", text) if unicodedata.category(ch) != "Mn")
+    return re.findall(r"[^\W_]+", t.lower())
+
+def _fts_phrases(query: str) -> Optional[List[List[str]]]:
+    # Retriever queries are whitespace-separated barewords; anything else is an FTS5 syntax error,
+    # which search_fts answers with no rows. A bareword splitting into several tokens is an FTS5
+    # phrase; here its tokens are matched individually (no adjacency check).
+    phrases: List[List[str]] = []
+    for word in query.split():
+        if any(ch.isascii() and not (ch.isalnum() or ch in "_\x1a") for ch in word):
+            return None
+        terms = fts_terms(word)
+        if terms:
+            phrases.append(terms)
+    return phrases
+
+_LIKE_COLUMNS = ("summary", "content", "tags", "entities", "scope")
+_UTF8_CHAR = rb"(?:[\x00-\x7f]|[\xc0-\xff][\x80-\xbf]*)"
+
+def _like_regex(query: str) -> "re.Pattern[bytes]":
+    # `lower(col) LIKE '%' || lower(query) || '%'` on UTF-8 bytes: SQLite's lower() and LIKE fold ASCII
+    # only (as re.I does for bytes patterns); % and _ in the query stay wildcards
+    parts = []
+    for ch in query.lower():
+        parts.append(rb".*" if ch == "%" else _UTF8_CHAR if ch == "_" else re.escape(ch.encode("utf-8")))
+    return re.compile(b"".join(parts), re.I | re.S)
+
+@dataclass
+class PackReport:
+    path: str
+    namespace: str
+    atoms: int
+    vectors: int
+    edges: int
+    terms: int
+    bytes: int
+    seconds: float = 0.0
+
+@timed("write_pack")
+def write_pack(store, path: Path) -> PackReport:
+    """Snapshot the store's namespace (atoms, stored vectors of the configured embedder, edges,
+    cluster membership and the FTS index) into a pack file at `path`, replacing it atomically."""
+    t0 = time.perf_counter()
+    conn = store.idx.conn
+    sections: Dict[str, Tuple[str, bytes]] = {}
+
+    def put(name: str, arr: Any, typecode: str = "B"):
+        sections[name] = (typecode, arr.tobytes() if isinstance(arr, array) else bytes(arr))
+
+    # every section from one read snapshot, even while agents keep writing
+    own = not conn.in_transaction
+    if own:
+        conn.execute("BEGIN")
+    try:
+        meta, n_vec, n_edges = _collect(store, put)
+    finally:
+        if own:
+            conn.execute("ROLLBACK")
+    size = _write_sections(Path(path), meta, sections)
+    fts = meta["fts"]
+    return PackReport(path=str(path), namespace=meta["namespace"], atoms=meta["atoms"], vectors=n_vec, edges=n_edges,
+                      terms=fts["terms"] if fts else 0, bytes=size, seconds=round(time.perf_counter() - t0, 3))
+
+def _collect(store, put) -> Tuple[Dict[str, Any], int, int]:
+    idx, ns = store.idx, store.namespace
+    conn = idx.conn
+    model = store.embedder.version
+
+    # atoms, in rowid order
+    cols = ", ".join(f"a.{c}" for c in HOT_COLUMNS)
+    rows = conn.execute(f"SELECT {cols} FROM atoms a WHERE a.namespace = ? ORDER BY a.rowid", (ns,)).fetchall()
+    n = len(rows)
+    pos = {r["atom_id"]: i for i, r in enumerate(rows)}
+    offs, data = _string_table(r[c] for r in rows for c in _STR_COLUMNS)
+    put("str_off", offs, "Q")
+    put("str_data", data)
+    for c, tc in _NUM_COLUMNS.items():
+        put(c, array(tc, (r[c] or 0 for r in rows)), tc)
+    put("nulls", bytes(1 if r[c] is None else 0 for r in rows for c in HOT_COLUMNS))
+    put("rank", array("I", (pos[r[0]] for r in conn.execute(
+        "SELECT atom_id FROM atoms WHERE namespace = ? ORDER BY pinned DESC, w DESC, uses DESC", (ns,)))), "I")
+    id_rank = array("I", bytes(4 * n))
+    for j, i in enumerate(sorted(range(n), key=lambda i: rows[i]["atom_id"])):
+        id_rank[i] = j
+    put("id_rank", id_rank, "I")
+    put("id_slots", _id_slots([r["atom_id"] for r in rows]), "i")
+
+    extra: Dict[str, int] = {}
+
+    def ref(aid: str) -> int:
+        # index of an edge/cluster target: an atom of the pack, else an entry of the extra id table
+        if aid in pos:
+            return pos[aid]
+        return extra.setdefault(aid, n + len(extra))
+
+    # vectors of the configured embedder
+    dim, n_vec = 0, 0
+    mat = bytearray()
+    has_vec = bytearray(n)
+    vecs = {aid: vec for aid, vec in conn.execute(
+        "SELECT atom_id, vec FROM atom_vec WHERE model = ? AND namespace = ? AND length(vec) > 0", (model, ns)) if aid in pos}
+    if vecs:
+        dim = len(next(iter(vecs.values()))) // 4
+        zero = bytes(4 * dim)
+        for i, r in enumerate(rows):
+            vec = vecs.get(r["atom_id"])
+            if vec is not None and len(vec) == 4 * dim:
+                mat += vec
+                has_vec[i] = 1
+                n_vec += 1
+            else:
+                mat += zero
+    put("vec_mat", mat)
+    put("has_vec", has_vec)
+
+    # edges leaving the pack's atoms, CSR per kind, each atom's list in neighbors() order
+    n_edges = 0
+    for kind in EDGE_KINDS:
+        e_off, e_dst, e_w, e_n = array("Q", bytes(8 * (n + 1))), array("I"), array("d"), array("q")
+        for e in conn.execute("""SELECT e.src, e.dst, e.weight, e.n FROM edges e JOIN atoms a ON a.atom_id = e.src
+                WHERE a.namespace = ? AND e.kind = ?
+                ORDER BY a.rowid, e.weight DESC, e.n DESC, e.dst""", (ns, kind)):
+            e_off[pos[e["src"]] + 1] += 1
+            e_dst.append(ref(e["dst"]))
+            e_w.append(float(e["weight"] or 0.0))
+            e_n.append(int(e["n"] or 0))
+        for i in range(n):
+            e_off[i + 1] += e_off[i]
+        n_edges += len(e_dst)
+        put(f"{kind}_off", e_off, "Q")
+        put(f"{kind}_dst", e_dst, "I")
+        put(f"{kind}_w", e_w, "d")
+        put(f"{kind}_n", e_n, "q")
+
+    cluster_of = array("i", [-1] * n)
+    for r in conn.execute("""SELECT m.atom_id, m.cluster_id FROM cluster_member m
+            JOIN atoms a ON a.atom_id = m.atom_id WHERE a.namespace = ?""", (ns,)):
+        cluster_of[pos[r["atom_id"]]] = ref(r["cluster_id"])
+    put("cluster_of", cluster_of, "i")
+
+    offs, data = _string_table(extra)
+    put("xid_off", offs, "Q")
+    put("xid_data", data)
+
+    fts = _pack_fts(conn, pos, put) if idx._fts_exists() else None
+
+    meta = {"format": PACK_FORMAT, "namespace": ns, "model": model, "dim": dim, "atoms": n,
+            "extra_ids": len(extra), "created": now_iso(), "byteorder": sys.byteorder, "fts": fts}
+    return meta, n_vec, n_edges
+
+def _pack_fts(conn, pos: Dict[str, int], put) -> Dict[str, int]:
+    # postings from FTS5's token instances: exactly the tokens, document frequencies and lengths
+    # bm25() sees. Statistics cover the whole FTS table; postings only the pack's atoms.
+    doc_of = {rowid: pos[aid] for rowid, aid in conn.execute("SELECT rowid, atom_id FROM atoms_fts") if aid in pos}
+    n = len(pos)
+    fts_rowid = array("q", [-1] * n)
+    for rowid, i in doc_of.items():
+        fts_rowid[i] = rowid
+    doc_len = array("I", bytes(4 * n))
+    terms: List[bytes] = []
+    term_df, post_off, post_doc, post_tf = array("I"), array("Q", [0]), array("I"), array("I")
+    tokens = 0
+    conn.execute("CREATE VIRTUAL TABLE temp.synpack_vocab USING fts5vocab(main, atoms_fts, instance)")
+    try:
+        cur_term, cur_doc, df, tf = None, None, 0, 0
+        postings: List[Tuple[int, int]] = []
+
+        def flush_doc():
+            if cur_doc in doc_of:
+                postings.append((doc_of[cur_doc], tf))
+
+        def flush_term():
+            terms.append(cur_term.encode("utf-8"))
+            term_df.append(df)
+            postings.sort()
+            post_doc.extend(d for d, _ in postings)
+            post_tf.extend(t for _, t in postings)
+            post_off.append(len(post_doc))
+
+        for term, doc in conn.execute("SELECT term, doc FROM temp.synpack_vocab"):
+            tokens += 1
+            i = doc_of.get(doc)
+            if i is not None:
+                doc_len[i] += 1
+            if term != cur_term or doc != cur_doc:
+                if cur_term is not None:
+                    flush_doc()
+                if term != cur_term:
+                    if cur_term is not None:
+                        flush_term()
+                    cur_term, df, postings = term, 0, []
+                cur_doc, df, tf = doc, df + 1, 0
+            tf += 1
+        if cur_term is not None:
+            flush_doc()
+            flush_term()
+    finally:
+        conn.execute("DROP TABLE temp.synpack_vocab")
+    rows_total = int(conn.execute("SELECT COUNT(*) FROM atoms_fts").fetchone()[0])
+
+    order = sorted(range(len(terms)), key=terms.__getitem__)
+    if order != list(range(len(terms))):
+        # fts5vocab lists terms in byte order already; keep the binary search honest regardless
+        s_doc, s_tf, s_off = array("I"), array("I"), array("Q", [0])
+        for t in order:
+            s_doc.extend(post_doc[post_off[t]:post_off[t + 1]])
+            s_tf.extend(post_tf[post_off[t]:post_off[t + 1]])
+            s_off.append(len(s_doc))
+        terms = [terms[t] for t in order]
+        term_df = array("I", (term_df[t] for t in order))
+        post_doc, post_tf, post_off = s_doc, s_tf, s_off
+
+    t_off, t_data = array("Q", [0]), bytearray()
+    for t in terms:
+        t_data += t
+        t_off.append(len(t_data))
+    put("term_off", t_off, "Q")
+    put("term_data", t_data)
+    put("term_df", term_df, "I")
+    put("post_off", post_off, "Q")
+    put("post_doc", post_doc, "I")
+    put("post_tf", post_tf, "I")
+    put("doc_len", doc_len, "I")
+    put("fts_rowid", fts_rowid, "q")
+    return {"rows": rows_total, "tokens": tokens, "terms": len(terms)}
+
+def _write_sections(path: Path, meta: Dict[str, Any], sections: Dict[str, Tuple[str, bytes]]) -> int:
+    layout: Dict[str, List[Any]] = {}
+    off = 0
+    for name, (tc, data) in sections.items():
+        layout[name] = [off, len(data), tc]
+        off = _align(off + len(data))
+    header = json.dumps({**meta, "sections": layout}, ensure_ascii=False).encode("utf-8")
+    start = _align(len(MAGIC) + 4 + len(header))
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        f.write(MAGIC + struct.pack("<I", len(header)) + header)
+        for name, (_, data) in sections.items():
+            f.seek(start + layout[name][0])
+            f.write(data)
+        f.truncate(start + off)
+        f.flush()
+        os.fsync(f.fileno())
+    # atomic: processes that have the old pack mapped keep reading the old file
+    os.replace(tmp, path)
+    return start + off
+
+class SynapticPack:
+    """A pack file mapped read-only, with the SynapticIndex read methods the Retriever uses.
+
+    Rows are plain dicts of HOT_COLUMNS; FTS rows also carry `rank` (bm25, lower is better).
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mm[:len(MAGIC)] != MAGIC:
+            self._mm.close()
+            raise ValueError(f"{self.path}: not a synaptic pack")
+        (hlen,) = struct.unpack_from("<I", self._mm, len(MAGIC))
+        meta = json.loads(self._mm[len(MAGIC) + 4:len(MAGIC) + 4 + hlen])
+        if meta.get("format") != PACK_FORMAT or meta.get("byteorder") != sys.byteorder:
+            self._mm.close()
+            raise ValueError(f"{self.path}: unsupported pack (format {meta.get('format')}, {meta.get('byteorder')}-endian)")
+        self.meta = meta
+        self.namespace: str = meta["namespace"]
+        self.model: str = meta["model"]
+        self.dim: int = meta["dim"]
+        self.n: int = meta["atoms"]
+        self._fts: Optional[Dict[str, int]] = meta["fts"]
+        start = _align(len(MAGIC) + 4 + hlen)
+        self._buf = memoryview(self._mm)
+        self._views: List[memoryview] = [self._buf]
+        self._sec: Dict[str, memoryview] = {}
+        for name, (off, size, tc) in meta["sections"].items():
+            v = self._buf[start + off:start + off + size]
+            self._views.append(v)
+            if tc != "B":
+                v = v.cast(tc)
+                self._views.append(v)
+            self._sec[name] = v
+        s = self._sec
+        self._str_off, self._str_data, self._nulls = s["str_off"], s["str_data"], s["nulls"]
+        self._num = {c: s[c] for c in _NUM_COLUMNS}
+        self._rank, self._id_slots, self._id_rank = s["rank"], s["id_slots"], s["id_rank"]
+        self._cluster_of = s["cluster_of"]
+        self._has_vec = s["has_vec"]
+        self._mat = s["vec_mat"]
+        self._vec = self._mat.cast("f") if self.dim else None
+        self._n_vec: Optional[int] = None
+        if self._vec is not None:
+            self._views.append(self._vec)
+
+    def close(self):
+        for v in reversed(self._views):
+            v.release()
+        self._views = []
+        self._mm.close()
+
+    # -- rows
+
+    def _str(self, i: int, col: str) -> str:
+        j = i * len(_STR_COLUMNS) + _STR_POS[col]
+        return str(self._str_data[self._str_off[j]:self._str_off[j + 1]], "utf-8")
+
+    def _id(self, i: int) -> str:
+        if i < self.n:
+            return self._str(i, "atom_id")
+        j = i - self.n
+        off = self._sec["xid_off"]
+        return str(self._sec["xid_data"][off[j]:off[j + 1]], "utf-8")
+
+    def _is_null(self, i: int, col: str) -> bool:
+        return bool(self._nulls[i * len(HOT_COLUMNS) + _COL[col]])
+
+    def _row(self, i: int, columns: Optional[Sequence[str]] = None) -> Dict[str, Any]:
+        ns = len(_STR_COLUMNS)
+        offs = self._str_off[i * ns:(i + 1) * ns + 1]
+        nulls = self._nulls[i * len(HOT_COLUMNS):(i + 1) * len(HOT_COLUMNS)]
+        data = self._str_data
+        out: Dict[str, Any] = {}
+        for c in HOT_COLUMNS if columns is None else columns:
+            if c == "namespace":
+                out[c] = self.namespace
+            elif nulls[_COL[c]]:
+                out[c] = None
+            elif c in _NUM_COLUMNS:
+                out[c] = self._num[c][i]
+            else:
+                k = _STR_POS[c]
+                out[c] = str(data[offs[k]:offs[k + 1]], "utf-8")
+        return out
+
+    def _find(self, atom_id: str) -> Optional[int]:
+        slots = self._id_slots
+        mask = len(slots) - 1
+        h = zlib.crc32(atom_id.encode("utf-8")) & mask
+        while slots[h] >= 0:
+            if self._str(slots[h], "atom_id") == atom_id:
+                return slots[h]
+            h = (h + 1) & mask
+        return None
+
+    def _ns_ok(self, namespace: Optional[str]) -> bool:
+        return namespace is None or namespace == self.namespace
+
+    def _matches(self, i: int, f: Optional[AtomFilter]) -> bool:
+        # SynapticIndex.filter_clause semantics: any value per field, every given field
+        if f is None or f.is_empty():
+            return True
+        for field, values in (("scope", f.scope), ("tags", f.tags), ("entities", f.entities)):
+            if values and not set(values) & set(split_csv(self._str(i, field))):
+                return False
+        if f.type and (self._is_null(i, "type") or self._str(i, "type") not in f.type):
+            return False
+        if f.since or f.until:
+            if self._is_null(i, "ts"):
+                return False
+            ts = self._str(i, "ts")
+            if (f.since and ts < f.since) or (f.until and ts > inclusive_until(f.until)):
+                return False
+        return True
+
+    # -- SynapticIndex read API
+
+    def get_atom(self, atom_id: str) -> Optional[Dict[str, Any]]:
+        i = self._find(atom_id)
+        return None if i is None else self._row(i)
+
+    @timed("pack.atoms_by_ids")
+    def atoms_by_ids(self, ids: Sequence[str], columns: Optional[Sequence[str]] = None) -> Dict[str, Dict[str, Any]]:
+        out: Dict[str, Dict[str, Any]] = {}
+        for aid in ids:
+            i = self._find(aid)
+            if i is not None:
+                out[aid] = self._row(i, columns)
+        return out
+
+    @timed("pack.iter_atoms")
+    def iter_atoms(self, filters: Optional[AtomFilter] = None, limit: Optional[int] = None,
+                   namespace: Optional[str] = None, columns: Optional[Sequence[str]] = None) -> Iterator[Dict[str, Any]]:
+        if not self._ns_ok(namespace):
+            return
+        left = self.n if limit is None else int(limit)
+        for i in self._rank:
+            if left <= 0:
+                return
+            if self._matches(i, filters):
+                left -= 1
+                yield self._row(i, columns)
+
+    @timed("pack.search_fallback")
+    def search_fallback(self, query: str, k: int, filters: Optional[AtomFilter] = None,
+                        namespace: Optional[str] = None) -> List[Dict[str, Any]]:
+        if not self._ns_ok(namespace):
+            return []
+        hits = self._like_atoms(_like_regex(query))
+        rows: List[Dict[str, Any]] = []
+        if hits:
+            for i in self._rank:
+                if len(rows) >= k:
+                    break
+                if i in hits and self._matches(i, filters):
+                    rows.append(self._row(i))
+        count("pack.search_fallback.rows", len(rows))
+        return rows
+
+    def _like_atoms(self, pat: "re.Pattern[bytes]") -> Set[int]:
+        # one regex pass over the whole string table; each hit is mapped to its field and confirmed
+        # within that field's bounds (a hit may straddle two fields), then the scan resumes at the next field
+        ns, nc = len(_STR_COLUMNS), len(HOT_COLUMNS)
+        cols = {_STR_POS[c]: _COL[c] for c in _LIKE_COLUMNS}
+        off, data, nulls = self._str_off, self._str_data, self._nulls
+        hits: Set[int] = set()
+        if pat.fullmatch(b""):
+            # matches every non-NULL value, empty ones included
+            return {i for i in range(self.n) if any(not nulls[i * nc + c] for c in cols.values())}
+        pos, end = 0, len(data)
+        while pos < end:
+            m = pat.search(data, pos)
+            if m is None:
+                break
+            f = bisect_right(off, m.start()) - 1
+            atom, col = divmod(f, ns)
+            if col in cols and atom not in hits and not nulls[atom * nc + cols[col]] \
+                    and pat.search(data, off[f], off[f + 1]):
+                hits.add(atom)
+            pos = off[f + 1]
+        return hits
+
+    def _term(self, term: str) -> Optional[int]:
+        off, data = self._sec["term_off"], self._sec["term_data"]
+        key = term.encode("utf-8")
+        lo, hi = 0, len(off) - 1
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if data[off[mid]:off[mid + 1]].tobytes() < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(off) - 1 and data[off[lo]:off[lo + 1]].tobytes() == key:
+            return lo
+        return None
+
+    @timed("pack.search_fts")
+    def search_fts(self, query: str, k: int, filters: Optional[AtomFilter] = None,
+                   namespace: Optional[str] = None) -> List[Dict[str, Any]]:
+        fts = self._fts
+        if not fts or not fts["rows"] or not self._ns_ok(namespace):
+            return []
+        phrases = _fts_phrases(query)
+        if not phrases:
+            return []
+        s = self._sec
+        post_off, post_doc, post_tf, df = s["post_off"], s["post_doc"], s["post_tf"], s["term_df"]
+        n_rows = float(fts["rows"])
+        avgdl = float(fts["tokens"]) / n_rows
+        ranges: List[List[Tuple[int, int]]] = []      # per phrase, the (start, end) postings of its terms
+        idfs: List[float] = []
+        for terms in phrases:
+            tids = [self._term(t) for t in terms]
+            if any(t is None for t in tids):
+                return []
+            ranges.append([(post_off[t], post_off[t + 1]) for t in tids])
+            n_hit = min(df[t] for t in tids)
+            idf = math.log((n_rows - n_hit + 0.5) / (n_hit + 0.5))
+            idfs.append(idf if idf > 0.0 else 1e-6)
+
+        lo0, hi0 = min((r for rs in ranges for r in rs), key=lambda r: r[1] - r[0])
+        doc_len, fts_rowid = s["doc_len"], s["fts_rowid"]
+        hits = []
+        for p in range(lo0, hi0):
+            d = post_doc[p]
+            freqs = []
+            for rs in ranges:
+                f = None
+                for lo, hi in rs:
+                    j = bisect_left(post_doc, d, lo, hi)
+                    if j >= hi or post_doc[j] != d:
+                        f = None
+                        break
+                    f = post_tf[j] if f is None else min(f, post_tf[j])
+                if f is None:
+                    break
+                freqs.append(float(f))
+            if len(freqs) != len(ranges) or not self._matches(d, filters):
+                continue
+            dl = float(doc_len[d])
+            score = 0.0
+            for idf, f in zip(idfs, freqs):
+                score += idf * ((f * (_BM25_K1 + 1.0)) / (f + _BM25_K1 * (1 - _BM25_B + _BM25_B * dl / avgdl)))
+            hits.append((-1.0 * score, fts_rowid[d], d))
+        rows = []
+        for rank, _, d in heapq.nsmallest(k, hits):
+            row = self._row(d)
+            row["rank"] = rank
+            rows.append(row)
+        count("pack.search_fts.rows", len(rows))
+        return rows
+
+    def _vector(self, i: int) -> memoryview:
+        return self._vec[i * self.dim:(i + 1) * self.dim]
+
+    @timed("pack.vectors_for")
+    def vectors_for(self, ids: Sequence[str], model: str) -> Dict[str, memoryview]:
+        out: Dict[str, memoryview] = {}
+        if model != self.model or not self.dim:
+            return out
+        step = 4 * self.dim
+        for aid in ids:
+            i = self._find(aid)
+            if i is not None and self._has_vec[i]:
+                out[aid] = self._mat[i * step:(i + 1) * step]
+        return out
+
+    def vector_count(self, model: str, namespace: Optional[str] = None, limit: Optional[int] = None) -> int:
+        if model != self.model or not self.dim or not self._ns_ok(namespace):
+            return 0
+        if self._n_vec is None:
+            self._n_vec = sum(self._has_vec)
+        return self._n_vec if limit is None else min(self._n_vec, int(limit))
+
+    @timed("pack.vector_topk")
+    def vector_topk(self, query: Dict[int, float], k: int, *, model: str, filters: Optional[AtomFilter] = None,
+                    namespace: Optional[str] = None) -> List[Tuple[str, float]]:
+        if not query or k <= 0 or model != self.model or not self.dim or not self._ns_ok(namespace):
+            return []
+        if max(query) >= self.dim:
+            return []
+        # ties broken by atom_id like SynapticIndex.vector_topk's (score, atom_id) tuples
+        id_rank, has_vec = self._id_rank, self._has_vec
+        scores = dot_sparse_packed(query, self._mat, self.dim)
+        if scores is None:
+            scores = [dot_sparse_dense(query, self._vector(i)) if has_vec[i] else 0.0 for i in range(self.n)]
+        top = heapq.nlargest(k, ((scores[i], id_rank[i], i)
+                                 for i in range(self.n) if has_vec[i] and self._matches(i, filters)))
+        count("pack.vector_topk.scanned", self.n)
+        return [(self._id(i), float(s)) for s, _, i in top if s > 0.0]
+
+    @timed("pack.neighbors")
+    def neighbors(self, atom_id: str, kind: str, k: int, filters: Optional[AtomFilter] = None) -> List[Dict[str, Any]]:
+        i = self._find(atom_id)
+        if i is None or kind not in EDGE_KINDS:
+            return []
+        s = self._sec
+        off, dst, w, n = s[f"{kind}_off"], s[f"{kind}_dst"], s[f"{kind}_w"], s[f"{kind}_n"]
+        filtered = filters is not None and not filters.is_empty()
+        js: List[int] = []
+        for j in range(off[i], off[i + 1]):
+            if len(js) >= k:
+                break
+            if not filtered or (dst[j] < self.n and self._matches(dst[j], filters)):
+                js.append(j)
+        rows = [{"src": atom_id, "dst": self._id(dst[j]), "kind": kind, "weight": w[j], "n": n[j]} for j in js]
+        count("pack.neighbors.rows", len(rows))
+        return rows
+
+    def clusters_of(self, atom_ids: Sequence[str]) -> Dict[str, str]:
+        out: Dict[str, str] = {}
+        for aid in atom_ids:
+            i = self._find(aid)
+            if i is not None and self._cluster_of[i] >= 0:
+                out[aid] = self._id(self._cluster_of[i])
+        return out
+
+class PackedStore:
+    """The read-only slice of SynapticStore that retrieval needs, served from a pack."""
+
+    def __init__(self, path: Path, cfg: SynapticConfig):
+        self.idx = SynapticPack(path)
+        # no second connection to overlap FTS with: run the hybrid stages in sequence
+        self.cfg = replace(cfg, hybrid_parallel=False)
+        self.namespace = self.idx.namespace
+        self.embedder = get_embedder(cfg)
+
+    def iter_atoms_indexed(self, filters: Optional[AtomFilter] = None, limit: Optional[int] = None,
+                           columns: Optional[Sequence[str]] = None) -> Iterable[Dict[str, Any]]:
+        yield from self.idx.iter_atoms(filters=filters, limit=limit, columns=columns)
+
+    def close(self):
+        self.idx.close()
+
+class PackedRetriever(Retriever):
+    """Retriever over a pack file: same l1_search / l2_expand / propose_meta results as over the
+    store the pack was written from (for the same embedder), without opening SQLite."""
+
+    def __init__(self, path: Path, cfg: SynapticConfig):
+        store = PackedStore(path, cfg)
+        super().__init__(store, store.cfg)
+
+    def close(self):
+        self.store.close()
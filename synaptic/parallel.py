@@ -0,0 +1,78 @@
+from __future__ import annotations
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+import os, sqlite3
+
+from .index import select_list
+
+# Parallel maintenance: the atoms of a namespace are split into rowid ranges; each range is read and
+# computed on (decay factors, prune priorities, signatures, ...) by a worker process with its own
+# read-only connection, and only compact results travel back. The calling process stays the single
+# writer and applies each range's results in one transaction as it arrives.
+#
+# Compute functions take (rows, params) and must be module-level so they can be pickled.
+
+Range = Tuple[int, int]   # (lo, hi]: rowid > lo AND rowid <= hi
+Compute = Callable[[List[sqlite3.Row], Dict[str, Any]], Any]
+
+DEFAULT_CHUNK = 20_000    # atoms per range; several ranges per worker keeps the pool balanced
+
+def resolve_workers(workers: Optional[int]) -> int:
+    """None or 1: run in-process; 0 (or negative): one worker per CPU."""
+    if workers is None:
+        return 1
+    if workers <= 0:
+        return os.cpu_count() or 1
+    return int(workers)
+
+def rowid_ranges(idx, namespace: Optional[str], chunk: int = DEFAULT_CHUNK) -> List[Range]:
+    """Split the namespace's atoms into consecutive rowid ranges of about `chunk` atoms each."""
+    ns_sql, params = ("", ()) if namespace is None else (" WHERE namespace = ?", (namespace,))
+    rowids = [r[0] for r in idx.conn.execute(f"SELECT rowid FROM atoms{ns_sql} ORDER BY rowid", params)]
+    out: List[Range] = []
+    lo = 0
+    for i in range(chunk - 1, len(rowids), chunk):
+        out.append((lo, rowids[i]))
+        lo = rowids[i]
+    if rowids and lo < rowids[-1]:
+        out.append((lo, rowids[-1]))
+    return out
+
+def _range_sql(columns: Sequence[str], namespace: Optional[str]) -> str:
+    ns_sql = "" if namespace is None else " AND atoms.namespace = ?"
+    return f"SELECT {select_list(columns)} FROM atoms WHERE atoms.rowid > ? AND atoms.rowid <= ?{ns_sql} ORDER BY atoms.rowid"
+
+def _read_range(conn: sqlite3.Connection, columns: Sequence[str], namespace: Optional[str], rng: Range) -> List[sqlite3.Row]:
+    params: Tuple[Any, ...] = (rng[0], rng[1]) + (() if namespace is None else (namespace,))
+    return conn.execute(_range_sql(columns, namespace), params).fetchall()
+
+def _worker(compute: Compute, db_path: str, columns: Sequence[str], namespace: Optional[str],
+            rng: Range, params: Dict[str, Any]) -> Any:
+    # read the whole range, then release the connection before computing so the writer is never
+    # kept waiting on this process's shared lock
+    conn = sqlite3.connect(f"{Path(db_path).resolve().as_uri()}?mode=ro", uri=True, timeout=60.0)
+    conn.row_factory = sqlite3.Row
+    try:
+        rows = _read_range(conn, columns, namespace, rng)
+    finally:
+        conn.close()
+    return compute(rows, params)
+
+def map_ranges(idx, compute: Compute, *, columns: Sequence[str], namespace: Optional[str], ranges: List[Range],
+               params: Dict[str, Any], workers: int = 1) -> Iterator[Tuple[Range, Any]]:
+    """Yield (range, compute(rows of range, params)) for every range, in completion order.
+
+    With one worker, one range, or inside an open transaction (e.g. an enclosing `idx.batch()`, whose
+    writes other connections cannot see) everything runs in this process on `idx.conn`; otherwise
+    a process pool reads committed data.
+    """
+    if workers <= 1 or len(ranges) <= 1 or idx.conn.in_transaction:
+        for rng in ranges:
+            yield rng, compute(_read_range(idx.conn, columns, namespace, rng), params)
+        return
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+    with ProcessPoolExecutor(max_workers=min(workers, len(ranges))) as pool:
+        futs = {pool.submit(_worker, compute, str(idx.db_path), tuple(columns), namespace, rng, params): rng
+                for rng in ranges}
+        for fut in as_completed(futs):
+            yield futs[fut], fut.result()
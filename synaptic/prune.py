@@ -1,8 +1,9 @@
 from __future__ import annotations
 from dataclasses import dataclass
-from typing import Dict, List
+from typing import Dict, List, Optional, Tuple
 import math
 
+from .parallel import map_ranges, resolve_workers, rowid_ranges
 from .util import exp_decay_factor, now_iso
 
 @dataclass
@@ -14,50 +15,83 @@ class PruneReport:
     removed_ids: List[str]
 
 def estimate_atom_bytes(row: Dict) -> int:
+    if row.get("size_bytes") is not None:
+        # computed in SQL (includes bodies offloaded to blobs/)
+        return int(row["size_bytes"])
     s = (row.get("summary") or "") + (row.get("content") or "") + (row.get("tags") or "") + (row.get("entities") or "")
     return len(s.encode("utf-8"))
 
-def prune_to_budget(store, *, max_mb: float = 50.0, dry_run: bool = True) -> PruneReport:
-    rows = list(store.iter_atoms_indexed())
-    bytes_before = sum(estimate_atom_bytes(r) for r in rows)
-    budget = int(max_mb * 1024 * 1024)
+def _priority(r, ts: str, hl: float) -> float:
+    pinned = 1.0 if int(r["pinned"] or 0) else 0.0
+    w = float(r["w"] or 0.0)
+    uses = float(r["uses"] or 0.0)
 
-    if bytes_before <= budget:
-        return PruneReport(kept=len(rows), removed=0, bytes_before=bytes_before, bytes_after=bytes_before, removed_ids=[])
+    last_used = (r["last_used_ts"] or r["ts"] or "").strip()
+    f = exp_decay_factor(last_ts=last_used, now_ts=ts, half_life_days=hl)
+    w_eff = w * f
 
-    ts = now_iso()
-    hl = getattr(store.cfg, "decay_half_life_days", 30.0)
+    rec = 1.0 if (r["last_used_ts"] or "").strip() else 0.0
+    size_pen = int(r["size_bytes"]) / 10_000.0
+    return 10.0*pinned + 2.2*math.tanh(w_eff/2.0) + 0.9*math.tanh(uses/10.0) + 0.25*rec - 0.35*size_pen
+
+def _priority_rows(rows, p: Dict) -> List[Tuple[float, str, int, bool]]:
+    # (priority, atom_id, size_bytes, kept regardless: pinned or cluster) for one rowid range
+    return [(_priority(r, p["ts"], p["half_life_days"]), r["atom_id"], int(r["size_bytes"]),
+             bool(int(r["pinned"] or 0)) or r["type"] == "cluster")
+            for r in rows]
 
-    def priority(r: Dict) -> float:
-        pinned = 1.0 if int(r.get("pinned") or 0) else 0.0
-        w = float(r.get("w") or 0.0)
-        uses = float(r.get("uses") or 0.0)
+def prune_to_budget(store, *, max_mb: Optional[float] = None, dry_run: bool = True,
+                    workers: Optional[int] = None) -> PruneReport:
+    """Prune the store's namespace to `max_mb` (default: the namespace's configured budget).
 
-        last_used = (r.get("last_used_ts") or r.get("ts") or "").strip()
-        f = exp_decay_factor(last_ts=last_used, now_ts=ts, half_life_days=hl)
-        w_eff = w * f
+    Priorities are computed per rowid range (in `workers` processes when > 1, default
+    cfg.maintenance_workers); removals are deleted in one transaction.
 
-        rec = 1.0 if (r.get("last_used_ts") or "").strip() else 0.0
-        size_pen = estimate_atom_bytes(r) / 10_000.0
-        return 10.0*pinned + 2.2*math.tanh(w_eff/2.0) + 0.9*math.tanh(uses/10.0) + 0.25*rec - 0.35*size_pen
+    Cluster atoms are never ranked out on their own (they are derived, and cost a summary line): one goes
+    only when the pruned members leave it below cfg.cluster_min_size, together with its membership rows.
+    """
+    if max_mb is None:
+        max_mb = store.cfg.budget_mb(store.namespace)
+    ts = now_iso()
+    hl = getattr(store.cfg, "decay_half_life_days", 30.0)
+    idx = store.idx
+    n_workers = resolve_workers(store.cfg.maintenance_workers if workers is None else workers)
+    scored: List[Tuple[float, str, int, bool]] = []
+    for _, part in map_ranges(idx, _priority_rows,
+                              columns=("atom_id", "ts", "type", "w", "uses", "last_used_ts", "pinned", "size_bytes"),
+                              namespace=store.namespace, ranges=rowid_ranges(idx, store.namespace),
+                              params={"ts": ts, "half_life_days": hl}, workers=n_workers):
+        scored.extend(part)
+    bytes_before = sum(b for _, _, b, _ in scored)
+    budget = int(max_mb * 1024 * 1024)
+
+    if bytes_before <= budget:
+        return PruneReport(kept=len(scored), removed=0, bytes_before=bytes_before, bytes_after=bytes_before, removed_ids=[])
 
-    rows.sort(key=priority, reverse=True)
+    # highest priority first; ties by id so parallel and serial runs agree
+    scored.sort(key=lambda x: (-x[0], x[1]))
 
-    kept = []
+    kept = 0
     total = 0
-    for r in rows:
-        b = estimate_atom_bytes(r)
-        if total + b <= budget or int(r.get("pinned") or 0):
-            kept.append(r)
+    removed_ids: List[str] = []
+    for _, aid, b, keep in scored:
+        if total + b <= budget or keep:
+            kept += 1
             total += b
+        else:
+            removed_ids.append(aid)
 
-    kept_ids = {r["atom_id"] for r in kept}
-    removed = [r for r in rows if r["atom_id"] not in kept_ids]
-    removed_ids = [r["atom_id"] for r in removed]
-    bytes_after = sum(estimate_atom_bytes(r) for r in kept)
+    removed = set(removed_ids)
+    size_of = {aid: b for _, aid, b, _ in scored}
+    for cid, members in idx.cluster_members([aid for _, aid, _, keep in scored if keep and aid not in removed]).items():
+        if sum(1 for m in members if m not in removed) < store.cfg.cluster_min_size:
+            removed_ids.append(cid)
+            kept -= 1
+            total -= size_of.get(cid, 0)
 
     if not dry_run:
-        for aid in removed_ids:
-            store.delete_atom(aid)
+        with idx.batch():
+            for aid in removed_ids:
+                store.delete_atom(aid)
 
-    return PruneReport(kept=len(kept), removed=len(removed), bytes_before=bytes_before, bytes_after=bytes_after, removed_ids=removed_ids)
+    return PruneReport(kept=kept, removed=len(removed_ids), bytes_before=bytes_before, bytes_after=total, removed_ids=removed_ids)
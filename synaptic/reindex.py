@@ -0,0 +1,67 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+import time
+
+from .blobs import BlobStore
+from .embeddings import get_embedder
+from .parallel import map_ranges, resolve_workers, rowid_ranges
+from .simhash import from_sql_int, simhash64
+from .util import sha256_text
+
+@dataclass
+class ReindexReport:
+    atoms: int
+    hashes_changed: int
+    simhash_changed: int
+    vectors: int             # vectors rewritten (inline embedders only; model-backed ones: `syn embed`)
+    fts_bodies: int = 0      # offloaded bodies re-indexed for full-text search
+    seconds: float = 0.0
+
+def _signature_rows(rows, p: Dict[str, Any]) -> List[Tuple[str, str, str, int, bool, bool, Optional[bytes], Optional[str]]]:
+    # (atom_id, namespace, hash, simhash, hash changed, simhash changed, vector, offloaded body) for one rowid range
+    cfg = p["cfg"]
+    blobs = BlobStore(Path(cfg.home) / "blobs", compress=cfg.blob_compress)
+    emb = get_embedder(cfg)
+    bodies = [(blobs.get(r["blob_ref"]) or "") if r["blob_ref"] else (r["content"] or "") for r in rows]
+    texts = [(r["summary"] or "") + "\n" + body for r, body in zip(rows, bodies)]
+    vecs = [v.tobytes() for v in emb.embed_many(texts)] if emb.inline else [None] * len(rows)
+    out = []
+    for r, text, vec, body in zip(rows, texts, vecs, bodies):
+        h = sha256_text(text)
+        sig = simhash64(text)
+        out.append((r["atom_id"], r["namespace"], h, sig, h != (r["hash"] or ""),
+                    sig != from_sql_int(r["simhash"] or 0), vec, body if r["blob_ref"] else None))
+    return out
+
+def reindex_store(store, *, workers: Optional[int] = None) -> ReindexReport:
+    """Recompute every derived per-atom value of the namespace from its full text: content hash,
+    SimHash + LSH bands, the FTS text of offloaded bodies and (for inline embedders) the stored vector.
+
+    For upgrades of the hashing/signature code or a new SYNAPTIC_EMBED_DIM. Texts are read and hashed
+    per rowid range in `workers` processes (default cfg.maintenance_workers); this process writes each
+    range in one transaction.
+    """
+    t0 = time.perf_counter()
+    idx = store.idx
+    model = store.embedder.version
+    rep = ReindexReport(atoms=0, hashes_changed=0, simhash_changed=0, vectors=0)
+    n_workers = resolve_workers(store.cfg.maintenance_workers if workers is None else workers)
+    for _, part in map_ranges(idx, _signature_rows,
+                              columns=("atom_id", "namespace", "summary", "content", "blob_ref", "hash", "simhash"),
+                              namespace=store.namespace, ranges=rowid_ranges(idx, store.namespace),
+                              params={"cfg": store.cfg}, workers=n_workers):
+        with idx.batch():
+            idx.set_signatures((h, sig, aid) for aid, _, h, sig, _, _, _, _ in part)
+            idx.set_fts_bodies((x[0], x[7]) for x in part if x[7] is not None)
+            for aid, ns, _, _, _, _, vec, _ in part:
+                if vec is not None:
+                    idx.upsert_vector(aid, ns, model, vec)
+        rep.atoms += len(part)
+        rep.hashes_changed += sum(1 for x in part if x[4])
+        rep.simhash_changed += sum(1 for x in part if x[5])
+        rep.vectors += sum(1 for x in part if x[6] is not None)
+        rep.fts_bodies += sum(1 for x in part if x[7] is not None)
+    rep.seconds = round(time.perf_counter() - t0, 3)
+    return rep
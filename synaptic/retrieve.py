@@ -1,58 +1,220 @@
 from __future__ import annotations
 from dataclasses import dataclass
-from typing import Any, Dict, List
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 import math
 
+from .brief import format_atom_line, format_l2_line, format_meta_line
+from .cluster import substitute_clusters
 from .config import SynapticConfig
-from .embeddings import HasherEmbedder, cosine_sparse
-from .models import Retrieved, L2Suggestion, MetaCandidate
+from .embeddings import dot_sparse_dense, query_vector
+from .instrument import count, span, timed
+from .models import AtomFilter, Retrieved, L2Suggestion, MetaCandidate
+from .simhash import from_sql_int, hamming
 from .util import tokenize, exp_decay_factor, now_iso
 
+RETRIEVAL_MODES = ("classic", "hybrid")
+
+_fts_pool = None
+
+def _fts_executor():
+    # one long-lived worker; only ever runs FTS queries on the index's reader connection
+    global _fts_pool
+    if _fts_pool is None:
+        from concurrent.futures import ThreadPoolExecutor
+        _fts_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="synaptic-fts")
+    return _fts_pool
+
 class Retriever:
+    """L1/L2 retrieval over one namespace (the store's)."""
+
     def __init__(self, store, cfg: SynapticConfig):
         self.store = store
         self.cfg = cfg
-        self.embedder = HasherEmbedder(dim=cfg.embed_dim)
+        self.embedder = store.embedder
 
-    def l1_search(self, query: str, k: int = 12) -> List[Retrieved]:
+    @timed("l1_search")
+    def l1_search(self, query: str, k: int = 12, filters: Optional[AtomFilter] = None,
+                  diverse: bool = False, mode: Optional[str] = None) -> List[Retrieved]:
+        """Top-k atoms for `query`. With `diverse`, near-duplicates (SimHash within
+        cfg.near_dup_max_distance) collapse into their best-scoring member so k results cover k ideas.
+
+        `mode` (default cfg.retrieval_mode): "classic" rescores FTS/LIKE candidates by embedding cosine;
+        "hybrid" fuses the FTS ranking with a vector top-k ranking (RRF), so atoms sharing no exact
+        token with the query can still surface."""
         k = max(1, min(k, self.cfg.max_result_atoms))
+        mode = mode or self.cfg.retrieval_mode
+        if mode not in RETRIEVAL_MODES:
+            raise ValueError(f"unknown retrieval mode {mode!r} (expected one of {', '.join(RETRIEVAL_MODES)})")
 
         fts_query = " ".join(tokenize(query)[:10]) or query
-        rows = self.store.idx.search_fts(fts_query, k=max(k*4, 20))
-        if not rows:
-            rows = self.store.idx.search_fallback(query, k=max(k*4, 20))
+        if mode == "hybrid" and self._over_vector_cap():
+            count("l1.hybrid_capped")
+            mode = "classic"
+        if mode == "hybrid":
+            scored = self._hybrid(query, fts_query, max(k*4, 20), filters)
+        else:
+            ns = self.store.namespace
+            with span("l1.fts"):
+                rows = self.store.idx.search_fts(fts_query, k=max(k*4, 20), filters=filters, namespace=ns)
+            if not rows:
+                with span("l1.fallback"):
+                    rows = self.store.idx.search_fallback(query, k=max(k*4, 20), filters=filters, namespace=ns)
+            count("l1.candidates", len(rows))
+            scored = self._score_rows(query, rows)
+        scored.sort(key=lambda x: x.score, reverse=True)
+        if diverse:
+            scored = self._collapse_near_duplicates(scored, k)
+        return scored[:k]
 
-        qv = self.embedder.embed(query)
-        ts = now_iso()
-        hl = self.cfg.decay_half_life_days
+    def _over_vector_cap(self) -> bool:
+        # the vector top-k is an exact scan: past cfg.hybrid_max_vectors it costs more than a query should
+        cap = self.cfg.hybrid_max_vectors
+        if cap <= 0:
+            return False
+        n = self.store.idx.vector_count(self.embedder.version, self.store.namespace, limit=cap + 1)
+        return n > cap
 
+    @timed("l1.score")
+    def _score_rows(self, query: str, rows) -> List[Retrieved]:
+        # embedding similarity + decayed strength + usage + pin, per candidate row
+        ts = now_iso()
+        rds = [dict(r) for r in rows]
         scored: List[Retrieved] = []
-        for r in rows:
-            rd = dict(r)
-            text = (rd.get("summary") or "") + "\n" + (rd.get("content") or "")
-            sim = cosine_sparse(qv, self.embedder.embed(text))
-
-            w = float(rd.get("w") or 0.0)
-            uses = float(rd.get("uses") or 0.0)
-            pinned = 1.0 if int(rd.get("pinned") or 0) else 0.0
-
-            w_eff = w
-            if self.cfg.decay_apply_on_retrieval and not pinned:
-                last_used = (rd.get("last_used_ts") or rd.get("ts") or "").strip()
-                f = exp_decay_factor(last_ts=last_used, now_ts=ts, half_life_days=hl)
-                w_eff = w * f
-
-            score = 0.70*sim + 0.20*math.tanh(w_eff/2.0) + 0.08*math.tanh(uses/10.0) + 0.02*pinned
-            reasons = []
-            if sim > 0: reasons.append(f"sim:{sim:.2f}")
-            if pinned: reasons.append("pinned")
-            if w_eff: reasons.append(f"w_eff:{w_eff:.2f}")
-            scored.append(Retrieved(atom_id=rd["atom_id"], score=float(score), reasons=reasons, row=rd))
+        for rd, sim in zip(rds, self._similarities(query_vector(self.embedder, query), rds)):
+            reasons = [f"sim:{sim:.2f}"] if sim > 0 else []
+            scored.append(self._finish_score(rd, sim, reasons, ts))
+        return scored
 
-        scored.sort(key=lambda x: x.score, reverse=True)
-        return scored[:k]
+    def _similarities(self, qv: Dict[int, float], rows: List[Dict[str, Any]]) -> List[float]:
+        """Cosine of the query with each row's stored vector. Rows without one (not yet embedded) are
+        embedded now from their summary + inline content when the embedder is cheap, else score 0."""
+        emb = self.embedder
+        stored = self.store.idx.vectors_for([r["atom_id"] for r in rows], emb.version) if rows and qv else {}
+        missing = [i for i, r in enumerate(rows) if r["atom_id"] not in stored]
+        computed: Dict[int, Any] = {}
+        if qv and missing and emb.inline:
+            texts = [(rows[i].get("summary") or "") + "\n" + (rows[i].get("content") or "") for i in missing]
+            computed = dict(zip(missing, emb.embed_many(texts)))
+        count("l1.vectors_computed", len(computed))
+        out: List[float] = []
+        for i, r in enumerate(rows):
+            blob = stored.get(r["atom_id"])
+            if blob is not None:
+                out.append(dot_sparse_dense(qv, memoryview(blob).cast("f")))
+            elif i in computed:
+                out.append(dot_sparse_dense(qv, computed[i]))
+            else:
+                out.append(0.0)
+        return out
+
+    def _finish_score(self, rd: Dict[str, Any], rel: float, reasons: List[str], ts: str) -> Retrieved:
+        # relevance (0..1) + decayed strength + usage + pin, weighted by cfg.score_w_*
+        cfg = self.cfg
+        w = float(rd.get("w") or 0.0)
+        uses = float(rd.get("uses") or 0.0)
+        pinned = 1.0 if int(rd.get("pinned") or 0) else 0.0
+
+        w_eff = w
+        if cfg.decay_apply_on_retrieval and not pinned:
+            last_used = (rd.get("last_used_ts") or rd.get("ts") or "").strip()
+            f = exp_decay_factor(last_ts=last_used, now_ts=ts, half_life_days=cfg.decay_half_life_days)
+            w_eff = w * f
 
-    def l2_expand(self, seeds: List[Retrieved], neighbor_k: int = 30, take: int = 8) -> List[L2Suggestion]:
+        score = (cfg.score_w_rel*rel + cfg.score_w_strength*math.tanh(w_eff/2.0)
+                 + cfg.score_w_uses*math.tanh(uses/10.0) + cfg.score_w_pinned*pinned)
+        if pinned: reasons.append("pinned")
+        if w_eff: reasons.append(f"w_eff:{w_eff:.2f}")
+        return Retrieved(atom_id=rd["atom_id"], score=float(score), reasons=reasons, row=rd)
+
+    def _hybrid_candidates(self, query_vec: Dict[int, float], fts_query: str, n: int,
+                           filters: Optional[AtomFilter]) -> Tuple[list, List[Tuple[str, float]]]:
+        idx, ns = self.store.idx, self.store.namespace
+        model = self.embedder.version
+        # FTS runs inside SQLite with the GIL released, so on a second connection it overlaps the
+        # Python-bound vector scan. Not inside an open write transaction: the reader would not see it.
+        if self.cfg.hybrid_parallel and not idx.conn.in_transaction:
+            fut = _fts_executor().submit(idx.reader().search_fts, fts_query, n, filters, ns)
+            with span("l1.vector"):
+                hits = idx.vector_topk(query_vec, n, model=model, filters=filters, namespace=ns)
+            with span("l1.fts_wait"):
+                rows = fut.result()
+        else:
+            with span("l1.fts"):
+                rows = idx.search_fts(fts_query, k=n, filters=filters, namespace=ns)
+            with span("l1.vector"):
+                hits = idx.vector_topk(query_vec, n, model=model, filters=filters, namespace=ns)
+        return rows, hits
+
+    @timed("l1.fuse")
+    def _hybrid(self, query: str, fts_query: str, n: int, filters: Optional[AtomFilter]) -> List[Retrieved]:
+        """Reciprocal-rank fusion of the FTS (bm25) and vector rankings:
+        rrf(d) = w_fts/(rrf_k + rank_fts(d)) + w_vec/(rrf_k + rank_vec(d)), scaled to 0..1 by the
+        best possible value (rank 1 in both lists) and used as the relevance term of the final score."""
+        cfg = self.cfg
+        qv = query_vector(self.embedder, query)
+        rows, hits = self._hybrid_candidates(qv, fts_query, n, filters)
+        if not rows and not hits:
+            # no FTS match and no stored vectors (e.g. not yet backfilled): behave like classic
+            with span("l1.fallback"):
+                rows = self.store.idx.search_fallback(query, k=n, filters=filters, namespace=self.store.namespace)
+            return self._score_rows(query, rows)
+
+        fts_rank = {r["atom_id"]: i + 1 for i, r in enumerate(rows)}
+        vec_rank = {aid: i + 1 for i, (aid, _) in enumerate(hits)}
+        vec_sim = dict(hits)
+        cand: Dict[str, Dict[str, Any]] = {r["atom_id"]: dict(r) for r in rows}
+        missing = [aid for aid in vec_rank if aid not in cand]
+        if missing:
+            cand.update((aid, dict(r)) for aid, r in self.store.idx.atoms_by_ids(missing).items())
+        count("l1.candidates", len(cand))
+        count("l1.vector_only", len(missing))
+
+        kk = float(cfg.rrf_k)
+        fused: Dict[str, Tuple[float, List[str]]] = {}
+        for aid in cand:
+            rrf, reasons = 0.0, []
+            if aid in fts_rank:
+                rrf += cfg.fusion_w_fts / (kk + fts_rank[aid])
+                reasons.append(f"fts:#{fts_rank[aid]}")
+            if aid in vec_rank:
+                rrf += cfg.fusion_w_vec / (kk + vec_rank[aid])
+                reasons.append(f"vec:#{vec_rank[aid]}:{vec_sim[aid]:.2f}")
+            fused[aid] = (rrf, reasons)
+        # RRF values sit in a narrow band; stretch them over 0..1 (like cosine in classic mode) so the fused
+        # ranking is not drowned out by the strength/usage terms: the best candidate maps to 1, the weakest
+        # possible one (last place in a single list) to 0
+        hi = max(v for v, _ in fused.values())
+        floor = min(cfg.fusion_w_fts, cfg.fusion_w_vec) / (kk + n)
+        span_ = hi - floor
+        ts = now_iso()
+        return [self._finish_score(cand[aid], max(0.0, rrf - floor) / span_ if span_ > 0 else 1.0, reasons, ts)
+                for aid, (rrf, reasons) in fused.items()]
+
+    @timed("l1.collapse")
+    def _collapse_near_duplicates(self, scored: List[Retrieved], k: int) -> List[Retrieved]:
+        max_d = self.cfg.near_dup_max_distance
+        kept: List[Retrieved] = []
+        sigs: List[int] = []
+        collapsed: List[int] = []
+        for r in scored:
+            sig = from_sql_int(r.row.get("simhash") or 0)
+            j = next((i for i, s in enumerate(sigs) if sig and s and hamming(sig, s) <= max_d), None)
+            if j is not None:
+                collapsed[j] += 1
+                continue
+            if len(kept) >= k:
+                continue
+            kept.append(r)
+            sigs.append(sig)
+            collapsed.append(0)
+        for r, n in zip(kept, collapsed):
+            if n:
+                r.reasons.append(f"near_dups:{n}")
+        return kept
+
+    @timed("l2_expand")
+    def l2_expand(self, seeds: List[Retrieved], neighbor_k: int = 30, take: int = 8,
+                  filters: Optional[AtomFilter] = None) -> List[L2Suggestion]:
         take = max(0, min(take, 50))
         neighbor_k = max(5, min(neighbor_k, 200))
         seed_ids = [s.atom_id for s in seeds]
@@ -60,9 +222,11 @@ class Retriever:
 
         candidates: Dict[str, Dict[str, Any]] = {}
 
+        graph = span("l2.edges")
         for sid in seed_ids:
             for kind in ("neighbor", "coact"):
-                edges = self.store.idx.neighbors(sid, kind=kind, k=neighbor_k)
+                with graph:
+                    edges = self.store.idx.neighbors(sid, kind=kind, k=neighbor_k, filters=filters)
                 for e in edges:
                     dst = e["dst"]
                     if dst in seed_set:
@@ -77,18 +241,18 @@ class Retriever:
                         slot["score"] += 0.3*w + 0.1*math.tanh(n/10.0)
                         slot["reasons"].add("coact")
 
-        qv = self.embedder.embed(" ".join([s.row.get("summary","") for s in seeds]) or "")
+        qv = query_vector(self.embedder, " ".join([s.row.get("summary","") for s in seeds]) or "")
         pool = []
-        for i, row in enumerate(self.store.iter_atoms_indexed()):
-            if i >= 400:
-                break
-            aid = row["atom_id"]
-            if aid in seed_set:
-                continue
-            text = (row.get("summary") or "") + "\n" + (row.get("content") or "")
-            sim = cosine_sparse(qv, self.embedder.embed(text))
-            if sim >= self.cfg.l2_sim_threshold:
-                pool.append((aid, sim))
+        with span("l2.scan"):
+            # cluster atoms restate their members (already reachable as L1/L2 lines): not suggested unless asked for
+            skip_clusters = not (filters is not None and "cluster" in filters.type)
+            rows = [r for r in self.store.iter_atoms_indexed(filters=filters, limit=400)
+                    if r["atom_id"] not in seed_set and not (skip_clusters and r["type"] == "cluster")]
+            for row, sim in zip(rows, self._similarities(qv, rows)):
+                if sim >= self.cfg.l2_sim_threshold:
+                    pool.append((row["atom_id"], sim))
+        count("l2.scanned", len(rows))
+        count("l2.candidates", len(candidates) + len(pool))
         pool.sort(key=lambda x: x[1], reverse=True)
         for aid, sim in pool[:neighbor_k]:
             slot = candidates.setdefault(aid, {"score": 0.0, "reasons": set()})
@@ -99,6 +263,7 @@ class Retriever:
         sugg.sort(key=lambda x: x.score, reverse=True)
         return sugg[:take]
 
+    @timed("propose_meta")
     def propose_meta(self, seeds: List[Retrieved], l2: List[L2Suggestion], take: int = 3) -> List[MetaCandidate]:
         take = max(0, min(take, 10))
         top_ids = [s.atom_id for s in seeds] + [x.atom_id for x in l2[:12]]
@@ -144,3 +309,36 @@ class Retriever:
             if len(out) >= take:
                 break
         return out
+
+    def stream_brief(self, query: str, *, k: int = 12, l2: int = 8, meta: int = 3,
+                     filters: Optional[AtomFilter] = None, diverse: bool = False,
+                     mode: Optional[str] = None, clusters: bool = False) -> Iterator[Dict[str, Any]]:
+        """Yield brief events as each stage finishes: one `l1` per ranked atom, then `l2`
+        suggestions, then `meta` candidates, then `done`.
+
+        With `clusters`, L1 members of a persisted cluster are folded into one line for the cluster
+        atom like in a non-streamed brief (that `l1` event lists the `members` it replaces); L2 and
+        meta are still expanded from the members.
+
+        Read-only: callers record use (strengthening, co-activation) after consuming the
+        stream, e.g. `store.record_use(query, l1_ids, kind="brief", delta_w=0.02, coact=True)`.
+        """
+        seeds = self.l1_search(query, k=k, filters=filters, diverse=diverse, mode=mode)
+        lines, used = substitute_clusters(self.store, seeds) if clusters else (seeds, {})
+        for i, r in enumerate(lines):
+            ev = {"event": "l1", "rank": i, "atom_id": r.atom_id, "score": r.score, "reasons": r.reasons,
+                  "summary": r.row.get("summary", ""), "line": format_atom_line(r)}
+            if r.atom_id in used:
+                ev["members"] = used[r.atom_id]
+            yield ev
+        sugg = self.l2_expand(seeds, neighbor_k=self.cfg.l2_neighbor_k, take=l2, filters=filters)
+        for s in sugg:
+            d = {"atom_id": s.atom_id, "score": s.score, "reasons": s.reasons}
+            yield {"event": "l2", **d, "line": format_l2_line(d)}
+        for m in self.propose_meta(seeds, sugg, take=meta):
+            d = {"title": m.title, "summary": m.summary, "members": m.members, "score": m.score, "reasons": m.reasons}
+            yield {"event": "meta", **d, "line": format_meta_line(d)}
+        done = {"event": "done", "query": query, "atom_ids": [r.atom_id for r in lines]}
+        if used:
+            done["clusters"] = used
+        yield done
@@ -0,0 +1,57 @@
+from __future__ import annotations
+from typing import Dict, List
+import hashlib
+
+from .util import tokenize
+
+SIMHASH_BITS = 64
+# LSH: the signature is cut into LSH_BANDS bands of 16 bits. Two signatures within
+# 2*LSH_BANDS - 1 bits of each other differ in at most one bit on some band (pigeonhole), so
+# probing each band's bucket plus its 1-bit neighbours finds every near duplicate up to that distance.
+LSH_BANDS = 4
+LSH_MAX_EXACT_DISTANCE = 2 * LSH_BANDS - 1
+_BAND_BITS = SIMHASH_BITS // LSH_BANDS
+_MASK64 = (1 << 64) - 1
+
+def _token_hash64(token: str) -> int:
+    # stable across runs (Python's hash() is salted)
+    return int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "big")
+
+def simhash64(text: str) -> int:
+    """64-bit SimHash over the repo tokenizer's tokens, weighted by term frequency.
+
+    Returns an unsigned int; 0 for text without tokens.
+    """
+    counts: Dict[str, int] = {}
+    for t in tokenize(text):
+        counts[t] = counts.get(t, 0) + 1
+    if not counts:
+        return 0
+    acc = [0] * SIMHASH_BITS
+    for t, n in counts.items():
+        h = _token_hash64(t)
+        for i in range(SIMHASH_BITS):
+            acc[i] += n if (h >> i) & 1 else -n
+    sig = 0
+    for i, v in enumerate(acc):
+        if v > 0:
+            sig |= 1 << i
+    return sig
+
+def hamming(a: int, b: int) -> int:
+    return bin((a ^ b) & _MASK64).count("1")
+
+def lsh_bands(sig: int) -> List[int]:
+    mask = (1 << _BAND_BITS) - 1
+    return [(sig >> (i * _BAND_BITS)) & mask for i in range(LSH_BANDS)]
+
+def lsh_probes(sig: int) -> List[List[int]]:
+    """Per band: the signature's bucket followed by every bucket one bit away."""
+    return [[b] + [b ^ (1 << j) for j in range(_BAND_BITS)] for b in lsh_bands(sig)]
+
+def to_sql_int(sig: int) -> int:
+    """SQLite INTEGER is signed 64-bit; store the unsigned signature as its two's complement."""
+    return sig - (1 << 64) if sig >= (1 << 63) else sig
+
+def from_sql_int(v: int) -> int:
+    return v & _MASK64
@@ -1,12 +1,16 @@
 from __future__ import annotations
 from pathlib import Path
-from typing import Any, Dict, Iterable, List, Optional, Tuple
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
 import json
 
 from .config import SynapticConfig
-from .models import Atom, ActivationEvent
+from .models import Atom, ActivationEvent, AtomFilter
 from .util import now_iso, sha256_text, stable_id, safe_truncate, to_jsonable
-from .index import SynapticIndex, AtomRow
+from .blobs import BlobStore
+from .embeddings import get_embedder
+from .index import HOT_COLUMNS, SynapticIndex, AtomRow, coact_weight
+from .instrument import timed
+from .simhash import simhash64
 
 class SynapticStore:
     """Owns the append-only ledgers + SQLite index.
@@ -15,19 +19,37 @@ class SynapticStore:
     - atoms.jsonl: authoritative history of atoms (append-only; last write wins for latest state)
     - activations.jsonl: usage events (append-only)
     - synaptic.sqlite: query index and edges
+    - blobs/: content-addressed bodies above cfg.blob_threshold_bytes (loaded lazily via `load_content`)
+
+    A store is bound to one namespace (default: cfg.namespace). Use `scoped()` to get views
+    for other namespaces that share the same ledgers and SQLite connection.
     """
 
-    def __init__(self, cfg: SynapticConfig):
+    def __init__(self, cfg: SynapticConfig, namespace: Optional[str] = None, *, read_only: bool = False,
+                 _idx: Optional[SynapticIndex] = None):
         self.cfg = cfg
+        self.namespace = namespace or cfg.namespace
         self.home = cfg.home
         self.home.mkdir(parents=True, exist_ok=True)
         self.atoms_path = self.home / "atoms.jsonl"
         self.acts_path = self.home / "activations.jsonl"
         self.db_path = self.home / "synaptic.sqlite"
-        self.idx = SynapticIndex(self.db_path)
+        self.blobs = BlobStore(self.home / "blobs", compress=cfg.blob_compress)
+        self.embedder = get_embedder(cfg)
+        self._owns_idx = _idx is None
+        # read_only: the index is opened with mode=ro (queries only; writes raise sqlite3.OperationalError)
+        self.idx = _idx if _idx is not None else SynapticIndex(self.db_path, read_only=read_only, cfg=cfg)
+
+    def scoped(self, namespace: str) -> "SynapticStore":
+        """Return a view of this store bound to `namespace` (shares the open index; closing it is a no-op)."""
+        return SynapticStore(self.cfg, namespace, _idx=self.idx)
+
+    def namespaces(self) -> List[Dict[str, Any]]:
+        return [dict(r) for r in self.idx.namespaces()]
 
     def close(self):
-        self.idx.close()
+        if self._owns_idx:
+            self.idx.close()
 
     def init(self):
         # touch files so tooling sees them
@@ -36,88 +58,318 @@ class SynapticStore:
         if not self.acts_path.exists():
             self.acts_path.write_text("", encoding="utf-8")
 
+    def _normalize(self, content: str, summary: str) -> Tuple[str, str]:
+        content = safe_truncate(content.strip(), self.cfg.max_atom_bytes)
+        summary = safe_truncate(summary.strip() if summary else content, self.cfg.max_atom_bytes)
+        if len(content.encode("utf-8")) > self.cfg.blob_threshold_bytes:
+            # the body goes to blobs/: only a bounded summary stays in the ledger and the hot tables
+            summary = safe_truncate(summary, self.cfg.blob_summary_chars)
+        return content, summary
+
+    def find_duplicate(self, *, content: str, summary: str = "", type: Optional[str] = None,
+                       scope: Optional[List[str]] = None) -> Optional[Dict[str, Any]]:
+        """Return the existing atom in this namespace with the same content hash (and, when given, the same
+        type and set of scopes: the key add_atom dedupes on), if any."""
+        content, summary = self._normalize(content, summary)
+        row = self.idx.find_by_hash(self.namespace, sha256_text(summary + "\n" + content), type=type, scope=scope)
+        return dict(row) if row is not None else None
+
+    def find_near_duplicates(self, *, content: str, summary: str = "", max_distance: int | None = None,
+                             limit: int = 10) -> List[Tuple[str, int]]:
+        """(atom_id, SimHash distance) of atoms in this namespace that paraphrase the given text."""
+        content, summary = self._normalize(content, summary)
+        d = self.cfg.near_dup_max_distance if max_distance is None else max_distance
+        return self.idx.near_duplicates(self.namespace, simhash64(summary + "\n" + content), d, limit=limit)
+
     def add_atom(self, *, type: str, scope: List[str], tags: List[str], entities: List[str],
-                 content: str, summary: str, source: Dict[str, Any] | None = None, pinned: bool = False) -> Atom:
+                 content: str, summary: str, source: Dict[str, Any] | None = None, pinned: bool = False,
+                 dedupe: bool | None = None) -> Atom:
+        """Add an atom. With dedupe (default: cfg.dedupe_on_add), re-adding the same summary+content with
+        the same type and scopes merges into and strengthens the existing atom instead of inserting a copy."""
+        return self.add_or_merge(type=type, scope=scope, tags=tags, entities=entities, content=content,
+                                 summary=summary, source=source, pinned=pinned, dedupe=dedupe)[0]
+
+    @timed("store.add_atom")
+    def add_or_merge(self, *, type: str, scope: List[str], tags: List[str], entities: List[str],
+                     content: str, summary: str, source: Dict[str, Any] | None = None, pinned: bool = False,
+                     dedupe: bool | None = None) -> Tuple[Atom, bool]:
+        """add_atom, also telling whether the text was merged into an existing atom (True) or inserted."""
         ts = now_iso()
         source = source or {}
-        content = safe_truncate(content.strip(), self.cfg.max_atom_bytes)
-        summary = safe_truncate(summary.strip() if summary else content.strip(), self.cfg.max_atom_bytes)
+        content, summary = self._normalize(content, summary)
+        h = sha256_text(summary + "\n" + content)
+
+        if self.cfg.dedupe_on_add if dedupe is None else dedupe:
+            existing = self.idx.find_by_hash(self.namespace, h, type=type, scope=scope)
+            if existing is not None:
+                atom = self.merge_into(existing["atom_id"], ts=ts, scope=scope, tags=tags, entities=entities,
+                                       sources=[source] if source else [], pinned=pinned, delta_w=0.02)
+                return atom, True
 
         payload = {
             "ts": ts, "type": type, "scope": scope, "tags": tags, "entities": entities,
-            "content": content, "summary": summary, "source": source
+            "content": content, "summary": summary, "source": source, "namespace": self.namespace
         }
         atom_id = stable_id("atom", payload)
-        h = sha256_text(summary + "\n" + content)
 
         atom = Atom(
             atom_id=atom_id, ts=ts, type=type, scope=scope, tags=tags, entities=entities,
             content=content, summary=summary, source=source,
-            w=0.05, uses=0, last_used_ts="", pinned=bool(pinned), hash=h
+            w=0.05, uses=0, last_used_ts="", pinned=bool(pinned), hash=h, namespace=self.namespace
         )
-        self._append_jsonl(self.atoms_path, to_jsonable(atom))
-        self.idx.upsert_atom(AtomRow(
-            atom_id=atom.atom_id, ts=atom.ts, type=atom.type, scope=",".join(atom.scope),
-            tags=",".join(atom.tags), entities=",".join(atom.entities),
-            summary=atom.summary, content=atom.content, w=float(atom.w),
-            uses=int(atom.uses), last_used_ts=atom.last_used_ts, pinned=1 if atom.pinned else 0
-        ))
+        self._write_body(atom)
+        return atom, False
+
+    def update_atom_body(self, atom_id: str, *, summary: str, content: str, source: Dict[str, Any] | None = None,
+                         scope: List[str] | None = None, tags: List[str] | None = None,
+                         entities: List[str] | None = None) -> Optional[Atom]:
+        """Replace an atom's text (and optionally source/scope/tags/entities), keeping its id and strength."""
+        row = self.get_atom(atom_id)
+        if row is None:
+            return None
+        atom = self.row_to_atom(row)
+        old_blob = atom.blob
+        atom.content, atom.summary = self._normalize(content, summary)
+        atom.hash = sha256_text(atom.summary + "\n" + atom.content)
+        atom.blob = ""
+        if source is not None:
+            atom.source = source
+        if scope is not None:
+            atom.scope = scope
+        if tags is not None:
+            atom.tags = tags
+        if entities is not None:
+            atom.entities = entities
+        self._write_body(atom)
+        if old_blob and old_blob != atom.blob and not self.idx.blob_referenced(old_blob):
+            self.blobs.delete(old_blob)
         return atom
 
-    def update_atom_strength(self, atom_id: str, *, ts: str, delta_w: float = 0.0, uses_inc: int = 0, last_used_ts: str | None = None):
-        row = self.idx.get_atom(atom_id)
+    def _write_body(self, atom: Atom):
+        # signature and embedding over the full text, then offload large bodies before they reach the ledger/index
+        text = atom.summary + "\n" + atom.content
+        sig = simhash64(text)
+        emb = self.embedder
+        vec = emb.embed_many([text])[0].tobytes() if emb.inline else None
+        nbytes = len(atom.content.encode("utf-8"))
+        body = None
+        if nbytes > self.cfg.blob_threshold_bytes:
+            body = atom.content
+            atom.blob, atom.content = self.blobs.put(atom.content), ""
+        with self.idx.batch():
+            self._write_atom(atom, simhash=sig, content_bytes=nbytes, fts_body=body)
+            if vec is None:
+                # model-backed embedder: reuse a vector of identical text, else leave it to `syn embed`
+                vec = self.idx.cached_vectors([atom.hash], emb.version).get(atom.hash)
+            if vec is not None:
+                self.idx.upsert_vector(atom.atom_id, atom.namespace, emb.version, vec)
+            else:
+                self.idx.delete_vector(atom.atom_id)
+
+    @timed("store.load_content")
+    def load_content(self, row: Dict[str, Any] | Atom) -> str:
+        """Full body of an atom row/Atom, reading blobs/ only when the body was offloaded."""
+        if isinstance(row, Atom):
+            content, ref = row.content, row.blob
+        else:
+            if "content" not in row and "blob_ref" not in row:
+                # row selected without body columns: fetch them
+                full = self.idx.get_atom(row["atom_id"])
+                row = dict(full) if full is not None else {}
+            content, ref = row.get("content") or "", row.get("blob_ref") or ""
+        return (self.blobs.get(ref) or "") if ref else content
+
+    def get_atom(self, atom_id: str) -> Optional[Dict[str, Any]]:
+        """The atom's index row, if it belongs to this store's namespace (ids of other tenants are unknown here)."""
+        row = self.idx.get_atom(atom_id, namespace=self.namespace)
+        return dict(row) if row is not None else None
+
+    def get_content(self, atom_id: str) -> Optional[str]:
+        row = self.get_atom(atom_id)
+        return self.load_content(row) if row is not None else None
+
+    def offload_inline_content(self, *, dry_run: bool = True) -> List[str]:
+        """Move inline bodies above the blob threshold (e.g. from older stores) into blobs/."""
+        moved = []
+        c = self.idx.conn.cursor()
+        rows = c.execute("""SELECT atom_id FROM atoms WHERE namespace=? AND (blob_ref IS NULL OR blob_ref='')
+            AND length(CAST(content AS BLOB)) > ?""", (self.namespace, self.cfg.blob_threshold_bytes)).fetchall()
+        for r in rows:
+            moved.append(r["atom_id"])
+            if dry_run:
+                continue
+            atom = self.row_to_atom(self.idx.get_atom(r["atom_id"]))
+            nbytes = len(atom.content.encode("utf-8"))
+            atom.blob, atom.content = self.blobs.put(atom.content), ""
+            self._write_atom(atom, content_bytes=nbytes)
+        return moved
+
+    def merge_into(self, atom_id: str, *, ts: str, scope: Iterable[str] = (), tags: Iterable[str] = (),
+                   entities: Iterable[str] = (), sources: Iterable[Dict[str, Any]] = (), pinned: bool = False,
+                   delta_w: float = 0.0, uses_inc: int = 0, last_used_ts: str = "") -> Optional[Atom]:
+        """Fold duplicate state into an existing atom: union scope/tags/entities, append provenance,
+        OR pinned, and add strength/uses. Returns the updated atom (None if `atom_id` is unknown)."""
+        row = self.get_atom(atom_id)
         if row is None:
-            return
-        w = float(row["w"]) + float(delta_w)
-        uses = int(row["uses"]) + int(uses_inc)
-        last = last_used_ts if last_used_ts is not None else (row["last_used_ts"] or ts)
-        # clamp w to a reasonable range
-        w = max(-5.0, min(5.0, w))
-        # write an updated atom record (append-only; last wins)
-        atom = Atom(
+            return None
+        atom = self.row_to_atom(row)
+        atom.scope = list(dict.fromkeys([*atom.scope, *scope]))
+        atom.tags = list(dict.fromkeys([*atom.tags, *tags]))
+        atom.entities = list(dict.fromkeys([*atom.entities, *entities]))
+        prov = [dict(x, merged_ts=ts) for x in sources if x]
+        if prov:
+            atom.source = dict(atom.source, provenance=[*atom.source.get("provenance", []), *prov])
+        atom.pinned = atom.pinned or bool(pinned)
+        atom.w = max(-5.0, min(5.0, atom.w + float(delta_w)))
+        atom.uses += int(uses_inc)
+        atom.last_used_ts = max(atom.last_used_ts, last_used_ts)
+        self._write_atom(atom)
+        return atom
+
+    @staticmethod
+    def row_to_atom(row) -> Atom:
+        return Atom(
             atom_id=row["atom_id"], ts=row["ts"], type=row["type"],
             scope=(row["scope"].split(",") if row["scope"] else []),
             tags=(row["tags"].split(",") if row["tags"] else []),
             entities=(row["entities"].split(",") if row["entities"] else []),
             summary=row["summary"], content=row["content"],
-            source={},  # index doesn't store source; keep blank here
-            w=w, uses=uses, last_used_ts=last,
-            pinned=bool(row["pinned"]), hash=""
+            source=(json.loads(row["source"]) if row["source"] else {}),
+            w=float(row["w"]), uses=int(row["uses"]), last_used_ts=row["last_used_ts"] or "",
+            pinned=bool(row["pinned"]), hash=row["hash"] or "", namespace=row["namespace"],
+            blob=row["blob_ref"] or ""
         )
+
+    def _write_atom(self, atom: Atom, simhash: Optional[int] = None, content_bytes: Optional[int] = None,
+                    fts_body: Optional[str] = None):
+        # append-only ledger first (last wins), then the index; None keeps the stored simhash/content_bytes
+        # (and, for an offloaded body, the text already indexed for FTS)
         self._append_jsonl(self.atoms_path, to_jsonable(atom))
-        self.idx.upsert_atom(AtomRow(
+        self.idx.upsert_atom(self._atom_row(atom, simhash, content_bytes, fts_body))
+
+    @staticmethod
+    def _atom_row(atom: Atom, simhash: Optional[int] = None, content_bytes: Optional[int] = None,
+                  fts_body: Optional[str] = None) -> AtomRow:
+        if content_bytes is None and not atom.blob:
+            content_bytes = len(atom.content.encode("utf-8"))
+        return AtomRow(
             atom_id=atom.atom_id, ts=atom.ts, type=atom.type, scope=",".join(atom.scope),
             tags=",".join(atom.tags), entities=",".join(atom.entities),
             summary=atom.summary, content=atom.content, w=float(atom.w),
-            uses=int(atom.uses), last_used_ts=atom.last_used_ts, pinned=1 if atom.pinned else 0
-        ))
+            uses=int(atom.uses), last_used_ts=atom.last_used_ts, pinned=1 if atom.pinned else 0,
+            namespace=atom.namespace, hash=atom.hash,
+            source=json.dumps(atom.source, ensure_ascii=False) if atom.source else "",
+            simhash=simhash, blob_ref=atom.blob, content_bytes=content_bytes, fts_body=fts_body
+        )
+
+    @timed("store.update_atom_strength")
+    def update_atom_strength(self, atom_id: str, *, ts: str, delta_w: float = 0.0, uses_inc: int = 0, last_used_ts: str | None = None):
+        row = self.get_atom(atom_id)
+        if row is None:
+            return
+        atom = self.row_to_atom(row)
+        atom.w = atom.w + float(delta_w)
+        atom.uses = atom.uses + int(uses_inc)
+        atom.last_used_ts = last_used_ts if last_used_ts is not None else (atom.last_used_ts or ts)
+        # clamp w to a reasonable range
+        atom.w = max(-5.0, min(5.0, atom.w))
+        # write an updated atom record (append-only; last wins)
+        self._write_atom(atom)
+
+    @timed("store.set_strengths")
+    def set_strengths(self, updates: Sequence[Tuple[str, float, str]]):
+        """Bulk form of update_atom_strength for maintenance: (atom_id, new w, last_used_ts) per atom.
+
+        One ledger append and one transaction for the whole batch; only w/last_used_ts change in the index.
+        """
+        self._set_usage({aid: (w, None, lu) for aid, w, lu in updates})
+
+    @timed("store.set_usage")
+    def set_usage(self, updates: Sequence[Tuple[str, float, int, str]]):
+        """set_strengths that also sets use counts: (atom_id, new w, uses, last_used_ts) per atom, e.g. to
+        give freshly loaded atoms a usage history without rewriting each one's text and FTS row."""
+        self._set_usage({aid: (w, uses, lu) for aid, w, uses, lu in updates})
+
+    def _set_usage(self, new: Dict[str, Tuple[float, Optional[int], str]]):
+        if not new:
+            return
+        rows = self.idx.atoms_by_ids(list(new), columns=HOT_COLUMNS + ("hash", "source"))
+        recs, index_rows = [], []
+        for aid, row in rows.items():
+            atom = self.row_to_atom(row)
+            w, uses, lu = new[aid]
+            atom.w = max(-5.0, min(5.0, float(w)))
+            if uses is not None:
+                atom.uses = int(uses)
+            atom.last_used_ts = lu
+            recs.append(to_jsonable(atom))
+            index_rows.append((atom.w, atom.uses, atom.last_used_ts, aid))
+        with self.idx.batch():
+            self._append_jsonl_many(self.atoms_path, recs)
+            self.idx.set_strengths(index_rows)
 
     def log_activation(self, query: str, atom_ids: List[str], kind: str, meta: Dict[str, Any] | None = None) -> ActivationEvent:
         ts = now_iso()
         meta = meta or {}
-        payload = {"ts": ts, "query": query, "atom_ids": atom_ids, "kind": kind, "meta": meta}
+        payload = {"ts": ts, "query": query, "atom_ids": atom_ids, "kind": kind, "meta": meta, "namespace": self.namespace}
         act_id = stable_id("act", payload)
-        ev = ActivationEvent(act_id=act_id, ts=ts, query=query, atom_ids=atom_ids, kind=kind, meta=meta)
+        ev = ActivationEvent(act_id=act_id, ts=ts, query=query, atom_ids=atom_ids, kind=kind, meta=meta,
+                             namespace=self.namespace)
         self._append_jsonl(self.acts_path, to_jsonable(ev))
         return ev
 
-    def iter_atoms_indexed(self) -> Iterable[Dict[str, Any]]:
-        # read from SQLite for performance
-        c = self.idx.conn.cursor()
-        for row in c.execute("SELECT * FROM atoms ORDER BY pinned DESC, w DESC, uses DESC"):
+    @timed("store.record_use")
+    def record_use(self, query: str, atom_ids: List[str], *, kind: str, meta: Dict[str, Any] | None = None,
+                   delta_w: float = 0.0, coact: bool = False) -> str:
+        """Log a retrieval, strengthen the atoms it used and (optionally) link them as co-activated:
+        with `coact`, when cfg.coact_sync is on and `kind` is one of cfg.coact_kinds.
+
+        A cluster atom stands for its members: they are logged and strengthened in its place, so cluster
+        atoms themselves never gain strength from use. All index writes share one transaction.
+        Returns the strengthening timestamp.
+        """
+        members = self.idx.cluster_members(atom_ids)
+        if members:
+            atom_ids = list(dict.fromkeys(m for aid in atom_ids for m in members.get(aid, [aid])))
+        ev = self.log_activation(query, atom_ids, kind=kind, meta=meta)
+        ts = self.log_activation(query, atom_ids, kind="manual", meta={"note": f"strengthen_on_{kind}"}).ts
+        with self.idx.batch():
+            for aid in atom_ids:
+                self.update_atom_strength(aid, ts=ts, delta_w=delta_w, uses_inc=1, last_used_ts=ts)
+            if coact and self.cfg.coact_sync and kind in self.cfg.coact_kinds:
+                # same contribution `syn aggregate` derives from this event (see synaptic.aggregate)
+                ids = sorted(set(atom_ids))
+                w = coact_weight(1.0)
+                self.idx.upsert_coact(((a, b, w, 1, ev.ts, self.namespace) for a in ids for b in ids if a != b),
+                                      half_life_days=self.cfg.coact_half_life_days)
+        return ts
+
+    def iter_atoms_indexed(self, filters: Optional[AtomFilter] = None, limit: Optional[int] = None,
+                           columns: Optional[Sequence[str]] = None) -> Iterable[Dict[str, Any]]:
+        # read from SQLite for performance; namespace/filters/limit are applied in SQL and only
+        # `columns` are read (default: index HOT_COLUMNS; bodies in blobs/ are never touched)
+        for row in self.idx.iter_atoms(filters=filters, limit=limit, namespace=self.namespace, columns=columns):
             yield dict(row)
 
+    @timed("store.delete_atom")
     def delete_atom(self, atom_id: str):
-        # destructive: remove from sqlite (atoms.jsonl remains append-only history)
-        c = self.idx.conn.cursor()
-        c.execute("DELETE FROM atoms WHERE atom_id=?", (atom_id,))
-        try:
-            c.execute("DELETE FROM atoms_fts WHERE atom_id=?", (atom_id,))
-        except Exception:
-            pass
-        self.idx.conn.commit()
+        # destructive: remove from sqlite (atoms.jsonl remains append-only history); other namespaces' ids are ignored
+        row = self.get_atom(atom_id)
+        if row is None:
+            return
+        self.idx.delete_atom(atom_id)
+        # blobs are shared by content; drop the file once no atom references it
+        if row["blob_ref"] and not self.idx.blob_referenced(row["blob_ref"]):
+            self.blobs.delete(row["blob_ref"])
 
     @staticmethod
+    @timed("store.append_jsonl")
     def _append_jsonl(path: Path, obj: Dict[str, Any]):
         with path.open("a", encoding="utf-8") as f:
             f.write(json.dumps(obj, ensure_ascii=False) + "\n")
+
+    @staticmethod
+    @timed("store.append_jsonl")
+    def _append_jsonl_many(path: Path, objs: Iterable[Dict[str, Any]]):
+        with path.open("a", encoding="utf-8") as f:
+            f.write("".join(json.dumps(o, ensure_ascii=False) + "\n" for o in objs))
@@ -20,6 +20,35 @@ def parse_iso_utc(ts: str) -> Optional[float]:
     except Exception:
         return None
 
+_REL_RE = re.compile(r"^(\d+(?:\.\d+)?)([mhdw])$")
+_REL_UNITS = {"m": 60.0, "h": 3600.0, "d": 86400.0, "w": 7 * 86400.0}
+
+def inclusive_until(s: str) -> str:
+    """An inclusive upper time bound as a timestamp: a bare date ('2026-01-11') covers that whole day."""
+    if len(s) == 10 and s[4] == "-" and s[7] == "-":
+        return s + "T23:59:59Z"
+    return s
+
+def resolve_time_bound(s: str, *, now: Optional[float] = None, end: bool = False) -> str:
+    """Normalize a time bound to '%Y-%m-%dT%H:%M:%SZ'.
+
+    Accepts relative spans ('30m', '12h', '7d', '2w' -> that long before now),
+    dates ('2026-01-11': its start, or with `end` its last second) and full timestamps
+    ('2026-01-11T04:10:00Z'). Raises ValueError for anything else.
+    """
+    s = (s or "").strip()
+    if not s:
+        return ""
+    m = _REL_RE.match(s.lower())
+    if m:
+        t = (time.time() if now is None else now) - float(m.group(1)) * _REL_UNITS[m.group(2)]
+        return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(t))
+    if parse_iso_utc(s) is not None:
+        return s
+    if parse_iso_utc(s + "T00:00:00Z") is not None:
+        return inclusive_until(s) if end else s + "T00:00:00Z"
+    raise ValueError(f"unrecognized time bound: {s!r}")
+
 def sha256_bytes(b: bytes) -> str:
     return hashlib.sha256(b).hexdigest()
 
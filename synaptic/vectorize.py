@@ -0,0 +1,66 @@
+from __future__ import annotations
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import List, Optional
+import time
+
+from .instrument import count, timed
+
+@dataclass
+class EmbedReport:
+    model: str              # embedder version the vectors belong to
+    pending: int            # atoms without a vector of `model` before the run
+    cached: int             # filled from embed_cache (identical text embedded before)
+    embedded: int           # computed by the embedder
+    remaining: int
+    seconds: float = 0.0
+
+@timed("embed_pending")
+def embed_pending(store, *, batch: Optional[int] = None, workers: Optional[int] = None,
+                  limit: Optional[int] = None, all_namespaces: bool = False) -> EmbedReport:
+    """Give atoms without a vector of the configured embedder one, off the request path.
+
+    Atoms are read in rowid order, `batch * workers` at a time. Vectors cached for the same content
+    hash are reused; the other texts go to `embedder.embed_many` in `batch`-sized calls, up to
+    `workers` of them in flight on a thread pool (model backends release the GIL inside their
+    native kernels). All SQLite writes stay on the calling thread, one transaction per round.
+    """
+    cfg, idx, emb = store.cfg, store.idx, store.embedder
+    batch = max(1, batch or cfg.embed_batch)
+    workers = max(1, workers or cfg.embed_workers)
+    ns = None if all_namespaces else store.namespace
+    model = emb.version
+    t0 = time.perf_counter()
+    rep = EmbedReport(model=model, pending=idx.count_missing_vectors(model, ns), cached=0, embedded=0, remaining=0)
+
+    after, done = 0, 0
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="synaptic-embed") as pool:
+        while limit is None or done < limit:
+            n = batch * workers if limit is None else min(batch * workers, limit - done)
+            rows = idx.missing_vectors(model, namespace=ns, after_rowid=after, limit=n)
+            if not rows:
+                break
+            after = int(rows[-1]["_rowid"])
+            done += len(rows)
+            hit = idx.cached_vectors([r["hash"] for r in rows], model)
+            fresh = [r for r in rows if not r["hash"] or r["hash"] not in hit]
+            texts = [(r["summary"] or "") + "\n" + store.load_content(dict(r)) for r in fresh]
+            parts = [(fresh[i:i+batch], pool.submit(emb.embed_many, texts[i:i+batch]))
+                     for i in range(0, len(fresh), batch)]
+            with idx.batch():
+                for r in rows:
+                    if r["hash"] and r["hash"] in hit:
+                        idx.upsert_vector(r["atom_id"], r["namespace"], model, hit[r["hash"]])
+                for part, fut in parts:
+                    vecs: List[bytes] = [v.tobytes() for v in fut.result()]
+                    for r, vec in zip(part, vecs):
+                        idx.upsert_vector(r["atom_id"], r["namespace"], model, vec)
+                    if not emb.inline:
+                        idx.cache_vectors((r["hash"], model, vec) for r, vec in zip(part, vecs))
+            rep.cached += len(rows) - len(fresh)
+            rep.embedded += len(fresh)
+            count("embed.cached", len(rows) - len(fresh))
+            count("embed.embedded", len(fresh))
+    rep.remaining = idx.count_missing_vectors(model, ns)
+    rep.seconds = round(time.perf_counter() - t0, 3)
+    return rep